@@ -0,0 +1,1149 @@
+
+import io
+import os
+import json
+import sys
+import time
+import statistics
+import struct
+import argparse
+import timeit
+import tempfile
+import threading
+import subprocess
+import contextlib
+import tracemalloc
+
+from xvf_host import COMMANDS, PARAMETERS, ReSpeaker, RetryPolicy, FixedRetryPolicy
+from simulator import SimulatedDevice
+from telemetry import stream, TELEMETRY_PARAMETERS
+
+
+def legacy_decode(data_type, data_cnt, response):
+    """Per-call decoding as done before the precompiled codec table"""
+    byte_data = response.tobytes()
+    if data_type == 'char':
+        return byte_data[1:].rstrip(b'\x00').decode('utf-8', errors='ignore')
+    match_str = '<'
+    for i in range(data_cnt):
+        match_str += {'uint8': 'B', 'uint16': 'H', 'uint32': 'I', 'int32': 'i'}.get(data_type, 'f')
+    return struct.unpack(match_str, byte_data[1:])
+
+def legacy_encode(data_type, data_cnt, data_list):
+    """Per-call payload building as done before the precompiled codec table"""
+    payload = []
+    if data_type == 'float' or data_type == 'radians':
+        for i in range(data_cnt):
+            payload += struct.pack(b'f', float(data_list[i]))
+    elif data_type == 'uint8':
+        for i in range(data_cnt):
+            payload += data_list[i].to_bytes(1, byteorder='little')
+    else:
+        for i in range(data_cnt):
+            payload += struct.pack(b'I' if data_type == 'uint32' else b'i', data_list[i])
+    return payload
+
+def report(label, baseline, optimized, number):
+    base_us = baseline / number * 1e6
+    opt_us = optimized / number * 1e6
+    print(f"{label:<36} {base_us:>9.2f} us {opt_us:>9.2f} us {base_us / opt_us:>7.1f}x")
+
+def best_of(rounds, func):
+    """Best wall-clock time of `rounds` calls, with the debug output discarded"""
+    best = float('inf')
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(rounds):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+    return best
+
+def bench_codec(args):
+    """Decode/encode cost per call, legacy per-call struct strings vs precompiled codecs"""
+    dev = SimulatedDevice()
+    print(f"{'Case':<36} {'Legacy':>12} {'Codec':>12} {'Gain':>8}")
+    print("-" * 72)
+    for name in ("DOA_VALUE", "AEC_AZIMUTH_VALUES", "AEC_SPENERGY_VALUES", "AEC_MIC_ARRAY_GEO"):
+        command = COMMANDS[name]
+        data_type, data_cnt = PARAMETERS[name][4], PARAMETERS[name][2]
+        response = dev.ctrl_transfer(0xC0, 0, command.read_wvalue, command.windex, command.length)
+        baseline = timeit.timeit(lambda: legacy_decode(data_type, data_cnt, response), number=args.number)
+        optimized = timeit.timeit(lambda: command.decode(response), number=args.number)
+        report("decode " + name, baseline, optimized, args.number)
+
+    for name, values in (("LED_RING_COLOR", list(range(12))), ("PP_AGCMAXGAIN", [30.0])):
+        command = COMMANDS[name]
+        data_type, data_cnt = PARAMETERS[name][4], PARAMETERS[name][2]
+        baseline = timeit.timeit(lambda: legacy_encode(data_type, data_cnt, values), number=args.number)
+        optimized = timeit.timeit(lambda: command.encode(values), number=args.number)
+        report("encode " + name, baseline, optimized, args.number)
+
+def bench_snapshot(args):
+    """Reading every readable parameter, read() loop vs batched read_many()"""
+    names = [name for name, info in PARAMETERS.items() if info[3] != "wo"]
+    dev = ReSpeaker(SimulatedDevice(retries=1, latency=0.0002))
+
+    baseline = best_of(args.rounds, lambda: [dev.read(name) for name in names])
+    optimized = best_of(args.rounds, lambda: dev.read_many(names))
+    print(f"{'Case':<36} {'read loop':>12} {'read_many':>12} {'Gain':>8}")
+    print("-" * 72)
+    print(f"{'snapshot of ' + str(len(names)) + ' parameters':<36} {baseline * 1000:>9.1f} ms {optimized * 1000:>9.1f} ms {baseline / optimized:>7.1f}x")
+
+def bench_retry(args):
+    """Polling latency of reads that need retries, flat 10 ms sleep vs adaptive backoff"""
+    print(f"{'Case':<36} {'Fixed p50':>12} {'Adaptive p50':>14} {'Gain':>8}")
+    print("-" * 74)
+    for label, device_args in (("ready after 1 ms", dict(ready_after=0.001)),
+                               ("ready after 3 ms", dict(ready_after=0.003)),
+                               ("2 RETRY responses", dict(retries=2))):
+        medians = []
+        for policy in (FixedRetryPolicy(), RetryPolicy()):
+            dev = ReSpeaker(SimulatedDevice(latency=0.0001, **device_args), retry_policy=policy)
+            latencies = []
+            with contextlib.redirect_stdout(io.StringIO()):
+                for _ in range(args.rounds * 10):
+                    for name in ("DOA_VALUE", "AEC_SPENERGY_VALUES"):
+                        start = time.perf_counter()
+                        dev.read(name)
+                        latencies.append(time.perf_counter() - start)
+            medians.append(statistics.median(latencies))
+        print(f"{label:<36} {medians[0] * 1000:>9.2f} ms {medians[1] * 1000:>11.2f} ms {medians[0] / medians[1]:>7.1f}x")
+        learned = ', '.join(f"RESID {resid} {latency * 1000:.2f} ms" for resid, latency in sorted(policy.latency.items()))
+        print(f"{'':<4}adaptive: {policy.retries} retries, {policy.wait_time * 1000:.1f} ms waiting, learned {learned}")
+
+def bench_stream(args):
+    """Jitter and throughput of fixed-rate DOA/beam telemetry streaming"""
+    print(f"{'Case':<36} {'Rate':>9} {'p50 jitter':>11} {'p99 jitter':>11} {'Dropped':>8}")
+    print("-" * 79)
+    for rate_hz, consumer_time in ((50, 0.0), (100, 0.0), (100, 0.025)):
+        dev = ReSpeaker(SimulatedDevice(latency=0.0003))
+        count = int(rate_hz * args.rounds)
+        period = 1.0 / rate_hz
+        jitter = []
+        dropped = 0
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            for sample in stream(dev, TELEMETRY_PARAMETERS, rate_hz, count=count):
+                if sample.seq == 0:
+                    origin = sample.timestamp
+                dropped += sample.dropped
+                # distance from the nearest tick of the ideal grid
+                offset = (sample.timestamp - origin) % period
+                jitter.append(min(offset, period - offset))
+                if consumer_time:
+                    time.sleep(consumer_time)
+            elapsed = time.perf_counter() - start
+        jitter.sort()
+        label = f"{rate_hz} Hz" + (f", consumer {consumer_time * 1000:.0f} ms" if consumer_time else "")
+        print(f"{label:<36} {count / elapsed:>6.1f} Hz {jitter[len(jitter) // 2] * 1e6:>8.0f} us "
+              f"{jitter[int(len(jitter) * 0.99)] * 1e6:>8.0f} us {dropped:>8}")
+
+def bench_recorder(args):
+    """Per-sample cost and memory of recording beam telemetry, list of tuples vs ring buffer"""
+    from recorder import TelemetryRecorder, TelemetryReader
+
+    count = args.number * 10
+    azimuth = (0.1, 0.2, 0.3, 0.4)
+    energy = (1.0, 0.0, 2.0, 0.5)
+
+    def record_list():
+        samples = []
+        for i in range(count):
+            samples.append((i * 0.01, azimuth, energy, 90, 1))
+        return samples
+
+    def record_ring():
+        recorder = TelemetryRecorder(capacity=4096)
+        for i in range(count):
+            recorder.append(i * 0.01, azimuth, energy, 90, 1)
+        return recorder
+
+    print(f"{'Case':<36} {'Per sample':>12} {'Memory':>12}")
+    print("-" * 62)
+    for label, func in (("list of tuples", record_list), ("ring buffer", record_ring)):
+        elapsed = best_of(args.rounds, func)
+        tracemalloc.start()
+        kept = func()
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del kept
+        print(f"{label + ', ' + str(count) + ' samples':<36} {elapsed / count * 1e6:>9.2f} us {memory / 1024:>9.0f} KB")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "capture.bin")
+        start = time.perf_counter()
+        with TelemetryRecorder(capacity=4096, path=path) as recorder:
+            for i in range(count):
+                recorder.append(i * 0.01, azimuth, energy, i % 360, i & 1)
+        elapsed = time.perf_counter() - start
+        print(f"{'spill to file':<36} {elapsed / count * 1e6:>9.2f} us {os.path.getsize(path) / 1024:>9.0f} KB on disk")
+
+        reader = TelemetryReader(path)
+        start = time.perf_counter()
+        sum(int(chunk['vad'].sum()) for chunk in reader.chunks())
+        elapsed = time.perf_counter() - start
+        print(f"{'replay by chunks':<36} {elapsed / count * 1e9:>9.2f} ns {count / elapsed / 1e6:>9.1f} M records/s")
+        del reader
+
+def bench_aec(args):
+    """Bulk AEC filter dump/upload through SPECIAL_CMD_AEC_FILTER_* paging"""
+    import numpy as np
+
+    length = 3841 # not a multiple of the 15 coefficient page, to exercise the last partial page
+    page = COMMANDS["SPECIAL_CMD_AEC_FILTER_COEFFS"].count
+    sim = SimulatedDevice(latency=0.0001, num_farends=1, num_mics=4, aec_filter_length=length)
+    dev = ReSpeaker(sim)
+    expected = np.random.default_rng(0).standard_normal((1, 4, length)).astype(np.float32)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        dev.load_aec_filters(expected)
+        load_time = time.perf_counter() - start
+        start = time.perf_counter()
+        dev.dump_aec_filters()
+        dump_time = time.perf_counter() - start
+
+    offsets = list(range(0, length, page))
+    print(f"{'Case':<36} {'Time':>10} {'Throughput':>22}")
+    print("-" * 70)
+    print(f"{'upload 1 x 4 x ' + str(length):<36} {load_time:>8.2f} s {expected.size / load_time:>10.0f} coefficients/s")
+    print(f"{'dump 1 x 4 x ' + str(length):<36} {dump_time:>8.2f} s {expected.size / dump_time:>10.0f} coefficients/s")
+    print(f"{'pages per filter':<36} {len(offsets):>10}, last page holds {length - offsets[-1]} coefficients")
+
+def bench_profile(args):
+    """Applying a tuning profile: diffed minimal writes vs writing every parameter"""
+    import json
+    import profiles
+
+    names = [name for name, command in COMMANDS.items()
+             if command.access == "rw" and name.startswith(("PP_", "AEC_", "AUDIO_MGR_"))]
+    raw = {}
+    for i, name in enumerate(names):
+        command = COMMANDS[name]
+        if command.type in ('float', 'radians'):
+            raw[name.lower()] = [0.1 * (i + 1)] * command.count
+        else:
+            raw[name.lower()] = [1] * command.count if command.count > 1 else "0x1"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "room.json")
+        with open(path, "w") as f:
+            json.dump(raw, f)
+        profile = profiles.load_profile(path)
+
+    def write_all(dev):
+        # one write per parameter and a read back, as separate xvf_host.py calls would do
+        for name, values in profile.items():
+            dev.write(name, values)
+            dev.read(name)
+
+    print(f"{'Case':<36} {'Time':>10} {'Transfers':>10} {'Changed':>8}")
+    print("-" * 68)
+    sim = SimulatedDevice(latency=0.0005)
+    dev = ReSpeaker(sim)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        write_all(dev)
+        elapsed = time.perf_counter() - start
+    print(f"{'write and read back every parameter':<36} {elapsed * 1000:>7.1f} ms {sim.transfers:>10} {len(profile):>8}")
+
+    sim = SimulatedDevice(latency=0.0005)
+    dev = ReSpeaker(sim)
+    for case in ("apply to a default device", "apply again", "apply again and save"):
+        sim.transfers = 0
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = profiles.apply_profile(dev, profile, save=case.endswith("save"))
+            elapsed = time.perf_counter() - start
+        print(f"{case:<36} {elapsed * 1000:>7.1f} ms {sim.transfers:>10} {len(result.changed):>8}")
+
+def bench_daemon(args):
+    """Per-command latency through the session daemon vs a cold CLI process"""
+    import xvf_daemon
+
+    sim = SimulatedDevice()
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "xvf_host.sock")
+        with contextlib.redirect_stdout(io.StringIO()):
+            server = xvf_daemon.SessionServer(ReSpeaker(sim), path, ids=(0x2886, 0x001A))
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            # both run the CLI in a fresh interpreter, the cold one loads the USB stack
+            # as find() does, waits for the modelled enumeration and opening of the
+            # device, then opens a stand-in device
+            cli = "import sys, xvf_host, simulator; sys.argv = ['xvf_host.py'] + sys.argv[1:]; "
+            cold = [sys.executable, "-c", cli + "import time; xvf_host.find = lambda **kw: __import__('usb.core') and "
+                    f"not time.sleep({args.usb_enumeration / 1000}) and xvf_host.ReSpeaker(simulator.SimulatedDevice()); "
+                    "xvf_host.main()", "--no-daemon", "VERSION"]
+            warm = [sys.executable, "-c", cli + "xvf_host.main()", "--socket", path, "VERSION"]
+            cold_time = best_of(args.rounds, lambda: subprocess.run(cold, cwd=here, check=True, capture_output=True))
+            warm_time = best_of(args.rounds, lambda: subprocess.run(warm, cwd=here, check=True, capture_output=True))
+
+            client = ReSpeaker(xvf_daemon.DaemonDevice(path))
+            number = args.number // 10
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                for _ in range(number):
+                    client.read("DOA_VALUE")
+                session_time = (time.perf_counter() - start) / number
+
+                # concurrent clients share the one handle
+                def poll():
+                    dev = ReSpeaker(xvf_daemon.DaemonDevice(path))
+                    for _ in range(number // 4):
+                        dev.read("VERSION")
+                    dev.close()
+                threads = [threading.Thread(target=poll) for _ in range(4)]
+                start = time.perf_counter()
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+                concurrent_time = (time.perf_counter() - start) / (4 * (number // 4))
+            client.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    print(f"{'Case':<44} {'Per command':>14}")
+    print("-" * 60)
+    print(f"{f'cold CLI process, {args.usb_enumeration:g} ms USB enumeration':<44} {cold_time * 1000:>11.1f} ms")
+    print(f"{'CLI process through the daemon':<44} {warm_time * 1000:>11.1f} ms")
+    print(f"{'open daemon session':<44} {session_time * 1e6:>11.0f} us")
+    print(f"{'4 concurrent daemon sessions':<44} {concurrent_time * 1e6:>11.0f} us")
+
+def import_time(here, code, module, pycache, *parts):
+    """
+    Cumulative -X importtime of `module` in a fresh interpreter running
+    `code`, in microseconds, then that of each module of `parts` in the same
+    run
+    """
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    command = [sys.executable, "-X", "importtime", "-X", "pycache_prefix=" + pycache, "-c", code]
+    best = (float('inf'),) + (0,) * len(parts)
+    # the first run compiles and caches the bytecode, as an installed tool would have
+    for _ in range(3):
+        stderr = subprocess.run(command, cwd=here, env=env, check=True, capture_output=True, text=True).stderr
+        times = {}
+        for line in stderr.splitlines():
+            fields = line.split('|')
+            if len(fields) == 3 and fields[1].strip().isdigit():
+                times[fields[2].strip()] = int(fields[1])
+        best = min(best, tuple(times.get(name, 0) for name in (module,) + parts))
+    return best if parts else best[0]
+
+def bench_import(args):
+    """Startup cost of the xvf_host CLI, with a regression threshold on the import time"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as pycache:
+        host, logging = import_time(here, "import xvf_host", "xvf_host", pycache, "logging")
+        usb = import_time(here, "import usb.core", "usb.core", pycache)
+        env = dict(os.environ, PYTHONPYCACHEPREFIX=pycache)
+        env.pop('PYTHONDONTWRITEBYTECODE', None)
+
+        cli = [sys.executable, os.path.join(here, "xvf_host.py"), "--list"]
+        list_time = best_of(args.rounds, lambda: subprocess.run(cli, cwd=here, env=env, check=True, capture_output=True))
+
+        # a read command, on a stand-in for the USB transport that answers VERSION
+        read = ("import sys, array, xvf_host; sys.argv = ['xvf_host.py', 'VERSION']\n"
+                "class Device:\n"
+                "    def ctrl_transfer(self, *args):\n"
+                "        return array.array('B', [0, 2, 1, 0])\n"
+                "    def close(self):\n"
+                "        pass\n"
+                "xvf_host.find = lambda **kw: xvf_host.ReSpeaker(Device())\n"
+                "xvf_host.main()\n")
+        with tempfile.TemporaryDirectory() as tmp:
+            read_env = dict(env, XVF_HOST_SOCKET=os.path.join(tmp, "none.sock"))
+            read_time = best_of(args.rounds, lambda: subprocess.run([sys.executable, "-c", read], cwd=here, env=read_env,
+                                                                    check=True, capture_output=True))
+        bare_time = best_of(args.rounds, lambda: subprocess.run([sys.executable, "-c", "pass"], env=env, check=True))
+
+    print(f"{'Case':<44} {'Time':>10}")
+    print("-" * 56)
+    print(f"{'import xvf_host':<44} {host / 1000:>7.1f} ms")
+    print(f"{'  of which logging, for the transfer trace':<44} {logging / 1000:>7.1f} ms")
+    print(f"{'usb.core, now loaded only by find()':<44} {usb / 1000:>7.1f} ms")
+    print(f"{'xvf_host.py --list process':<44} {list_time * 1000:>7.1f} ms")
+    print(f"{'xvf_host.py VERSION process, no USB stack':<44} {read_time * 1000:>7.1f} ms")
+    print(f"{'bare interpreter process':<44} {bare_time * 1000:>7.1f} ms")
+    # logging is in the standard library and imported by most applications anyway
+    if (host - logging) / 1000 > args.import_threshold:
+        print(f"REGRESSION: import xvf_host took {(host - logging) / 1000:.1f} ms besides logging, "
+              f"threshold is {args.import_threshold} ms")
+        sys.exit(1)
+
+def bench_devices(args):
+    """Polling telemetry on N arrays, one after another vs the DeviceManager thread pool"""
+    from manager import DeviceManager
+
+    print(f"{'Devices':<12} {'Sequential':>14} {'Manager':>14} {'Gain':>8} {'Spread':>10}")
+    print("-" * 62)
+    polls = args.rounds * 10
+    for count in (1, 2, 4, 8):
+        devices = {f"sim{i}": ReSpeaker(SimulatedDevice(latency=0.001)) for i in range(count)}
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            for _ in range(polls):
+                for respeaker in devices.values():
+                    respeaker.read_many(TELEMETRY_PARAMETERS)
+            sequential = (time.perf_counter() - start) / polls
+
+            spread = 0.0
+            with DeviceManager(devices) as manager:
+                start = time.perf_counter()
+                for _ in range(polls):
+                    poll = manager.poll(TELEMETRY_PARAMETERS)
+                    timestamps = [sample.timestamp for sample in poll.samples.values()]
+                    spread = max(spread, max(timestamps) - min(timestamps))
+                managed = (time.perf_counter() - start) / polls
+        print(f"{count:<12} {sequential * 1000:>11.2f} ms {managed * 1000:>11.2f} ms {sequential / managed:>7.1f}x {spread * 1000:>7.2f} ms")
+
+def bench_dfu(args):
+    """DFU download paced by the reported poll timeout vs fixed sleeps, read back verification"""
+    import dfu
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    path = os.path.join(here, "..", "xmos_firmwares", "usb", "respeaker_xvf3800_usb_dfu_firmware_v2.1.0.bin")
+    with open(path, "rb") as f:
+        data = f.read()
+    start = time.perf_counter()
+    full = dfu.FirmwareImage(data, (2, 1, 0))
+    slice_time = time.perf_counter() - start
+    # a slice of the image with a partial last block keeps the timed runs short
+    image = dfu.FirmwareImage(data[:64 * 1024 + 100], (2, 1, 0))
+
+    class FixedSleepUpdater(dfu.DfuUpdater):
+        def wait_state(self, states):
+            while True:
+                time.sleep(0.005)
+                status, timeout, state = self.get_status()
+                if state in states:
+                    return state
+
+    print(f"{'Case':<36} {'Time':>10} {'Throughput':>14} {'Polls':>8}")
+    print("-" * 72)
+    print(f"{'slice and hash ' + str(full.size) + ' bytes':<36} {slice_time * 1000:>7.1f} ms")
+    for name, updater in (("fixed 5 ms sleep", FixedSleepUpdater), ("reported poll timeout", dfu.DfuUpdater)):
+        sim = SimulatedDevice(dfu_busy=0.0005, dfu_version=(2, 0, 10))
+        result = updater(ReSpeaker(sim)).update(image)
+        print(f"{name:<36} {result.download_time:>8.2f} s {image.size / result.download_time / 1024:>9.1f} KB/s {result.polls:>8}")
+
+    sim = SimulatedDevice(dfu_version=(2, 0, 10))
+    updater = dfu.DfuUpdater(ReSpeaker(sim))
+    result = updater.update(full)
+    print(f"{'verify ' + str(full.size) + ' bytes':<36} {result.verify_time * 1000:>7.1f} ms {full.size / result.verify_time / 1024:>9.1f} KB/s")
+
+def bench_headroom(args):
+    """DSP headroom profiling of simulated stage loads, and the cost of one sample of the stages"""
+    import random
+    import headroom
+
+    frame_ticks = headroom.FRAME_PERIOD / headroom.TICK
+    rng = random.Random(0)
+    sim = SimulatedDevice(latency=0.0002)
+
+    class Stage:
+        """Idle time of one stage: normally distributed per frame, plus one spike the sampling misses"""
+        def __init__(self, name, mean, spike):
+            current, minimum, reset = headroom.STAGES[name]
+            self.mean, self.spike, self.reset = mean, spike, reset
+            self.minimum, self.resets = 0, 0
+            sim.set_source(current, self.current)
+            sim.set_source(minimum, lambda: [self.minimum])
+
+        def current(self):
+            if sim.written(self.reset) != self.resets:
+                self.resets = sim.written(self.reset)
+                self.minimum = int(frame_ticks * self.spike)
+            idle = int(frame_ticks * max(0.0, rng.gauss(self.mean, 0.02)))
+            self.minimum = min(self.minimum, idle)
+            return [idle]
+
+    for name, mean, spike in (("AEC", 0.40, 0.25), ("PP", 0.60, 0.50), ("AUDIO_MGR", 0.80, 0.70), ("I2S", 0.30, 0.05)):
+        Stage(name, mean, spike)
+    sim.set("MAX_CONTROL_TIME", [12345])
+
+    dev = ReSpeaker(sim)
+    with contextlib.redirect_stdout(io.StringIO()):
+        report = headroom.measure(dev, 1.0, rate_hz=50)
+    headroom.print_report(report)
+
+    currents = [current for current, _, _ in headroom.STAGES.values()]
+    one_by_one = best_of(args.rounds, lambda: [dev.read(name) for name in currents])
+    batched = best_of(args.rounds, lambda: dev.read_many(currents))
+    print(f"\nSample cost: {one_by_one * 1000:.2f} ms reading the stages one by one, {batched * 1000:.2f} ms batched")
+
+def bench_stats(args):
+    """Per-transfer cost of the transfer statistics and of the old print trace"""
+    from stats import TransferStats
+
+    class PrintingReSpeaker(ReSpeaker):
+        # the trace printed by every read before it moved to logging
+        def read(self, name):
+            command = COMMANDS[name]
+            response = self._read_response(command)
+            print("ReadCMD: cmdid: {}, resid: {}, payload: {}".format(command.read_wvalue, command.windex, response.tolist()))
+            return command.decode(response)
+
+    command = COMMANDS["DOA_VALUE"]
+    plain = ReSpeaker(SimulatedDevice())
+    instrumented = ReSpeaker(SimulatedDevice(), stats=TransferStats())
+    printing = PrintingReSpeaker(SimulatedDevice())
+    cases = [
+        ("transfer", plain, lambda dev: dev._transfer_in(command)),
+        ("instrumented transfer", instrumented, lambda dev: dev._transfer_in(command)),
+        ("read() with print trace", printing, lambda dev: dev.read("DOA_VALUE")),
+        ("read()", plain, lambda dev: dev.read("DOA_VALUE")),
+        ("instrumented read()", instrumented, lambda dev: dev.read("DOA_VALUE")),
+    ]
+    print(f"{'Case':<36} {'Per call':>12}")
+    print("-" * 50)
+    times = {}
+    for name, dev, func in cases:
+        with contextlib.redirect_stdout(io.StringIO()):
+            times[name] = min(timeit.repeat(lambda: func(dev), number=args.number, repeat=args.rounds)) / args.number
+        print(f"{name:<36} {times[name] * 1e6:>9.2f} us")
+    overhead = times["instrumented transfer"] - times["transfer"]
+    print(f"{'instrumentation overhead':<36} {overhead * 1e6:>9.2f} us")
+
+
+def bench_control(args):
+    """Control path suite replayed from a transfer log: single reads, sweeps, DOA polling, bulk writes"""
+    from transport import RecordingTransport, ReplayTransport
+
+    readable = [name for name, command in COMMANDS.items() if command.access != "wo"]
+    writable = [name for name, command in COMMANDS.items() if command.access == "rw"]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.replay_log
+        if path is None:
+            # a session against a device that answers every read with one SERVICER_COMMAND_RETRY first
+            path = os.path.join(tmp, "session.xvflog")
+            sim = SimulatedDevice(retries=1, latency=0.0002)
+            sim.set("DOA_VALUE", [90, 1])
+            recorder = RecordingTransport(sim, path)
+            ReSpeaker(recorder).read_many(readable)
+            recorder.close()
+        replay = ReplayTransport(path)
+    dev = ReSpeaker(replay)
+    number = max(20, args.number // 200)
+
+    def latencies(func, count=number):
+        times = []
+        for _ in range(count):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+        return sorted(times)
+
+    results = {}
+    print(f"{'Case':<36} {'P50':>10} {'P99':>10} {'Transfers':>10}")
+    print("-" * 70)
+    cases = (
+        ("single_read", "single read (VERSION)", lambda: dev.read("VERSION"), number),
+        ("sweep", f"sweep of {len(readable)} parameters", lambda: dev.read_many(readable), max(3, args.rounds)),
+        ("bulk_write", f"bulk write of {len(writable)} parameters",
+         lambda: [dev.write(name, [0] * COMMANDS[name].count) for name in writable], max(3, args.rounds)),
+    )
+    for key, label, func, count in cases:
+        replay.transfers = 0
+        times = latencies(func, count)
+        results[key + "_p50_ms"] = statistics.median(times) * 1000
+        results[key + "_p99_ms"] = times[min(len(times) - 1, int(len(times) * 0.99))] * 1000
+        print(f"{label:<36} {results[key + '_p50_ms']:>7.2f} ms {results[key + '_p99_ms']:>7.2f} ms {replay.transfers // count:>10}")
+
+    samples = list(stream(dev, TELEMETRY_PARAMETERS, rate_hz=100, count=number))
+    elapsed = samples[-1].timestamp - samples[0].timestamp
+    polls = sorted(b.timestamp - a.timestamp for a, b in zip(samples, samples[1:]))
+    results["doa_poll_rate_hz"] = (len(samples) - 1) / elapsed
+    results["doa_poll_dropped"] = sum(sample.dropped for sample in samples)
+    print(f"{'DOA polling at 100 Hz':<36} {results['doa_poll_rate_hz']:>7.1f} Hz, "
+          f"{results['doa_poll_dropped']} dropped, period p99 {polls[int(len(polls) * 0.99)] * 1000:.2f} ms")
+    return results
+
+def bench_capture(args):
+    """Audio + per-frame telemetry capture: real-time factor and clock alignment of the metadata"""
+    import numpy as np
+    import capture
+    from recorder import TelemetryReader, RECORD_DTYPE
+
+    class OffsetSource(capture.SyntheticSource):
+        # first sample at t = 0, the time base of the telemetry below
+        def open(self):
+            self.start = 0.0
+            return 0.0
+
+    rate, channels, frame, seconds = 16000, 6, 256, 60
+    # telemetry at 100 Hz over the whole capture, the DOA turning 30 degrees/s through 359 -> 0
+    telemetry = np.zeros(seconds * 100 + 1, RECORD_DTYPE)
+    telemetry['timestamp'] = np.arange(len(telemetry)) / 100.0
+    telemetry['doa'] = (300 + 30 * telemetry['timestamp']).astype(int) % 360
+    telemetry['azimuth'] = (telemetry['timestamp'] % (2 * np.pi))[:, None]
+    telemetry['vad'] = (telemetry['timestamp'] % 2 < 1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        wav_path, sidecar_path = os.path.join(tmp, "capture.wav"), os.path.join(tmp, "capture.telemetry")
+
+        def offline(duration):
+            pipeline = capture.Capture(OffsetSource(channels, rate, duration, realtime=False), None, wav_path, sidecar_path, frame)
+            pipeline.telemetry = capture.TelemetryRecorder(len(telemetry))
+            pipeline.telemetry.append_records(telemetry)
+            return pipeline
+
+        # memory stays flat however long the capture runs
+        peaks = []
+        for duration in (seconds // 4, seconds):
+            pipeline = offline(duration)
+            tracemalloc.start()
+            pipeline.run(poll=False)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+        pipeline = offline(seconds)
+        start = time.perf_counter()
+        pipeline.run(poll=False)
+        elapsed = time.perf_counter() - start
+
+        frames = seconds * rate // frame
+        records = TelemetryReader(sidecar_path).records
+        expected = (300 + 30 * records['timestamp']) % 360
+        offline_error = np.abs((records['doa'] - expected + 180) % 360 - 180).max()
+        del records
+    print(f"{'Case':<36} {'Result':>24}")
+    print("-" * 62)
+    print(f"{f'{channels} ch / {rate // 1000} kHz, {seconds} s offline':<36} {seconds / elapsed:>12.0f}x real time")
+    print(f"{'per block of 16 frames':<36} {elapsed / (frames / 16) * 1e6:>15.0f} us")
+    print(f"{f'peak traced memory, {seconds // 4} s / {seconds} s':<36} {peaks[0] / 1024:>9.0f} / {peaks[1] / 1024:.0f} KB")
+    print(f"{'offline DOA alignment error':<36} {offline_error:>9.2f} deg max")
+
+    # live: the simulated DOA follows a known function of time.monotonic()
+    sim = SimulatedDevice(latency=0.0002)
+    origin = time.monotonic()
+    sim.set_source("DOA_VALUE", lambda: [int(90 * (time.monotonic() - origin)) % 360, 1])
+    with tempfile.TemporaryDirectory() as tmp:
+        wav_path, sidecar_path = os.path.join(tmp, "live.wav"), os.path.join(tmp, "live.telemetry")
+        pipeline = capture.Capture(capture.SyntheticSource(channels, rate, 2.0), ReSpeaker(sim), wav_path, sidecar_path, frame)
+        pipeline.run()
+        records = TelemetryReader(sidecar_path).records
+        # skip the frames before the first telemetry sample
+        live = records[records['timestamp'] > pipeline.telemetry.view()['timestamp'][0]]
+        expected = (90 * (live['timestamp'] - origin)) % 360
+        error = np.abs((live['doa'] - expected + 180) % 360 - 180)
+        print(f"{'live DOA alignment error':<36} {np.median(error):>9.2f} deg median, {error.max():.2f} max")
+        del records, live
+
+def bench_tracking(args):
+    """Speaker tracking on synthetic trajectories: per-sample cost online and batch, and track accuracy"""
+    import math
+    import numpy as np
+    import tracking
+    from recorder import RECORD_DTYPE
+
+    # two talkers at 100 Hz taking turns in 3 s bursts, with 1 s pauses: one
+    # turning 30 -> 120 degrees, the other 340 -> 20 degrees through 0
+    rate, seconds = 100, 600
+    rng = np.random.default_rng(1)
+    records = np.zeros(seconds * rate, RECORD_DTYPE)
+    t = np.arange(len(records)) / rate
+    records['timestamp'] = t
+    phase = t % 8
+    talkers = (
+        (np.radians(30 + 90 * (t % 40) / 40), phase < 3),
+        (np.radians(340 + 40 * (t % 40) / 40), (phase >= 4) & (phase < 7)),
+    )
+    for beam, (truth, speaking) in enumerate(talkers):
+        records['azimuth'][:, beam] = np.where(speaking, truth + np.radians(5) * rng.standard_normal(len(t)),
+                                               rng.uniform(-np.pi, np.pi, len(t)))
+        records['energy'][:, beam] = np.where(speaking, rng.uniform(0.05, 0.2, len(t)), 0)
+    # the free-running beam scans, hearing the current talker now and then
+    records['azimuth'][:, 2] = rng.uniform(-np.pi, np.pi, len(t))
+    bursts = 2 * (seconds // 8)
+
+    tracker = tracking.SpeakerTracker()
+    start = time.perf_counter()
+    online = []
+    for record in records.tolist():
+        online += tracker.update(record[0], record[1], record[2])
+    online_time = time.perf_counter() - start
+
+    tracker = tracking.SpeakerTracker()
+    start = time.perf_counter()
+    batch = []
+    for chunk in range(0, len(records), 10000):
+        batch += tracker.process(records[chunk:chunk + 10000])
+    batch_time = time.perf_counter() - start
+
+    starts = [e for e in batch if e.kind == 'start']
+    errors = []
+    for event in batch:
+        if event.kind != 'end':
+            index = int(round(event.timestamp * rate))
+            # the talker speaking, or who just stopped: the window still holds up to 200 ms of them
+            truth = [truth[index] for truth, speaking in talkers if speaking[max(0, index - 20):index + 1].any()]
+            errors.append(abs(math.degrees(tracking.wrap(event.azimuth - truth[0]))))
+
+    # the cost per sample does not depend on the window
+    windows = {}
+    for window in (10, 200):
+        tracker = tracking.SpeakerTracker(window)
+        sample = records[:2000].tolist()
+        start = time.perf_counter()
+        for record in sample:
+            tracker.update(record[0], record[1], record[2])
+        windows[window] = (time.perf_counter() - start) / len(sample)
+
+    print(f"{'Case':<36} {'Per sample':>12} {'Result':>22}")
+    print("-" * 72)
+    print(f"{'online, window 10':<36} {windows[10] * 1e6:>9.1f} us")
+    print(f"{'online, window 200':<36} {windows[200] * 1e6:>9.1f} us")
+    print(f"{f'online, {seconds} s at {rate} Hz':<36} {online_time / len(records) * 1e6:>9.1f} us {seconds / online_time:>10.0f}x real time")
+    print(f"{f'batch, {seconds} s at {rate} Hz':<36} {batch_time / len(records) * 1e6:>9.1f} us {seconds / batch_time:>10.0f}x real time")
+    print(f"{'tracks / bursts':<36} {'':>12} {len(starts):>15} / {bursts}")
+    print(f"{'azimuth error at events':<36} {'':>12} {np.median(errors):>8.1f} deg median, {max(errors):.1f} max")
+    return {'tracking_online_us': online_time / len(records) * 1e6, 'tracking_batch_us': batch_time / len(records) * 1e6}
+
+def bench_led(args):
+    """LED ring animation: frame cost, achieved FPS and the latency of DOA polling sharing the device"""
+    import colorsys
+    import led
+
+    def legacy_rainbow(step):
+        """A rainbow frame computed and written LED by LED"""
+        colors = []
+        for index in range(led.LED_COUNT):
+            r, g, b = colorsys.hsv_to_rgb((step / 60 + index / led.LED_COUNT) % 1.0, 1, 1)
+            colors.append(int(r * 255) << 16 | int(g * 255) << 8 | int(b * 255))
+        return colors
+
+    number = args.number // 10
+    respeaker = ReSpeaker(SimulatedDevice())
+    pattern = led.rainbow()
+    animator = led.LedAnimator(ReSpeaker(SimulatedDevice()), pattern)
+    baseline = best_of(args.rounds, lambda: [respeaker.write("LED_RING_COLOR", legacy_rainbow(step)) for step in range(number)])
+    optimized = best_of(args.rounds, lambda: [animator.show(pattern.frame(step)) for step in range(number)])
+    print(f"{'Case':<36} {'Before':>12} {'After':>12} {'Speedup':>8}")
+    print("-" * 72)
+    report("rainbow frame, computed vs packed", baseline, optimized, number)
+    print()
+
+    latency = 0.0005
+    print(f"{'Case':<36} {'Frames/s':>9} {'Written/s':>10} {'Skipped':>8}")
+    print("-" * 66)
+    for name, pattern, fps in (("rainbow", led.rainbow(), 30), ("rainbow", led.rainbow(), 60), ("solid", led.solid(0xFF0000), 60)):
+        sim = SimulatedDevice(latency=latency)
+        animator = led.LedAnimator(ReSpeaker(sim), pattern, fps)
+        animator.run(1.0)
+        print(f"{f'{name} at {fps} fps':<36} {animator.frames:>9} {animator.written:>10} {animator.skipped:>8}")
+    print()
+
+    # a thread polls DOA_VALUE at 100 Hz while the LEDs play on the same device
+    def poll_latency(animate):
+        sim = SimulatedDevice(latency=latency)
+        # a talker going round the array, 90 degrees/s
+        sim.set_source("DOA_VALUE", lambda: [int(90 * time.monotonic()) % 360, 1])
+        respeaker = ReSpeaker(sim)
+        animator = led.LedAnimator(respeaker, led.rainbow(), 60)
+        stop = threading.Event()
+        if animate == "write loop":
+            def write_loop():
+                step = 0
+                while not stop.is_set():
+                    respeaker.write("LED_RING_COLOR", legacy_rainbow(step))
+                    step += 1
+            thread = threading.Thread(target=write_loop)
+            thread.start()
+        elif animate == "animator":
+            doa = [0, 1]
+            animator.play(led.DoaPointer(lambda: doa))
+            animator.start()
+        times, waits = [], []
+        writes = sim.written("LED_RING_COLOR")
+        start = time.perf_counter()
+        for sample in stream(respeaker, ["DOA_VALUE"], 100, count=300):
+            before = time.perf_counter()
+            # the time spent waiting for an LED write to finish
+            with respeaker.dev.lock:
+                waits.append(time.perf_counter() - before)
+                doa = list(respeaker.read("DOA_VALUE"))
+            times.append(time.perf_counter() - before)
+        rate = (sim.written("LED_RING_COLOR") - writes) / (time.perf_counter() - start)
+        stop.set()
+        if animate == "write loop":
+            thread.join()
+        elif animate == "animator":
+            animator.stop()
+        times.sort()
+        return times[len(times) // 2], times[int(len(times) * 0.99)], statistics.mean(waits), rate
+
+    print(f"{'DOA read during':<24} {'P50':>9} {'P99':>9} {'Mean wait':>12} {'LED writes/s':>13}")
+    print("-" * 72)
+    results = {}
+    for animate in ("nothing", "write loop", "animator"):
+        p50, p99, wait, rate = results[animate] = poll_latency(animate)
+        print(f"{animate:<24} {p50 * 1e6:>6.0f} us {p99 * 1e6:>6.0f} us {wait * 1e6:>9.1f} us {rate:>13.0f}")
+    return {'led_poll_p99_us': results["animator"][1] * 1e6, 'led_poll_wait_us': results["animator"][2] * 1e6}
+
+def bench_watch(args):
+    """Multi-rate watch: transfers, CPU and changes delivered compared with ad-hoc polling loops"""
+    import watch
+
+    rates = {"DOA_VALUE": 50, "GPO_READ_VALUES": 10, "AEC_AECCONVERGED": 1, "PP_AGCGAIN": 5}
+    seconds = 3.0
+
+    def device():
+        """DOA moving every 200 ms, a GPO toggling every second, AEC converging at 1.5 s, AGC gain jittering then stepping at 2 s"""
+        sim = SimulatedDevice(latency=0.0002)
+        origin = time.monotonic()
+        elapsed = lambda: time.monotonic() - origin
+        sim.set_source("DOA_VALUE", lambda: [int(elapsed() / 0.2) * 10 % 360, 1])
+        sim.set_source("GPO_READ_VALUES", lambda: [int(elapsed()) % 2, 0, 0, 0, 0])
+        sim.set_source("AEC_AECCONVERGED", lambda: [int(elapsed() > 1.5)])
+        sim.set_source("PP_AGCGAIN", lambda: [(20.0 if elapsed() > 2 else 10.0) + 0.01 * (time.perf_counter_ns() % 7)])
+        return sim
+
+    def watcher_run(sim):
+        watcher = watch.Watcher(ReSpeaker(sim))
+        for name, rate in rates.items():
+            watcher.add(name, rate, deadband=0.5 if name == "PP_AGCGAIN" else 0.0)
+        changes = list(watcher.run(seconds))
+        return changes, watcher
+
+    def read_many_loop(sim):
+        """Everything read at the fastest rate, changes found by comparing the decoded values"""
+        respeaker = ReSpeaker(sim)
+        changes, last = [], {}
+        for sample in stream(respeaker, list(rates), max(rates.values()), count=int(seconds * max(rates.values()))):
+            for name, values in sample.values.items():
+                if last.get(name) != values:
+                    changes.append((name, values))
+                    last[name] = values
+        return changes, None
+
+    def thread_loops(sim):
+        """A thread per parameter, each reading at its own rate"""
+        respeaker = ReSpeaker(sim)
+        changes, lock = [], threading.Lock()
+
+        def loop(name, rate):
+            last = None
+            for sample in stream(respeaker, [name], rate, count=max(1, int(seconds * rate))):
+                values = sample.values[name]
+                if values != last:
+                    with lock:
+                        changes.append((name, values))
+                    last = values
+        threads = [threading.Thread(target=loop, args=item) for item in rates.items()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return changes, None
+
+    print(f"{'Case':<32} {'Transfers':>10} {'CPU':>9} {'Changes':>8}")
+    print("-" * 62)
+    results = {}
+    for label, func in (("read_many at 50 Hz", read_many_loop), ("thread per parameter", thread_loops), ("Watcher", watcher_run)):
+        sim = device()
+        cpu = time.process_time()
+        changes, watcher = func(sim)
+        cpu = time.process_time() - cpu
+        results[label] = (sim.transfers, cpu, changes, watcher)
+        print(f"{label:<32} {sim.transfers:>10} {cpu * 1000:>6.0f} ms {len(changes):>8}")
+
+    transfers, cpu, changes, watcher = results["Watcher"]
+    expected = sum(rate * seconds for rate in rates.values())
+    print(f"{'passes for ' + str(int(expected)) + ' reads':<32} {watcher.passes:>10}")
+
+    # a slow consumer makes the watcher skip deadlines, which it reports
+    sim = SimulatedDevice()
+    sim.set_source("DOA_VALUE", lambda: [time.perf_counter_ns() % 360, 1])
+    watcher = watch.Watcher(ReSpeaker(sim))
+    watcher.add("DOA_VALUE", 50, callback=lambda change: time.sleep(0.05))
+    for change in watcher.run(0.5):
+        pass
+    print(f"{'missed with a 50 ms callback':<32} {watcher.watches['DOA_VALUE'].missed:>10}")
+    return {'watch_transfers': transfers, 'watch_cpu_ms': cpu * 1000}
+
+def bench_cache(args):
+    """Parameter cache: transfers of a typical tooling session with and without the cache"""
+    import cache
+    import profiles
+
+    readable = [name for name, info in PARAMETERS.items() if info[3] != "wo"]
+    profile = {"PP_AGCONOFF": (1,), "PP_AGCMAXGAIN": (64.0,), "PP_MIN_NS": (0.25,), "AEC_HPFONOFF": (2,),
+               "AUDIO_MGR_MIC_GAIN": (8.0,), "LED_BRIGHTNESS": (128,)}
+
+    def firmware(sim, version, repo_hash):
+        sim.set("VERSION", list(version))
+        sim.set("BLD_REPO_HASH", repo_hash)
+        sim.set("BLD_MSG", "ua-io16-sqr")
+        sim.set("AEC_NUM_MICS", [4])
+
+    def session(respeaker):
+        """What a few tool invocations read and write"""
+        respeaker.read("VERSION")
+        for name in cache.BUILD_INFO:
+            respeaker.read(name)
+        respeaker.read_many(readable)
+        profiles.apply_profile(respeaker, profile)
+        respeaker.read("AEC_MIC_ARRAY_GEO")
+        respeaker.read("AEC_NUM_MICS")
+        for _ in range(20):
+            respeaker.read("DOA_VALUE")
+        respeaker.write("AUDIO_MGR_OP_L", [3, 1])
+        respeaker.read_many(["AUDIO_MGR_OP_L", "AUDIO_MGR_OP_L_PK0", "AUDIO_MGR_OP_ALL"])
+        profiles.apply_profile(respeaker, profile)
+        respeaker.read_many(list(profile))
+
+    print(f"{'Session':<40} {'Transfers':>10} {'Hits':>6} {'Misses':>7}")
+    print("-" * 66)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "build_info.json")
+        runs = {}
+        for label, make_cache in (("no cache", lambda: None),
+                                  ("cache, first run", lambda: cache.ParameterCache("serial:0001", path)),
+                                  ("cache, next run (build info on disk)", lambda: cache.ParameterCache("serial:0001", path))):
+            sim = SimulatedDevice()
+            firmware(sim, (2, 1, 0), "c0ffee00")
+            respeaker = ReSpeaker(sim, cache=make_cache())
+            session(respeaker)
+            runs[label] = sim.transfers
+            hits = respeaker.cache.hit_count if respeaker.cache else 0
+            misses = respeaker.cache.miss_count if respeaker.cache else 0
+            print(f"{label:<40} {sim.transfers:>10} {hits:>6} {misses:>7}")
+
+    # an uncached read pays one policy lookup
+    plain, cached = ReSpeaker(SimulatedDevice()), ReSpeaker(SimulatedDevice(), cache=cache.ParameterCache())
+    baseline = best_of(args.rounds, lambda: [plain.read("DOA_VALUE") for _ in range(args.number)])
+    optimized = best_of(args.rounds, lambda: [cached.read("DOA_VALUE") for _ in range(args.number)])
+    overhead = (optimized - baseline) / args.number
+    hit = best_of(args.rounds, lambda: [cached.read("VERSION") for _ in range(args.number)]) / args.number
+    print()
+    print(f"{'uncached read overhead':<40} {overhead * 1e6:>7.2f} us")
+    print(f"{'cached read':<40} {hit * 1e6:>7.2f} us")
+    return {'cache_transfers': runs["cache, next run (build info on disk)"], 'no_cache_transfers': runs["no cache"]}
+
+def bench_async(args):
+    """asyncio interface: DOA read latency during an AEC filter dump, event loop lag and reads waiting for retries"""
+    import asyncio
+    import concurrent.futures
+    import xvf_async
+
+    latency = 0.0002
+
+    def device():
+        sim = SimulatedDevice(latency=latency, aec_filter_length=1920)
+        sim.set_source("DOA_VALUE", lambda: [int(90 * time.monotonic()) % 360, 1])
+        return sim
+
+    async def doa_during_dump(read, dump):
+        """Read DOA_VALUE at 100 Hz until the dump finishes, return the read times"""
+        task = asyncio.ensure_future(dump())
+        times = []
+        while not task.done():
+            before = time.perf_counter()
+            await read()
+            times.append(time.perf_counter() - before)
+            await asyncio.sleep(0.01)
+        await task
+        return sorted(times)
+
+    async def executor_case():
+        """Every call on one executor thread, the USB handle is not shared"""
+        respeaker = ReSpeaker(device())
+        pool = concurrent.futures.ThreadPoolExecutor(1)
+        loop = asyncio.get_running_loop()
+        times = await doa_during_dump(lambda: loop.run_in_executor(pool, respeaker.read, "DOA_VALUE"),
+                                      lambda: loop.run_in_executor(pool, respeaker.dump_aec_filters))
+        pool.shutdown()
+        return times
+
+    async def async_case():
+        async with xvf_async.AsyncReSpeaker(ReSpeaker(device())) as dev:
+            return await doa_during_dump(lambda: dev.read("DOA_VALUE", xvf_async.PRIORITY_HIGH),
+                                         lambda: dev.call(ReSpeaker.dump_aec_filters))
+
+    print(f"{'DOA read during a filter dump':<32} {'Reads':>6} {'P50':>10} {'P99':>10}")
+    print("-" * 62)
+    results = {}
+    for label, case in (("run_in_executor", executor_case), ("AsyncReSpeaker", async_case)):
+        times = results[label] = asyncio.run(case())
+        print(f"{label:<32} {len(times):>6} {times[len(times) // 2] * 1000:>7.2f} ms {times[int(len(times) * 0.99)] * 1000:>7.2f} ms")
+    p99 = results["AsyncReSpeaker"][int(len(results["AsyncReSpeaker"]) * 0.99)]
+    print()
+
+    # the longest a 1 ms heartbeat waits while reads that need retrying for 20 ms are made
+    async def heartbeat_lag(read):
+        lags = []
+        stop = False
+
+        async def heartbeat():
+            while not stop:
+                before = time.perf_counter()
+                await asyncio.sleep(0.001)
+                lags.append(time.perf_counter() - before - 0.001)
+        task = asyncio.ensure_future(heartbeat())
+        await asyncio.sleep(0.005)
+        for name in ("AEC_AZIMUTH_VALUES", "AEC_SPENERGY_VALUES", "DOA_VALUE"):
+            await read(name)
+        stop = True
+        await task
+        return max(lags)
+
+    async def lag_case(blocking):
+        sim = SimulatedDevice(ready_after=0.02)
+        respeaker = ReSpeaker(sim)
+        if blocking:
+            return await heartbeat_lag(lambda name: asyncio.sleep(0, respeaker.read(name)))
+        async with xvf_async.AsyncReSpeaker(respeaker) as dev:
+            return await heartbeat_lag(dev.read)
+
+    blocking, awaited = asyncio.run(lag_case(True)), asyncio.run(lag_case(False))
+    print(f"{'Event loop lag':<32} {'Max':>10}")
+    print("-" * 44)
+    print(f"{'blocking read':<32} {blocking * 1000:>7.2f} ms")
+    print(f"{'AsyncReSpeaker.read':<32} {awaited * 1000:>7.2f} ms")
+    print()
+
+    # reads waiting for their retries do not hold up each other
+    names = ["AEC_AZIMUTH_VALUES", "AEC_SPENERGY_VALUES", "DOA_VALUE", "AUDIO_MGR_MIC_GAIN", "PP_AGCGAIN"]
+
+    async def concurrent_reads():
+        async with xvf_async.AsyncReSpeaker(ReSpeaker(SimulatedDevice(ready_after=0.02))) as dev:
+            start = time.perf_counter()
+            await asyncio.gather(*[dev.read(name) for name in names])
+            return time.perf_counter() - start
+
+    respeaker = ReSpeaker(SimulatedDevice(ready_after=0.02))
+    start = time.perf_counter()
+    for name in names:
+        respeaker.read(name)
+    sequential = time.perf_counter() - start
+    elapsed = asyncio.run(concurrent_reads())
+    print(f"{len(names)} reads retried for 20 ms: {sequential * 1000:.0f} ms one after the other, {elapsed * 1000:.0f} ms queued together")
+
+    return {'async_doa_p99_ms': p99 * 1000, 'async_loop_lag_ms': awaited * 1000}
+
+def bench_i2c(args):
+    """I2C transport: per-transfer cost of the ReSpeaker API over a simulated I2C bus, and throughput against USB"""
+    import i2c_transport
+    from simulator import SimulatedI2cBus
+
+    def i2c(sim, clock=None):
+        return ReSpeaker(i2c_transport.I2cTransport(SimulatedI2cBus(sim, clock=clock)))
+
+    class PerCallTransport(i2c_transport.I2cTransport):
+        """The I2C_RDWR request built on every transfer"""
+        def ctrl_transfer(self, bmRequestType, bRequest, wValue, wIndex, data_or_wLength, timeout=None):
+            self.transactions.clear()
+            return super().ctrl_transfer(bmRequestType, bRequest, wValue, wIndex, data_or_wLength, timeout)
+
+    number = args.number
+    usb = ReSpeaker(SimulatedDevice())
+    per_call = ReSpeaker(PerCallTransport(SimulatedI2cBus()))
+    respeaker = i2c(SimulatedDevice())
+    direct = best_of(args.rounds, lambda: [usb.read("DOA_VALUE") for _ in range(number)])
+    baseline = best_of(args.rounds, lambda: [per_call.read("DOA_VALUE") for _ in range(number)])
+    optimized = best_of(args.rounds, lambda: [respeaker.read("DOA_VALUE") for _ in range(number)])
+    print(f"{'Case':<36} {'Before':>12} {'After':>12} {'Speedup':>8}")
+    print("-" * 72)
+    report("I2C read, request per call vs reused", baseline, optimized, number)
+    overhead = (optimized - direct) / number
+    print(f"{'I2C transport and bus, per read':<36} {overhead * 1e6:>9.2f} us")
+    print()
+
+    # reads per second and response bytes per second of a modelled bus
+    count = max(10, args.number // 1000)
+    print(f"{'Transport':<24} {'Reads/s':>9} {'Payload':>14} {'P50':>10} {'P99':>10}")
+    print("-" * 72)
+    results = {}
+    for label, respeaker in (("USB, 250 us transfers", ReSpeaker(SimulatedDevice(latency=0.00025))),
+                             ("I2C, 100 kHz", i2c(SimulatedDevice(), 100000)),
+                             ("I2C, 400 kHz", i2c(SimulatedDevice(), 400000)),
+                             ("I2C, 1 MHz", i2c(SimulatedDevice(), 1000000))):
+        result = results[label] = i2c_transport.throughput(respeaker, i2c_transport.THROUGHPUT_PARAMETERS, count)
+        i2c_transport.print_throughput(label, result)
+    return {'i2c_read_us': optimized / number * 1e6, 'i2c_overhead_us': overhead * 1e6,
+            'i2c_400k_reads_per_s': results["I2C, 400 kHz"]["reads"] / results["I2C, 400 kHz"]["seconds"]}
+
+BENCHMARKS = {
+    "codec": bench_codec,
+    "snapshot": bench_snapshot,
+    "retry": bench_retry,
+    "stream": bench_stream,
+    "recorder": bench_recorder,
+    "aec": bench_aec,
+    "daemon": bench_daemon,
+    "import": bench_import,
+    "devices": bench_devices,
+    "profile": bench_profile,
+    "dfu": bench_dfu,
+    "headroom": bench_headroom,
+    "stats": bench_stats,
+    "control": bench_control,
+    "capture": bench_capture,
+    "tracking": bench_tracking,
+    "led": bench_led,
+    "watch": bench_watch,
+    "cache": bench_cache,
+    "async": bench_async,
+    "i2c": bench_i2c,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description='ReSpeaker host control benchmarks against a simulated device')
+    parser.add_argument('BENCHMARK', nargs='*',
+                        help='benchmarks to run: {} (default: all)'.format(', '.join(BENCHMARKS)))
+    parser.add_argument('-n', '--number', type=int, default=20000,
+                        help='iterations per measurement (default: 20000)')
+    parser.add_argument('-r', '--rounds', type=int, default=3,
+                        help='rounds per wall-clock measurement, the best is reported (default: 3)')
+    parser.add_argument('--import-threshold', type=float, default=10.0,
+                        help='fail if importing xvf_host, besides logging, takes longer, in ms (default: 10)')
+    parser.add_argument('--usb-enumeration', type=float, default=40.0, metavar='MS',
+                        help='time the daemon benchmark models for enumerating and opening the USB device in a cold CLI process (default: 40)')
+    parser.add_argument('--replay-log', metavar='FILE',
+                        help='run the control suite on a transfer log recorded with xvf_host.py --record '
+                             '(default: a session recorded against the simulator)')
+    parser.add_argument('--json', metavar='FILE',
+                        help='save the results of the benchmarks that report them to FILE')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='compare the results with a file saved by --json')
+    args = parser.parse_args()
+    for name in args.BENCHMARK:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark '{name}'")
+
+    results = {}
+    for name in args.BENCHMARK or BENCHMARKS:
+        print(f"\n=== {name}: {BENCHMARKS[name].__doc__} ===\n")
+        result = BENCHMARKS[name](args)
+        if result:
+            results[name] = result
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)["results"]
+        print(f"\n=== compared with {args.compare} ===\n")
+        print(f"{'Result':<36} {'Before':>12} {'After':>12} {'Ratio':>8}")
+        print("-" * 72)
+        for name, result in results.items():
+            for key, value in result.items():
+                before = previous.get(name, {}).get(key)
+                if before is not None:
+                    ratio = f"{value / before:>7.2f}x" if before else ""
+                    print(f"{name + '.' + key:<36} {before:>12.3f} {value:>12.3f} {ratio:>8}")
+    if args.json:
+        try:
+            commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                    cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+        except OSError:
+            commit = None
+        with open(args.json, "w") as f:
+            json.dump({"commit": commit, "python": sys.version.split()[0], "time": time.time(), "results": results}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
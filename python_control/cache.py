@@ -0,0 +1,192 @@
+
+import os
+import time
+
+from xvf_host import PARAMETERS, COMMANDS, usb_path, usb_serial
+
+# Build information, the same for as long as the device runs the same
+# firmware: kept on disk, keyed by device identity and BLD_REPO_HASH
+BUILD_INFO = ("VERSION", "BLD_MSG", "BLD_HOST", "BLD_REPO_HASH", "BLD_MODIFIED")
+
+# read-only values that do not change until the device reboots
+BOOT_STATIC = ("BOOT_STATUS", "AEC_NUM_MICS", "AEC_NUM_FARENDS", "AEC_MIC_ARRAY_TYPE", "AEC_MIC_ARRAY_GEO")
+
+# read/write parameters whose reads do not return the last value written:
+# the device updates them (current gain, current level), they select what
+# another command reads (paging, pin index), or they reboot the chip
+VOLATILE = (
+    "PP_AGCGAIN", "PP_MGSCALE", "AEC_AECSILENCELEVEL",
+    "SPECIAL_CMD_AEC_FILTER_COEFF_START_OFFSET", "SPECIAL_CMD_AEC_FILTER_COEFFS", "GPO_PIN_ACTIVE_LEVEL",
+    "TEST_CORE_BURN", "USB_BIT_DEPTH",
+)
+
+# writes that reset every parameter to its default: the commands whose
+# description says they reboot the chip, and CLEAR_CONFIGURATION
+RESETS = frozenset([name for name, info in PARAMETERS.items() if 'reboot the chip' in info[5]] + ["CLEAR_CONFIGURATION"])
+
+# parameters writing each other: AUDIO_MGR_OP_L is AUDIO_MGR_OP_L_PK0,
+# AUDIO_MGR_OP_ALL sets all the others...
+LINKED = tuple(name for name in PARAMETERS if name.startswith("AUDIO_MGR_OP_"))
+
+# how each parameter is cached
+CACHE_BUILD = 'build'
+CACHE_BOOT = 'boot'
+CACHE_WRITE_THROUGH = 'rw'
+CACHE_TTL = 'ttl'
+
+DEFAULT_PATH = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                            'xvf_host', 'build_info.json')
+
+
+def device_identity(dev):
+    """
+    Serial number, or else bus-port path, of the USB device behind a
+    transport, the `identity` of other transports that have one, e.g. the
+    I2C adapter and address, None otherwise
+    """
+    if not hasattr(dev, 'port_numbers'):
+        return getattr(dev, 'identity', None)
+    serial = usb_serial(dev)
+    return 'serial:' + serial if serial else 'path:' + usb_path(dev)
+
+
+class ParameterCache:
+    """
+    Values of the parameters that do not need reading every time, set as
+    ReSpeaker.cache, or passed to ReSpeaker(), to serve read() and
+    read_many() from it.
+
+    BUILD_INFO is kept on disk at `path` for the device `identity`, and is
+    only used once BLD_REPO_HASH, read from the device, matches. BOOT_STATIC
+    values are kept until a reset. Read/write parameters, except VOLATILE
+    ones, are kept as last read or written. Other read-only values are only
+    cached with a time to live in seconds in `ttl`, e.g. {"DOA_VALUE": 0.01}.
+    A write of a RESETS command drops everything, BUILD_INFO included, as
+    the device may come back with another firmware.
+
+    A write is cached as its payload decodes, so values the device clamps or
+    ignores are not seen; read with cached=False to check them.
+    """
+
+    def __init__(self, identity=None, path=DEFAULT_PATH, ttl=None):
+        self.identity = identity
+        self.path = path if identity is not None else None
+        self.ttl = dict(ttl or {})
+        self.policies = {}
+        for name, (_, _, _, access, _, _) in PARAMETERS.items():
+            if name in BUILD_INFO:
+                self.policies[name] = CACHE_BUILD
+            elif name in BOOT_STATIC:
+                self.policies[name] = CACHE_BOOT
+            elif access == "rw" and name not in VOLATILE:
+                self.policies[name] = CACHE_WRITE_THROUGH
+        for name in self.ttl:
+            if name not in COMMANDS:
+                raise ValueError('Unknown parameter: {}'.format(name))
+            self.policies[name] = CACHE_TTL
+        self.values = {} # name -> (values, expiry time.monotonic() or None)
+        self.validated = False # BUILD_INFO on disk checked against the device
+        self.saved = False
+        self.hits = {}
+        self.misses = {}
+
+    def get(self, respeaker, command):
+        """Cached values of `command`, None if it must be read from `respeaker`"""
+        name = command.name
+        policy = self.policies.get(name)
+        if policy is None:
+            return None
+        if policy == CACHE_BUILD and not self.validated:
+            self._load(respeaker)
+        entry = self.values.get(name)
+        if entry is not None and (entry[1] is None or time.monotonic() < entry[1]):
+            self.hits[name] = self.hits.get(name, 0) + 1
+            return entry[0]
+        self.misses[name] = self.misses.get(name, 0) + 1
+        return None
+
+    def put(self, command, values):
+        """Keep the values just read from the device, if `command` is cached"""
+        name = command.name
+        policy = self.policies.get(name)
+        if policy is None:
+            return
+        self.values[name] = (values, time.monotonic() + self.ttl[name] if policy == CACHE_TTL else None)
+        if policy == CACHE_BUILD and not self.saved and all(info in self.values for info in BUILD_INFO):
+            self._save()
+
+    def written(self, command, payload):
+        """Update the cache after `payload` was written with `command`"""
+        name = command.name
+        if name in RESETS:
+            self.invalidate()
+        elif name in LINKED:
+            for linked in LINKED:
+                self.values.pop(linked, None)
+        if self.policies.get(name) == CACHE_WRITE_THROUGH:
+            self.values[name] = (command.decode(b'\0' + bytes(payload)), None)
+
+    def invalidate(self):
+        """Forget every value, e.g. after the device rebooted"""
+        self.values.clear()
+        self.validated = False
+        self.saved = False
+
+    def _load(self, respeaker):
+        """Check the BUILD_INFO on disk against BLD_REPO_HASH and load it if it matches"""
+        self.validated = True
+        stored = self._read_file().get(self.identity) if self.path else None
+        if not stored:
+            return
+        command = COMMANDS["BLD_REPO_HASH"]
+        repo_hash = command.decode(respeaker._read_response(command))
+        self.values[command.name] = (repo_hash, None)
+        if stored.get("BLD_REPO_HASH") != repo_hash:
+            return
+        for name in BUILD_INFO:
+            if name in stored:
+                values = stored[name]
+                self.values[name] = (values if isinstance(values, str) else tuple(values), None)
+        self.saved = True
+
+    def _read_file(self):
+        import json
+
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        import json
+
+        self.saved = True
+        if not self.path:
+            return
+        devices = self._read_file()
+        devices[self.identity] = {name: self.values[name][0] for name in BUILD_INFO}
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path + '.tmp', 'w') as f:
+                json.dump(devices, f, indent=1)
+            os.replace(self.path + '.tmp', self.path)
+        except OSError:
+            pass # the cache is an optimization, a read-only home is not an error
+
+    @property
+    def hit_count(self):
+        return sum(self.hits.values())
+
+    @property
+    def miss_count(self):
+        return sum(self.misses.values())
+
+
+def print_cache_stats(cache):
+    print(f"{'Parameter':<36} {'Hits':>7} {'Misses':>7}")
+    print("-" * 52)
+    for name in sorted(set(cache.hits) | set(cache.misses)):
+        print(f"{name:<36} {cache.hits.get(name, 0):>7} {cache.misses.get(name, 0):>7}")
+    total = cache.hit_count + cache.miss_count
+    print(f"{cache.hit_count} hits, {cache.miss_count} misses ({cache.hit_count * 100 / total if total else 0:.0f}% hit rate)")
@@ -0,0 +1,284 @@
+
+import os
+import sys
+import time
+import wave
+import argparse
+import threading
+
+import numpy as np
+
+from xvf_host import find
+from telemetry import stream, TELEMETRY_PARAMETERS
+from recorder import TelemetryRecorder, RECORD_DTYPE
+
+
+class SyntheticSource:
+    """
+    A sine tone per channel, for running the pipeline without an audio
+    device. With `realtime` the blocks are paced at the sample rate,
+    otherwise they are produced as fast as they are consumed.
+    """
+
+    def __init__(self, channels=6, rate=16000, duration=None, realtime=True):
+        self.channels = channels
+        self.rate = rate
+        self.remaining = None if duration is None else int(duration * rate)
+        self.realtime = realtime
+        self.position = 0
+        self.frequencies = 220.0 * np.arange(1, channels + 1)
+
+    def open(self):
+        """Start producing audio and return the time.monotonic() of the first sample"""
+        self.start = time.monotonic()
+        return self.start
+
+    def read_into(self, block):
+        """Fill `block` (frames x channels, int16) and return the number of frames read, 0 at the end"""
+        frames = len(block)
+        if self.remaining is not None:
+            frames = min(frames, self.remaining)
+            self.remaining -= frames
+        if self.realtime:
+            delay = self.start + (self.position + frames) / self.rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        t = (self.position + np.arange(frames)) / self.rate
+        block[:frames] = 8000 * np.sin(2 * np.pi * t[:, None] * self.frequencies)
+        self.position += frames
+        return frames
+
+    def close(self):
+        pass
+
+
+class WavSource:
+    """16-bit audio from a WAV file, e.g. for replaying a capture through the pipeline"""
+
+    def __init__(self, path):
+        self.wav = wave.open(path, 'rb')
+        if self.wav.getsampwidth() != 2:
+            raise ValueError('{} is not 16-bit audio'.format(path))
+        self.channels = self.wav.getnchannels()
+        self.rate = self.wav.getframerate()
+
+    def open(self):
+        return time.monotonic()
+
+    def read_into(self, block):
+        data = self.wav.readframes(len(block))
+        frames = len(data) // (2 * self.channels)
+        block[:frames] = np.frombuffer(data, '<i2').reshape(frames, self.channels)
+        return frames
+
+    def close(self):
+        self.wav.close()
+
+
+class SounddeviceSource:
+    """Audio from an input device through the sounddevice package (PortAudio, ALSA on Linux)"""
+
+    def __init__(self, channels=6, rate=16000, device=None, duration=None):
+        try:
+            import sounddevice
+        except ImportError:
+            raise ValueError('sounddevice is required for audio capture (pip install sounddevice)')
+        self.channels = channels
+        self.rate = rate
+        self.remaining = None if duration is None else int(duration * rate)
+        self.stream = sounddevice.InputStream(samplerate=rate, channels=channels, dtype='int16', device=device)
+
+    def open(self):
+        self.stream.start()
+        # the first sample was captured one input latency before it can be read
+        return time.monotonic() - self.stream.latency
+
+    def read_into(self, block):
+        frames = len(block)
+        if self.remaining is not None:
+            frames = min(frames, self.remaining)
+            self.remaining -= frames
+        if not frames:
+            return 0
+        data, overflowed = self.stream.read(frames)
+        block[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self.stream.close()
+
+
+def unwrap_interp(times, sample_times, values, period):
+    """Interpolate angles through the shortest way round, i.e. across the wrap around"""
+    unwrapped = np.unwrap(values * (2 * np.pi / period), axis=0) * (period / (2 * np.pi))
+    if unwrapped.ndim == 1:
+        return np.interp(times, sample_times, unwrapped) % period
+    return np.stack([np.interp(times, sample_times, column) for column in unwrapped.T], axis=1) % period
+
+def interpolate(records, times):
+    """
+    Telemetry `records` (RECORD_DTYPE, in time order) interpolated onto
+    `times`: angles are interpolated circularly, energies linearly, and VAD is
+    held from the last sample at or before each time. Outside the records
+    the first or last sample is held.
+    """
+    out = np.zeros(len(times), RECORD_DTYPE)
+    out['timestamp'] = times
+    if len(records) == 0:
+        return out
+    sample_times = records['timestamp']
+    out['azimuth'] = unwrap_interp(times, sample_times, records['azimuth'].astype(np.float64), 2 * np.pi)
+    for beam in range(records['energy'].shape[1]):
+        out['energy'][:, beam] = np.interp(times, sample_times, records['energy'][:, beam])
+    out['doa'] = np.rint(unwrap_interp(times, sample_times, records['doa'].astype(np.float64), 360)) % 360
+    previous = np.clip(np.searchsorted(sample_times, times, 'right') - 1, 0, len(records) - 1)
+    out['vad'] = records['vad'][previous]
+    return out
+
+
+class Capture:
+    """
+    Records audio from `source` to a streaming WAV file, and the DOA and beam
+    telemetry of `dev`, polled at `rate_hz` on a separate thread, to a sidecar
+    file with one TelemetryRecorder record per audio frame of `frame_size`
+    samples. Both streams are stamped with time.monotonic(): the audio by
+    counting samples from the time of the first one, the telemetry at the
+    middle of its transfers. Every frame record holds the time of the middle
+    of the frame and the telemetry interpolated to it, so the sidecar is read
+    with recorder.TelemetryReader and record i belongs to audio frame i.
+
+    Audio is read into a preallocated block of `block_frames` frames and
+    written out block by block, so nothing grows with the recording. A partial
+    frame at the end of the audio gets no record.
+    """
+
+    def __init__(self, source, dev, wav_path, sidecar_path, frame_size=256, block_frames=16,
+                 rate_hz=100, max_lag=0.2):
+        self.source = source
+        self.dev = dev
+        self.wav_path = wav_path
+        self.sidecar_path = sidecar_path
+        self.frame_size = frame_size
+        self.rate_hz = rate_hz
+        self.max_lag = max_lag
+        self.block = np.empty((frame_size * block_frames, source.channels), np.int16)
+        # middle of every frame of a block, in samples from the start of the block
+        self.centers = np.arange(block_frames) * frame_size + frame_size / 2.0
+        # recent telemetry, filled by the poller thread
+        self.telemetry = TelemetryRecorder(capacity=max(256, int(rate_hz * 10)))
+        self.lock = threading.Lock()
+        self.latest = float('-inf')
+        self.running = False
+        self.poller = None
+        self.error = None
+        self.frames = 0
+
+    def poll(self):
+        try:
+            for sample in stream(self.dev, TELEMETRY_PARAMETERS, self.rate_hz):
+                if not self.running:
+                    break
+                with self.lock:
+                    self.telemetry.append_sample(sample)
+                    self.latest = sample.timestamp
+        except Exception as e:
+            self.error = e
+
+    def recent(self, since, until):
+        """
+        Copy of the telemetry records around `since` .. `until`, waiting up
+        to max_lag for the poller to catch up with `until`
+        """
+        deadline = time.monotonic() + self.max_lag
+        while self.poller is not None and self.latest < until and time.monotonic() < deadline and self.error is None:
+            time.sleep(0.002)
+        with self.lock:
+            records = self.telemetry.view()
+            first = max(0, np.searchsorted(records['timestamp'], since) - 1)
+            return records[first:].copy()
+
+    def run(self, poll=True):
+        """
+        Capture until the source ends or KeyboardInterrupt. Without `poll`,
+        the telemetry already in self.telemetry is used instead of polling dev.
+        """
+        wav = wave.open(self.wav_path, 'wb')
+        wav.setnchannels(self.source.channels)
+        wav.setsampwidth(2)
+        wav.setframerate(self.source.rate)
+        sidecar = TelemetryRecorder(path=self.sidecar_path)
+        self.running = True
+        if poll:
+            self.poller = threading.Thread(target=self.poll, daemon=True)
+            self.poller.start()
+        try:
+            start = self.source.open()
+            samples = 0
+            while True:
+                count = self.source.read_into(self.block)
+                if not count:
+                    break
+                wav.writeframesraw(memoryview(self.block[:count]).cast('B'))
+                frames = count // self.frame_size
+                times = start + (samples + self.centers[:frames]) / self.source.rate
+                if frames:
+                    sidecar.append_records(interpolate(self.recent(times[0], times[-1]), times))
+                samples += count
+                self.frames += frames
+                if self.error is not None:
+                    raise self.error
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.running = False
+            if self.poller is not None:
+                self.poller.join()
+            self.source.close()
+            wav.close()
+            sidecar.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record ReSpeaker audio with per-frame DOA and beam metadata')
+    parser.add_argument('WAV', help='audio file to write')
+    parser.add_argument('--sidecar', help='per-frame metadata file (default: WAV with a .telemetry extension)')
+    parser.add_argument('--source', default='sounddevice',
+                       help="'sounddevice' (default), 'synthetic', or a WAV file to read the audio from")
+    parser.add_argument('--audio-device', help='sounddevice input device name or index')
+    parser.add_argument('--channels', type=int, default=6,
+                       help='audio channels (default: 6)')
+    parser.add_argument('--rate', type=int, default=16000,
+                       help='audio sample rate (default: 16000)')
+    parser.add_argument('--frame', type=int, default=256,
+                       help='samples per metadata frame (default: 256)')
+    parser.add_argument('--meta-rate', type=float, default=100,
+                       help='telemetry polls per second (default: 100)')
+    parser.add_argument('--duration', type=float,
+                       help='seconds to record (default: until interrupted)')
+    args = parser.parse_args()
+    sidecar = args.sidecar or os.path.splitext(args.WAV)[0] + '.telemetry'
+
+    try:
+        if args.source == 'sounddevice':
+            device = int(args.audio_device) if args.audio_device and args.audio_device.isdigit() else args.audio_device
+            source = SounddeviceSource(args.channels, args.rate, device, args.duration)
+        elif args.source == 'synthetic':
+            source = SyntheticSource(args.channels, args.rate, args.duration)
+        else:
+            source = WavSource(args.source)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    dev = find()
+    if not dev:
+        print('No device found')
+        sys.exit(1)
+    capture = Capture(source, dev, args.WAV, sidecar, args.frame, rate_hz=args.meta_rate)
+    try:
+        capture.run()
+    finally:
+        dev.close()
+    print(f"Recorded {capture.frames} frames to {args.WAV} and {sidecar}")
+
+if __name__ == '__main__':
+    main()
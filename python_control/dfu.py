@@ -0,0 +1,326 @@
+
+import re
+import sys
+import time
+import struct
+import hashlib
+import argparse
+import collections
+
+from xvf_host import Command, find, find_device, usb_path
+
+# DFU controller servicer, as described by host_control/<platform>/dfu_cmds.yaml
+DFU_RESID = 0xF0
+DFU_PARAMETERS = {
+    # name: (resid, cmdid, count, access, type, description)
+    "DFU_DETACH": (DFU_RESID, 0, 1, "wo", "uint8", "DFU Detach command. No valid payload."),
+    "DFU_DNLOAD": (DFU_RESID, 1, 130, "wo", "uint8", "DFU Download command. Two length bytes followed by 128 bytes of data."),
+    "DFU_UPLOAD": (DFU_RESID, 2, 130, "ro", "uint8", "DFU Upload command. Two length bytes followed by 128 bytes of data."),
+    "DFU_GETSTATUS": (DFU_RESID, 3, 5, "ro", "uint8", "DFU Get Status command. Status byte, 3 byte timeout, state byte."),
+    "DFU_CLRSTATUS": (DFU_RESID, 4, 1, "wo", "uint8", "DFU Clear Status command. No valid payload."),
+    "DFU_GETSTATE": (DFU_RESID, 5, 1, "ro", "uint8", "DFU Get State. Returns 1 byte state number."),
+    "DFU_ABORT": (DFU_RESID, 6, 1, "wo", "uint8", "DFU Abort command. No valid payload."),
+    "DFU_SETALTERNATE": (DFU_RESID, 64, 1, "wo", "uint8", "Sets factory (0) or upgrade (1) DFU target"),
+    "DFU_TRANSFERBLOCK": (DFU_RESID, 65, 2, "rw", "uint8", "Sets the transfer block for upload. Internally autoincrements."),
+    "DFU_GETVERSION": (DFU_RESID, 88, 3, "ro", "uint8", "Returns device version."),
+    "DFU_REBOOT": (DFU_RESID, 89, 1, "wo", "uint8", "DFU Servicer-specific reboot command. No valid payload."),
+}
+
+# kept apart from COMMANDS so --list, --snapshot and profiles never touch them
+DFU_COMMANDS = {name: Command(name, *info[:5]) for name, info in DFU_PARAMETERS.items()}
+
+BLOCK_SIZE = 128
+# DFU_DNLOAD / DFU_UPLOAD payload: little-endian data length, then BLOCK_SIZE bytes of data
+BLOCK_HEADER = struct.Struct('<H')
+PAYLOAD_SIZE = BLOCK_HEADER.size + BLOCK_SIZE
+
+# DFU_GETSTATUS response after the control status byte: bStatus, bwPollTimeout (3 bytes, ms), bState
+DFU_STATUS_OK = 0
+
+DFU_STATE_APP_IDLE = 0
+DFU_STATE_APP_DETACH = 1
+DFU_STATE_IDLE = 2
+DFU_STATE_DNLOAD_SYNC = 3
+DFU_STATE_DNBUSY = 4
+DFU_STATE_DNLOAD_IDLE = 5
+DFU_STATE_MANIFEST_SYNC = 6
+DFU_STATE_MANIFEST = 7
+DFU_STATE_MANIFEST_WAIT_RESET = 8
+DFU_STATE_UPLOAD_IDLE = 9
+DFU_STATE_ERROR = 10
+
+# alternate settings of DFU_SETALTERNATE
+DFU_ALT_FACTORY = 0
+DFU_ALT_UPGRADE = 1
+
+# skipped: device already runs the image version and holds the image, nothing was downloaded
+# blocks: DFU_DNLOAD blocks sent, polls: DFU_GETSTATUS requests made
+# download_time, verify_time: seconds spent downloading and reading back
+# verified: None if not verified, otherwise whether the read back matched the image hash
+UpdateResult = collections.namedtuple('UpdateResult', ['skipped', 'version', 'blocks', 'polls', 'download_time', 'verify_time', 'verified'])
+
+
+class FirmwareImage:
+    """
+    A firmware image pre-sliced into DFU_DNLOAD payloads in one preallocated
+    buffer, with its SHA-256 computed once, so it can be sent to any number
+    of devices without copying or hashing it again.
+    """
+
+    def __init__(self, data, version=None):
+        self.size = len(data)
+        self.version = version
+        self.sha256 = hashlib.sha256(data).digest()
+        self.blocks = (self.size + BLOCK_SIZE - 1) // BLOCK_SIZE
+        self.payloads = bytearray(self.blocks * PAYLOAD_SIZE)
+        for index in range(self.blocks):
+            chunk = data[index * BLOCK_SIZE:(index + 1) * BLOCK_SIZE]
+            offset = index * PAYLOAD_SIZE
+            BLOCK_HEADER.pack_into(self.payloads, offset, len(chunk))
+            self.payloads[offset + BLOCK_HEADER.size:offset + BLOCK_HEADER.size + len(chunk)] = chunk
+        self.view = memoryview(self.payloads)
+
+    @classmethod
+    def from_file(cls, path, version=None):
+        """
+        Load an image file. Without a `version`, it is taken from a vX.Y.Z in
+        the file name, e.g. respeaker_xvf3800_usb_dfu_firmware_v2.1.0.bin.
+        """
+        with open(path, 'rb') as f:
+            data = f.read()
+        if version is None:
+            match = re.search(r'v(\d+)\.(\d+)\.(\d+)', path.replace('\\', '/').rsplit('/', 1)[-1])
+            if match:
+                version = tuple(int(part) for part in match.groups())
+        return cls(data, version)
+
+    def payload(self, index):
+        """Zero-copy DFU_DNLOAD payload of block `index`"""
+        return self.view[index * PAYLOAD_SIZE:(index + 1) * PAYLOAD_SIZE]
+
+
+class DfuUpdater:
+    """
+    Firmware update of a ReSpeaker through the DFU controller servicer, over
+    the same control transfers as every other command.
+
+    After each DFU_DNLOAD the servicer is polled with DFU_GETSTATUS, sleeping
+    the poll timeout it reports rather than a fixed delay, so blocks are sent
+    as fast as the device can write them.
+    """
+
+    def __init__(self, respeaker):
+        self.respeaker = respeaker
+        self.polls = 0
+
+    def _write(self, name, payload=b'\0'):
+        self.respeaker._transfer_out(DFU_COMMANDS[name], payload)
+
+    def _read(self, name):
+        return self.respeaker._read_response(DFU_COMMANDS[name])
+
+    def version(self):
+        return tuple(self._read("DFU_GETVERSION")[1:4])
+
+    def get_status(self):
+        """Return (bStatus, poll timeout in seconds, bState)"""
+        response = self._read("DFU_GETSTATUS")
+        self.polls += 1
+        timeout = response[2] | response[3] << 8 | response[4] << 16
+        return response[1], timeout / 1000.0, response[5]
+
+    def get_state(self):
+        return self._read("DFU_GETSTATE")[1]
+
+    def wait_state(self, states):
+        """Poll DFU_GETSTATUS until the servicer reaches one of `states`, honouring its poll timeout"""
+        while True:
+            status, timeout, state = self.get_status()
+            if status != DFU_STATUS_OK or state == DFU_STATE_ERROR:
+                raise ValueError('DFU error: status {}, state {}'.format(status, state))
+            if state in states:
+                return state
+            if timeout:
+                time.sleep(timeout)
+
+    def reset(self):
+        """Bring the servicer back to dfuIDLE from an error or an interrupted transfer"""
+        state = self.get_state()
+        if state == DFU_STATE_ERROR:
+            self._write("DFU_CLRSTATUS")
+        elif state != DFU_STATE_IDLE:
+            self._write("DFU_ABORT")
+
+    def download(self, image, progress=None):
+        """
+        Write `image` to the upgrade partition, block by block, then let the
+        servicer manifest it. `progress(block, blocks, elapsed)` is called
+        after every block.
+        """
+        self.reset()
+        self._write("DFU_SETALTERNATE", bytes([DFU_ALT_UPGRADE]))
+        start = time.perf_counter()
+        try:
+            for index in range(image.blocks):
+                self._write("DFU_DNLOAD", image.payload(index))
+                self.wait_state((DFU_STATE_DNLOAD_IDLE,))
+                if progress:
+                    progress(index + 1, image.blocks, time.perf_counter() - start)
+            # a zero length download ends the transfer and starts the manifestation
+            self._write("DFU_DNLOAD", bytes(PAYLOAD_SIZE))
+            self.wait_state((DFU_STATE_IDLE, DFU_STATE_MANIFEST_WAIT_RESET))
+        except BaseException:
+            self._write("DFU_ABORT")
+            raise
+
+    def upload_digest(self, size):
+        """SHA-256 of the first `size` bytes of the upgrade partition, read back with DFU_UPLOAD"""
+        self.reset()
+        self._write("DFU_SETALTERNATE", bytes([DFU_ALT_UPGRADE]))
+        self._write("DFU_TRANSFERBLOCK", bytes(2))
+        digest = hashlib.sha256()
+        remaining = size
+        start = 1 + BLOCK_HEADER.size
+        length = BLOCK_SIZE
+        try:
+            while remaining > 0 and length == BLOCK_SIZE:
+                response = self._read("DFU_UPLOAD")
+                length, = BLOCK_HEADER.unpack_from(response, 1)
+                digest.update(response[start:start + min(length, remaining)].tobytes())
+                remaining -= length
+        except BaseException:
+            self._write("DFU_ABORT")
+            raise
+        # a short block ends the upload, otherwise stop it here
+        if length == BLOCK_SIZE:
+            self._write("DFU_ABORT")
+        return digest.digest()
+
+    def verify(self, image):
+        """Whether the upgrade partition holds `image`"""
+        return self.upload_digest(image.size) == image.sha256
+
+    def reboot(self):
+        self._write("DFU_REBOOT")
+        if self.respeaker.cache is not None:
+            self.respeaker.cache.invalidate()
+
+    def update(self, image, force=False, verify=True, reboot=True, progress=None):
+        """
+        Download, verify and boot `image`, unless `force` is False and the
+        device already reports the image version and holds the image: the
+        version does not tell apart the configurations built from one release,
+        e.g. v2.1.0 and v2.1.0_48k2ch, so the partition is read back and
+        checked against the image digest first. Raises ValueError if the read
+        back after the download does not match the image.
+        """
+        version = self.version()
+        if image.version is not None and version == tuple(image.version) and not force:
+            start = time.perf_counter()
+            if self.verify(image):
+                return UpdateResult(True, version, 0, 0, 0.0, time.perf_counter() - start, True)
+
+        self.polls = 0
+        start = time.perf_counter()
+        self.download(image, progress)
+        download_time = time.perf_counter() - start
+
+        verified = None
+        start = time.perf_counter()
+        if verify:
+            verified = self.verify(image)
+            if not verified:
+                raise ValueError('Verification failed: the read back does not match the image')
+        verify_time = time.perf_counter() - start
+
+        if reboot:
+            self.reboot()
+        return UpdateResult(False, version, image.blocks, self.polls, download_time, verify_time, verified)
+
+
+def print_progress(block, blocks, elapsed):
+    if block % 64 and block != blocks:
+        return
+    rate = block * BLOCK_SIZE / elapsed / 1024 if elapsed else 0.0
+    print(f"\r{block}/{blocks} blocks ({block * 100 // blocks}%), {rate:.1f} KB/s", end='\n' if block == blocks else '', flush=True)
+
+def report(device_id, image, result):
+    if result.skipped:
+        print(f"{device_id}: already running this image, version {'.'.join(map(str, result.version))}, skipped")
+        return
+    rate = image.size / result.download_time / 1024
+    print(f"{device_id}: downloaded {image.size} bytes in {result.download_time:.2f} s ({rate:.1f} KB/s, "
+          f"{result.polls} status polls)" + (f", verified in {result.verify_time:.2f} s" if result.verified else ""))
+
+def main():
+    parser = argparse.ArgumentParser(description='Update the firmware of ReSpeaker arrays over the control interface')
+    parser.add_argument('IMAGE', help='firmware image, e.g. xmos_firmwares/usb/respeaker_xvf3800_usb_dfu_firmware_v2.1.0.bin')
+    parser.add_argument('--vid', type=lambda x: int(x, 0), default=0x2886,
+                       help='usb vendor ID (default: 0x2886)')
+    parser.add_argument('--pid', type=lambda x: int(x, 0), default=0x001A,
+                       help='usb product ID (default: 0x001A)')
+    parser.add_argument('--device', metavar='ID',
+                       help='bus-port path or serial number of the device to update')
+    parser.add_argument('--i2c', metavar='BUS',
+                       help='update the device on I2C adapter BUS (number or /dev/i2c-* path), e.g. a board running an I2S firmware')
+    parser.add_argument('--i2c-address', type=lambda x: int(x, 0), default=0x2C,
+                       help='I2C address of the device, with --i2c (default: 0x2C)')
+    parser.add_argument('--all', action='store_true',
+                       help='update every connected device in parallel')
+    parser.add_argument('--version', metavar='X.Y.Z',
+                       help='version of the image (default: taken from the file name)')
+    parser.add_argument('--force', action='store_true',
+                       help='update even if the device already runs the image version')
+    parser.add_argument('--no-verify', action='store_true',
+                       help='skip the read back of the image')
+    parser.add_argument('--no-reboot', action='store_true',
+                       help='do not reboot into the new image')
+    args = parser.parse_args()
+
+    version = tuple(int(part) for part in args.version.split('.')) if args.version else None
+    image = FirmwareImage.from_file(args.IMAGE, version)
+    if image.version is None and not args.force:
+        parser.error('cannot tell the image version from its name, give --version or --force')
+    options = dict(force=args.force, verify=not args.no_verify, reboot=not args.no_reboot)
+
+    if args.all:
+        from manager import DeviceManager
+        manager = DeviceManager.find(vid=args.vid, pid=args.pid)
+        if not len(manager):
+            print('No device found')
+            sys.exit(1)
+        failed = False
+        with manager:
+            futures = manager.submit(lambda respeaker: DfuUpdater(respeaker).update(image, **options))
+            for device_id, future in futures.items():
+                try:
+                    report(device_id, image, future.result())
+                except Exception as e:
+                    print(f"{device_id}: update failed: {e}")
+                    failed = True
+        sys.exit(1 if failed else 0)
+
+    if args.i2c:
+        import i2c_transport
+        dev = i2c_transport.find_i2c(args.i2c, args.i2c_address)
+        device_id = dev.dev.identity if dev else None
+    elif args.device:
+        dev = find_device(args.device, vid=args.vid, pid=args.pid)
+        device_id = args.device
+    else:
+        dev = find(vid=args.vid, pid=args.pid)
+        device_id = usb_path(dev.dev) if dev else None
+    if not dev:
+        print('No device found')
+        sys.exit(1)
+    try:
+        result = DfuUpdater(dev).update(image, progress=print_progress, **options)
+        report(device_id, image, result)
+    except Exception as e:
+        print(f"Update failed: {e}")
+        sys.exit(1)
+    finally:
+        dev.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+
+import json
+import math
+import time
+
+from telemetry import stream
+
+# stage: (current idle time, minimum idle time, reset of the minimum)
+STAGES = {
+    "AEC": ("AEC_CURRENT_IDLE_TIME", "AEC_MIN_IDLE_TIME", "AEC_RESET_MIN_IDLE_TIME"),
+    "PP": ("PP_CURRENT_IDLE_TIME", "PP_MIN_IDLE_TIME", "PP_RESET_MIN_IDLE_TIME"),
+    "AUDIO_MGR": ("AUDIO_MGR_CURRENT_IDLE_TIME", "AUDIO_MGR_MIN_IDLE_TIME", "AUDIO_MGR_RESET_MIN_IDLE_TIME"),
+    "I2S": ("I2S_CURRENT_IDLE_TIME", "I2S_MIN_IDLE_TIME", "I2S_RESET_MIN_IDLE_TIME"),
+}
+
+TICK = 10e-9 # idle and control times are counted in 10 ns ticks
+FRAME_PERIOD = 0.015 # 240 samples at 16 kHz
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a sorted list"""
+    return values[max(0, math.ceil(percent / 100.0 * len(values)) - 1)]
+
+def measure(dev, duration, rate_hz=50, frame_period=FRAME_PERIOD, threshold=10.0):
+    """
+    Reset the minimum idle time of every stage and the maximum control time,
+    sample the current idle times at `rate_hz` for `duration` seconds, then
+    read the minimums back. Returns a report dict, with idle times as
+    percent headroom of `frame_period` and a stage flagged `near_overrun`
+    when its minimum headroom is below `threshold` percent.
+    """
+    if frame_period <= 0:
+        raise ValueError('frame_period must be positive')
+    for current, minimum, reset in STAGES.values():
+        dev.write(reset, [0])
+    dev.write("RESET_MAX_CONTROL_TIME", [0])
+
+    currents = [current for current, _, _ in STAGES.values()]
+    samples = {stage: [] for stage in STAGES}
+    start = time.monotonic()
+    dropped = 0
+    for sample in stream(dev, currents, rate_hz, count=max(1, int(duration * rate_hz))):
+        dropped += sample.dropped
+        for stage, (current, _, _) in STAGES.items():
+            samples[stage].append(sample.values[current][0])
+    elapsed = time.monotonic() - start
+
+    final = dev.read_many([minimum for _, minimum, _ in STAGES.values()] + ["MAX_CONTROL_TIME"])
+    frame_ticks = frame_period / TICK
+    stages = {}
+    for stage, (_, minimum, _) in STAGES.items():
+        headroom = sorted(ticks * 100.0 / frame_ticks for ticks in samples[stage])
+        min_ticks = final[minimum][0]
+        stages[stage] = {
+            'min_idle_ticks': min_ticks,
+            'min': min_ticks * 100.0 / frame_ticks,
+            'p50': percentile(headroom, 50),
+            # 1st percentile, the headroom that 99% of the samples stay above
+            'p1': percentile(headroom, 1),
+            'samples': len(headroom),
+            'near_overrun': min_ticks * 100.0 / frame_ticks < threshold,
+        }
+    max_control_ticks = final["MAX_CONTROL_TIME"][0]
+    return {
+        'duration': elapsed,
+        'rate_hz': rate_hz,
+        'dropped': dropped,
+        'frame_period': frame_period,
+        'threshold': threshold,
+        'stages': stages,
+        'max_control_ticks': max_control_ticks,
+        'max_control_time': max_control_ticks * TICK,
+    }
+
+def print_report(report):
+    print(f"Headroom over {report['duration']:.1f} s, {report['rate_hz']:g} Hz sampling, "
+          f"{report['frame_period'] * 1000:g} ms frames ({report['dropped']} samples dropped)")
+    print(f"{'Stage':<12} {'Min':>8} {'P50':>8} {'P1':>8} {'Samples':>8}")
+    print("-" * 48)
+    for stage, result in report['stages'].items():
+        flag = f"  near overrun (< {report['threshold']:g}%)" if result['near_overrun'] else ""
+        print(f"{stage:<12} {result['min']:>7.1f}% {result['p50']:>7.1f}% {result['p1']:>7.1f}% {result['samples']:>8}{flag}")
+    print(f"Max control time: {report['max_control_time'] * 1e6:.1f} us")
+
+def save_report(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
@@ -0,0 +1,194 @@
+
+import os
+import sys
+import time
+import array
+import ctypes
+import argparse
+
+from xvf_host import COMMANDS, ReSpeaker, find
+
+# 7-bit address of the I2S firmwares, host_control/<platform>/transport_config.yaml
+I2C_ADDRESS = 0x2C
+
+# linux/i2c-dev.h, linux/i2c.h
+I2C_RDWR = 0x0707
+I2C_M_RD = 0x0001
+
+# largest transaction of the device control I2C servicer, and so the largest
+# payload: RESID, CMDID and length bytes, then the payload
+I2C_TRANSACTION_MAX_BYTES = 256
+I2C_HEADER_SIZE = 3
+
+
+class I2cMsg(ctypes.Structure):
+    _fields_ = [('addr', ctypes.c_uint16), ('flags', ctypes.c_uint16),
+                ('len', ctypes.c_uint16), ('buf', ctypes.POINTER(ctypes.c_uint8))]
+
+class I2cRdwrData(ctypes.Structure):
+    _fields_ = [('msgs', ctypes.POINTER(I2cMsg)), ('nmsgs', ctypes.c_uint32)]
+
+
+class I2cBus:
+    """A Linux I2C adapter: /dev/i2c-<bus> if `bus` is a number, otherwise the path `bus`"""
+
+    def __init__(self, bus=1):
+        self.path = '/dev/i2c-{}'.format(bus) if str(bus).isdigit() else bus
+        self.fd = os.open(self.path, os.O_RDWR)
+
+    def ioctl(self, request, data):
+        import fcntl
+        fcntl.ioctl(self.fd, request, data)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class Transaction:
+    """
+    The I2C_RDWR request of one (RESID, CMDID, length): a write of the
+    header and payload, and for reads a read of the status byte and data
+    after a repeated start, built once over buffers that are reused.
+    """
+    __slots__ = ('data', 'msgs', 'header', 'payload', 'response')
+
+    def __init__(self, address, resid, cmdid, length, read):
+        self.header = (ctypes.c_uint8 * (I2C_HEADER_SIZE if read else I2C_HEADER_SIZE + length))(resid, cmdid, length)
+        # where a write payload goes
+        self.payload = memoryview(self.header).cast('B')[I2C_HEADER_SIZE:]
+        self.msgs = (I2cMsg * 2)()
+        self.msgs[0] = I2cMsg(address, 0, len(self.header), ctypes.cast(self.header, ctypes.POINTER(ctypes.c_uint8)))
+        self.response = None
+        if read:
+            self.response = array.array('B', bytes(length))
+            buf = ctypes.cast(self.response.buffer_info()[0], ctypes.POINTER(ctypes.c_uint8))
+            self.msgs[1] = I2cMsg(address, I2C_M_RD, length, buf)
+        self.data = I2cRdwrData(self.msgs, 2 if read else 1)
+
+
+class I2cTransport:
+    """
+    Control transfers over I2C, for the I2S firmwares, as a ReSpeaker
+    transport: ReSpeaker(I2cTransport(1)) reads and writes parameters the
+    same way it does over USB, SERVICER_COMMAND_RETRY responses included.
+
+    A read is one I2C_RDWR ioctl: the RESID, CMDID | 0x80 and length, then
+    the status byte and data after a repeated start. A write is the RESID,
+    CMDID, length and payload. `bus` is the adapter number, a /dev/i2c-*
+    path, or an object with the same ioctl() and close() as I2cBus, e.g.
+    simulator.SimulatedI2cBus. The request of every (RESID, CMDID, length)
+    is built on first use and reused.
+    """
+
+    def __init__(self, bus=1, address=I2C_ADDRESS):
+        self.bus = bus if hasattr(bus, 'ioctl') else I2cBus(bus)
+        self.address = address
+        # cache.device_identity() of the device
+        self.identity = 'i2c:{}:0x{:02x}'.format(getattr(self.bus, 'path', bus), address)
+        self.transactions = {} # (wIndex, wValue, length) -> Transaction
+
+    def _transaction(self, wValue, wIndex, length, read):
+        if length > I2C_TRANSACTION_MAX_BYTES - I2C_HEADER_SIZE:
+            raise ValueError('{} bytes do not fit in an I2C transaction'.format(length))
+        transaction = self.transactions[(wIndex, wValue, length)] = Transaction(self.address, wIndex, wValue, length, read)
+        return transaction
+
+    def ctrl_transfer(self, bmRequestType, bRequest, wValue, wIndex, data_or_wLength, timeout=None):
+        if bmRequestType & 0x80:
+            transaction = self.transactions.get((wIndex, wValue, data_or_wLength))
+            if transaction is None:
+                transaction = self._transaction(wValue, wIndex, data_or_wLength, True)
+            self.bus.ioctl(I2C_RDWR, transaction.data)
+            # a copy, the buffer is overwritten by the next read
+            return transaction.response[:]
+        length = len(data_or_wLength)
+        transaction = self.transactions.get((wIndex, wValue, length))
+        if transaction is None:
+            transaction = self._transaction(wValue, wIndex, length, False)
+        transaction.payload[:] = data_or_wLength
+        self.bus.ioctl(I2C_RDWR, transaction.data)
+        return length
+
+    def close(self):
+        self.bus.close()
+
+
+def find_i2c(bus=1, address=I2C_ADDRESS):
+    """Return a ReSpeaker over I2C, None if the adapter is missing or no device answers at `address`"""
+    try:
+        transport = I2cTransport(bus, address)
+    except OSError:
+        return None
+    respeaker = ReSpeaker(transport)
+    try:
+        respeaker.read("VERSION")
+    except (OSError, ValueError):
+        # no ACK from the address, or another device answering there
+        respeaker.close()
+        return None
+    return respeaker
+
+
+def throughput(respeaker, names, count):
+    """
+    Read `names` one after the other `count` times and return the reads,
+    response bytes and seconds it took, and the P50 and P99 of one read in
+    seconds
+    """
+    commands = [COMMANDS[name] for name in names]
+    times = []
+    start = time.perf_counter()
+    for _ in range(count):
+        for command in commands:
+            before = time.perf_counter()
+            respeaker._read_response(command)
+            times.append(time.perf_counter() - before)
+    elapsed = time.perf_counter() - start
+    times.sort()
+    return {'reads': len(times), 'bytes': count * sum(command.length for command in commands), 'seconds': elapsed,
+            'p50': times[len(times) // 2], 'p99': times[int(len(times) * 0.99)]}
+
+def print_throughput(label, result):
+    print(f"{label:<24} {result['reads'] / result['seconds']:>9.0f} {result['bytes'] / result['seconds'] / 1000:>9.1f} KB/s "
+          f"{result['p50'] * 1e6:>7.0f} us {result['p99'] * 1e6:>7.0f} us")
+
+# small telemetry reads and the largest read payloads
+THROUGHPUT_PARAMETERS = ("DOA_VALUE", "AEC_AZIMUTH_VALUES", "AEC_SPENERGY_VALUES", "SPECIAL_CMD_AEC_FILTER_COEFFS", "LED_RING_COLOR")
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the control throughput of a ReSpeaker over I2C and over USB')
+    parser.add_argument('--bus', default='1',
+                       help='I2C adapter number or /dev/i2c-* path (default: 1)')
+    parser.add_argument('--address', type=lambda x: int(x, 0), default=I2C_ADDRESS,
+                       help='I2C address of the device (default: 0x2C)')
+    parser.add_argument('--count', type=int, default=200,
+                       help='passes over the parameters (default: 200)')
+    parser.add_argument('--no-usb', action='store_true',
+                       help='only measure I2C')
+    args = parser.parse_args()
+
+    transports = []
+    i2c = find_i2c(args.bus, args.address)
+    if i2c:
+        transports.append(("I2C", i2c))
+    usb = None if args.no_usb else find()
+    if usb:
+        transports.append(("USB", usb))
+    if not transports:
+        print('No device found')
+        sys.exit(1)
+
+    print(f"{'Transport':<24} {'Reads/s':>9} {'Payload':>14} {'P50':>10} {'P99':>10}")
+    print("-" * 72)
+    try:
+        for label, respeaker in transports:
+            print_throughput(label, throughput(respeaker, THROUGHPUT_PARAMETERS, args.count))
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        for label, respeaker in transports:
+            respeaker.close()
+
+if __name__ == '__main__':
+    main()
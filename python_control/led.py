@@ -0,0 +1,213 @@
+
+import sys
+import time
+import argparse
+import threading
+
+import numpy as np
+
+from xvf_host import find, COMMANDS
+from telemetry import Ticker
+from transport import SharedTransport
+
+LED_COUNT = 12
+LED_EFFECT_RING = 5 # LED_EFFECT mode showing LED_RING_COLOR
+
+RING = COMMANDS["LED_RING_COLOR"]
+
+
+def rgb(color):
+    """0xRRGGBB as an array of 3 floats"""
+    return np.array([color >> 16 & 0xFF, color >> 8 & 0xFF, color & 0xFF], np.float64)
+
+def pack(frames):
+    """
+    LED_RING_COLOR payloads of an array of frames x 12 LEDs x RGB, as one
+    bytes object per frame
+    """
+    channels = np.clip(np.rint(frames), 0, 255).astype(np.uint32)
+    colors = (channels[..., 0] << 16 | channels[..., 1] << 8 | channels[..., 2]).astype('<u4')
+    data = colors.tobytes()
+    return [data[offset:offset + RING.struct.size] for offset in range(0, len(data), RING.struct.size)]
+
+
+class Frames:
+    """A looping sequence of precomputed LED_RING_COLOR payloads"""
+
+    def __init__(self, frames):
+        self.frames = frames
+
+    def frame(self, index):
+        return self.frames[index % len(self.frames)]
+
+def solid(color):
+    return Frames(pack(np.tile(rgb(color), (1, LED_COUNT, 1))))
+
+def spin(color, background=0, width=3, steps=LED_COUNT):
+    """An arc of `width` LEDs fading towards its tail, going round in `steps` frames"""
+    position = np.arange(steps)[:, None] * LED_COUNT / steps
+    # how far each LED is behind the head of the arc
+    behind = (position - np.arange(LED_COUNT)[None, :]) % LED_COUNT
+    weight = np.clip(1 - behind / width, 0, 1)[..., None]
+    return Frames(pack(weight * rgb(color) + (1 - weight) * rgb(background)))
+
+def breathe(color, steps=60):
+    level = (1 - np.cos(2 * np.pi * np.arange(steps) / steps)) / 2
+    return Frames(pack(np.repeat(level[:, None, None] * rgb(color), LED_COUNT, axis=1)))
+
+def rainbow(steps=60):
+    hue = (np.arange(steps)[:, None] / steps + np.arange(LED_COUNT)[None, :] / LED_COUNT) % 1.0
+    # piecewise linear hue to RGB
+    channels = np.stack([np.clip(np.abs((hue * 6 + shift) % 6 - 3) - 1, 0, 1) for shift in (0, 4, 2)], axis=-1)
+    return Frames(pack(255 * channels))
+
+
+class DoaPointer:
+    """
+    Points at the talker: the LEDs nearest to the DOA light up in `color`
+    over `background` while speech is detected, and the ring shows
+    `background` otherwise. `source` returns the DOA_VALUE values (DOA in
+    degrees, speech detected), e.g. lambda: dev.read("DOA_VALUE"), or the last
+    sample of a telemetry stream. The frame of every degree is precomputed.
+    `offset` is the direction of LED 0 in degrees.
+    """
+
+    def __init__(self, source, color=0x00FF00, background=0x000008, offset=0):
+        self.source = source
+        degrees = np.arange(360)[:, None]
+        leds = (offset + np.arange(LED_COUNT)[None, :] * 360 / LED_COUNT) % 360
+        distance = np.abs((degrees - leds + 180) % 360 - 180)
+        # the two LEDs either side of the DOA share the light
+        weight = np.clip(1 - distance * LED_COUNT / 360, 0, 1)[..., None]
+        self.frames = pack(weight * rgb(color) + (1 - weight) * rgb(background))
+        self.idle = pack(np.tile(rgb(background), (1, LED_COUNT, 1)))[0]
+
+    def frame(self, index):
+        doa, speech = self.source()
+        return self.frames[doa % 360] if speech else self.idle
+
+
+class LedAnimator:
+    """
+    Plays a pattern on the LED ring of a ReSpeaker, in ring mode, at up to
+    `fps` frames per second on a Ticker grid. A pattern is any object whose
+    frame(index) returns a packed LED_RING_COLOR payload; frames are
+    written as they are, and not at all when they did not change.
+
+    The ReSpeaker transport is wrapped in a transport.SharedTransport so
+    other threads can keep polling the same device. LED writes give way to
+    them: when a transfer is in progress, the frame is deferred to the next
+    tick, where the latest frame is written instead.
+    """
+
+    def __init__(self, respeaker, pattern, fps=30):
+        if not isinstance(respeaker.dev, SharedTransport):
+            respeaker.dev = SharedTransport(respeaker.dev)
+        self.respeaker = respeaker
+        self.lock = respeaker.dev.lock
+        self.pattern = pattern
+        self.fps = fps
+        self.last = None # last payload written
+        self.frames = 0 # frames rendered
+        self.written = 0
+        self.skipped = 0 # unchanged frames not written
+        self.deferred = 0 # frames that gave way to another transfer
+        self.dropped = 0 # ticks missed
+        self.running = False
+        self.thread = None
+
+    def play(self, pattern):
+        """Switch to `pattern` from the next frame"""
+        self.pattern = pattern
+
+    def show(self, frame):
+        """Write `frame` unless it is on the ring already or the device is busy. Returns True if written."""
+        self.frames += 1
+        if frame == self.last:
+            self.skipped += 1
+            return False
+        if not self.lock.acquire(False):
+            self.deferred += 1
+            return False
+        try:
+            self.respeaker.write_payload("LED_RING_COLOR", frame)
+        finally:
+            self.lock.release()
+        self.last = frame
+        self.written += 1
+        return True
+
+    def run(self, duration=None):
+        """Play until stop(), KeyboardInterrupt or `duration` seconds"""
+        self.respeaker.write("LED_EFFECT", [LED_EFFECT_RING])
+        self.last = None
+        self.running = True
+        ticker = Ticker(self.fps)
+        end = None if duration is None else time.monotonic() + duration
+        index = 0
+        try:
+            while self.running and (end is None or time.monotonic() < end):
+                delay, dropped = ticker.next()
+                if delay:
+                    time.sleep(delay)
+                self.dropped += dropped
+                index += dropped
+                self.show(self.pattern.frame(index))
+                index += 1
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.running = False
+
+    def start(self):
+        """Play on a background thread"""
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+
+PATTERNS = ('solid', 'spin', 'breathe', 'rainbow', 'doa')
+
+def main():
+    parser = argparse.ArgumentParser(description='Play an animation on the ReSpeaker LED ring')
+    parser.add_argument('PATTERN', choices=PATTERNS, help='pattern to play')
+    parser.add_argument('--color', type=lambda x: int(x, 0), default=0x00FF00,
+                       help='color as 0xRRGGBB (default: 0x00FF00)')
+    parser.add_argument('--background', type=lambda x: int(x, 0), default=0x000000,
+                       help='background color as 0xRRGGBB (default: 0x000000)')
+    parser.add_argument('--fps', type=float, default=30,
+                       help='maximum frames per second (default: 30)')
+    parser.add_argument('--duration', type=float,
+                       help='seconds to play (default: until interrupted)')
+    args = parser.parse_args()
+
+    dev = find()
+    if not dev:
+        print('No device found')
+        sys.exit(1)
+    if args.PATTERN == 'doa':
+        pattern = DoaPointer(lambda: dev.read("DOA_VALUE"), args.color, args.background)
+    elif args.PATTERN == 'solid':
+        pattern = solid(args.color)
+    elif args.PATTERN == 'spin':
+        pattern = spin(args.color, args.background)
+    elif args.PATTERN == 'breathe':
+        pattern = breathe(args.color)
+    else:
+        pattern = rainbow()
+    animator = LedAnimator(dev, pattern, args.fps)
+    try:
+        animator.run(args.duration)
+    finally:
+        dev.close()
+    print(f"{animator.frames} frames, {animator.written} written, {animator.skipped} unchanged, "
+          f"{animator.deferred} deferred, {animator.dropped} dropped")
+
+if __name__ == '__main__':
+    main()
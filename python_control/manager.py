@@ -0,0 +1,115 @@
+
+import sys
+import time
+import argparse
+import collections
+import concurrent.futures
+
+from xvf_host import find_all, usb_path, format_result
+from telemetry import Ticker, check_parameters, read_sample, TELEMETRY_PARAMETERS
+
+# timestamp: time.monotonic() when the poll was issued to all devices
+# seq: index of the poll
+# samples: device id -> telemetry.Sample of that device
+Poll = collections.namedtuple('Poll', ['timestamp', 'seq', 'samples'])
+
+
+class DeviceManager:
+    """
+    Several ReSpeaker arrays addressed by a stable id, e.g. their bus-port
+    path. Every device has its own single worker thread, so polls run on all
+    devices in parallel while each USB handle is only ever used by one thread.
+    """
+
+    def __init__(self, devices):
+        self.devices = dict(devices)
+        self.executors = {device_id: concurrent.futures.ThreadPoolExecutor(1, 'xvf-{}'.format(device_id))
+                          for device_id in self.devices}
+        self.seq = 0
+
+    @classmethod
+    def find(cls, vid=0x2886, pid=0x001A):
+        """Manage every connected array matching vid/pid, keyed by bus-port path."""
+        return cls((usb_path(respeaker.dev), respeaker) for respeaker in find_all(vid, pid))
+
+    def __len__(self):
+        return len(self.devices)
+
+    def __getitem__(self, device_id):
+        return self.devices[device_id]
+
+    def submit(self, func, *args):
+        """Run func(respeaker, *args) on every device's worker, returning device id -> future"""
+        return {device_id: self.executors[device_id].submit(func, respeaker, *args)
+                for device_id, respeaker in self.devices.items()}
+
+    def poll(self, params=TELEMETRY_PARAMETERS, dropped=0):
+        """
+        Read `params` on all devices at once and return a Poll of their
+        samples, which carry `dropped`, the ticks missed before this poll.
+        """
+        check_parameters(params)
+        timestamp = time.monotonic()
+        futures = self.submit(read_sample, params, self.seq, dropped)
+        poll = Poll(timestamp, self.seq, {device_id: future.result() for device_id, future in futures.items()})
+        self.seq += 1
+        return poll
+
+    def stream(self, params=TELEMETRY_PARAMETERS, rate_hz=50, policy='skip', count=None):
+        """Generator of Polls at a fixed rate, scheduled like telemetry.stream()."""
+        ticker = Ticker(rate_hz, policy)
+        polled = 0
+        while count is None or polled < count:
+            delay, dropped = ticker.next()
+            if delay:
+                time.sleep(delay)
+            yield self.poll(params, dropped)
+            polled += 1
+
+    def close(self):
+        for executor in self.executors.values():
+            executor.shutdown()
+        for respeaker in self.devices.values():
+            respeaker.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Poll parameters on every connected ReSpeaker array')
+    parser.add_argument('PARAMETERS', nargs='*', default=TELEMETRY_PARAMETERS,
+                       help='parameters to poll (default: {})'.format(' '.join(TELEMETRY_PARAMETERS)))
+    parser.add_argument('--vid', type=lambda x: int(x, 0), default=0x2886,
+                       help='usb vendor ID (default: 0x2886)')
+    parser.add_argument('--pid', type=lambda x: int(x, 0), default=0x001A,
+                       help='usb product ID (default: 0x001A)')
+    parser.add_argument('--rate', type=float, default=10,
+                       help='polls per second (default: 10)')
+    args = parser.parse_args()
+    params = [name.upper() for name in args.PARAMETERS]
+    try:
+        check_parameters(params)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    manager = DeviceManager.find(vid=args.vid, pid=args.pid)
+    if not len(manager):
+        print('No device found')
+        sys.exit(1)
+
+    try:
+        for poll in manager.stream(params, args.rate):
+            for device_id, sample in poll.samples.items():
+                print(f"{poll.timestamp:.3f} {device_id}: " + ", ".join(format_result(name, sample.values[name]) for name in params))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        manager.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+
+import os
+import json
+import time
+import struct
+import collections
+
+from xvf_host import COMMANDS, parse_value
+
+# changed: parameter name -> (current values, profile values) of the parameters written
+# unchanged: names of the parameters that already had the profile values
+# read_time, write_time, verify_time, save_time: seconds spent in each step
+ApplyResult = collections.namedtuple('ApplyResult', ['changed', 'unchanged', 'read_time', 'write_time', 'verify_time', 'save_time'])
+
+
+def load_profile(path):
+    """
+    Load a profile of parameter name -> values from a JSON file, or a YAML
+    file if the path ends with .yaml or .yml (requires PyYAML).
+    """
+    with open(path) as f:
+        if os.path.splitext(path)[1].lower() in ('.yaml', '.yml'):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError('PyYAML is required for YAML profiles (pip install pyyaml)')
+            profile = yaml.safe_load(f)
+        else:
+            profile = json.load(f)
+    return validate_profile(profile)
+
+def validate_profile(profile):
+    """
+    Check a profile against PARAMETERS and return it as name -> tuple of
+    values, converted to the parameter type. Names are case insensitive, a
+    single value may be given without a list, and strings are parsed like
+    --values (decimal or hex).
+    """
+    if not isinstance(profile, dict):
+        raise ValueError('A profile must map parameter names to values')
+    validated = {}
+    for name, values in profile.items():
+        name = str(name).upper()
+        if name not in COMMANDS:
+            raise ValueError('Unknown parameter: {}'.format(name))
+        command = COMMANDS[name]
+        if command.access != "rw":
+            raise ValueError('{} is {} and cannot be set by a profile'.format(name, "read-only" if command.access == "ro" else "write-only"))
+        if not isinstance(values, (list, tuple)):
+            values = [values]
+        if len(values) != command.count:
+            raise ValueError('{} value count is {}, but {} values provided'.format(name, command.count, len(values)))
+        try:
+            values = [parse_value(value) if isinstance(value, str) else value for value in values]
+            if command.type in ('float', 'radians'):
+                values = [float(value) for value in values]
+            elif all(float(value).is_integer() for value in values):
+                values = [int(value) for value in values]
+            else:
+                raise ValueError('{} takes integer values'.format(name))
+            # round trip through the transfer encoding: range check, and floats
+            # compare as the float32 values the device will hold
+            validated[name] = command.struct.unpack(command.encode(values))
+        except (TypeError, struct.error) as e:
+            raise ValueError('Invalid values {} for {}: {}'.format(values, name, e))
+    return validated
+
+def apply_profile(dev, profile, save=False, verify=True):
+    """
+    Apply a validated profile to a ReSpeaker in one session: read the current
+    values in one read_many() pass, write only the parameters that differ,
+    read them back if `verify`, then write SAVE_CONFIGURATION if `save`.
+    Applying a profile the device already holds costs only the reads.
+    Raises ValueError if a verified parameter does not hold its profile values.
+    """
+    start = time.perf_counter()
+    current = dev.read_many(list(profile))
+    changed = {name: (current[name], values) for name, values in profile.items() if current[name] != values}
+    unchanged = [name for name in profile if name not in changed]
+    read_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for name, (_, values) in changed.items():
+        dev.write(name, values)
+    write_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if verify and changed:
+        readback = dev.read_many(list(changed), cached=False)
+        mismatched = [name for name, (_, values) in changed.items() if readback[name] != values]
+        if mismatched:
+            raise ValueError('Verification failed for {}'.format(', '.join(
+                '{} (wrote {}, read {})'.format(name, list(profile[name]), list(readback[name])) for name in mismatched)))
+    verify_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if save:
+        dev.write("SAVE_CONFIGURATION", [1])
+    save_time = time.perf_counter() - start
+
+    return ApplyResult(changed, unchanged, read_time, write_time, verify_time, save_time)
+
+def report(result):
+    """Print the diff applied by apply_profile() and the time spent in each step."""
+    for name, (old, new) in result.changed.items():
+        print(f"{name}: {list(old)} -> {list(new)}")
+    print(f"{len(result.changed)} changed, {len(result.unchanged)} unchanged")
+    print(f"read {result.read_time * 1000:.1f} ms, write {result.write_time * 1000:.1f} ms, "
+          f"verify {result.verify_time * 1000:.1f} ms, save {result.save_time * 1000:.1f} ms")
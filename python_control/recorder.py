@@ -0,0 +1,203 @@
+
+import os
+import sys
+import time
+import struct
+import argparse
+
+import numpy as np
+
+from xvf_host import find
+from telemetry import stream, TELEMETRY_PARAMETERS
+
+# One beam telemetry sample, 44 bytes per record
+RECORD_DTYPE = np.dtype([
+    ('timestamp', '<f8'),       # time.monotonic() of the sample
+    ('azimuth', '<f4', (4,)),   # AEC_AZIMUTH_VALUES
+    ('energy', '<f4', (4,)),    # AEC_SPENERGY_VALUES
+    ('doa', '<u2'),             # DOA_VALUE[0]
+    ('vad', '<u2'),             # DOA_VALUE[1]
+])
+
+# the same record layout, for packing samples straight into the ring
+RECORD = struct.Struct('<d4f4fHH')
+RECORD_SIZE = RECORD.size
+_pack_record = RECORD.pack_into
+
+# magic, version, record size, reserved, time.time() - time.monotonic() when recording started
+HEADER = struct.Struct('<8sHHId')
+MAGIC = b'XVFTELEM'
+VERSION = 1
+
+
+class TelemetryRecorder:
+    """
+    Records beam telemetry into a preallocated ring buffer of `capacity`
+    records, so memory stays flat however long it runs.
+
+    Without a `path` the ring overwrites its oldest records. With a `path` the
+    ring is spilled to that file whenever it fills up (and on close), as raw
+    records after a small header, ready to be memory-mapped by TelemetryReader.
+    """
+    __slots__ = ('raw', 'buffer', 'capacity', 'offset', 'end', 'wrapped', 'passed', 'file')
+
+    def __init__(self, capacity=4096, path=None):
+        self.raw = bytearray(capacity * RECORD_SIZE)
+        self.buffer = np.frombuffer(self.raw, RECORD_DTYPE)
+        self.capacity = capacity
+        self.offset = 0 # byte offset of the next record to write
+        self.end = len(self.raw)
+        self.wrapped = False
+        self.passed = 0 # records recorded before the current pass over the ring
+        self.file = None
+        if path is not None:
+            self.file = open(path, 'wb')
+            self.file.write(HEADER.pack(MAGIC, VERSION, RECORD_DTYPE.itemsize, 0, time.time() - time.monotonic()))
+
+    @property
+    def head(self):
+        """Index of the next record to write"""
+        return self.offset // RECORD_SIZE
+
+    @property
+    def count(self):
+        """Records recorded in total"""
+        return self.passed + self.offset // RECORD_SIZE
+
+    def append(self, timestamp, azimuth, energy, doa, vad):
+        # unpacked by name, starred arguments would build a tuple per sample
+        a0, a1, a2, a3 = azimuth
+        e0, e1, e2, e3 = energy
+        offset = self.offset
+        _pack_record(self.raw, offset, timestamp, a0, a1, a2, a3, e0, e1, e2, e3, doa, vad)
+        offset += RECORD_SIZE
+        self.offset = offset
+        if offset == self.end:
+            self._full()
+
+    def _full(self):
+        if self.file is not None:
+            self.spill()
+        else:
+            self.passed += self.capacity
+            self.offset = 0
+            self.wrapped = True
+
+    def append_sample(self, sample):
+        """Append a telemetry.Sample of DOA_VALUE, AEC_AZIMUTH_VALUES and AEC_SPENERGY_VALUES"""
+        values = sample.values
+        doa, vad = values["DOA_VALUE"]
+        self.append(sample.timestamp, values["AEC_AZIMUTH_VALUES"], values["AEC_SPENERGY_VALUES"], doa, vad)
+
+    def append_records(self, records):
+        """Append an array of RECORD_DTYPE records, copied into the ring a chunk at a time"""
+        start = 0
+        while start < len(records):
+            head = self.head
+            count = min(len(records) - start, self.capacity - head)
+            self.buffer[head:head + count] = records[start:start + count]
+            start += count
+            self.offset += count * RECORD_SIZE
+            if self.offset == self.end:
+                self._full()
+
+    def spill(self):
+        """Write the buffered records to the file and empty the ring"""
+        self.file.write(memoryview(self.raw)[:self.offset])
+        self.file.flush()
+        self.passed += self.head
+        self.offset = 0
+
+    def view(self):
+        """
+        Records held in memory, oldest first. This is a zero-copy view of the
+        ring unless it has wrapped around.
+        """
+        if not self.wrapped:
+            return self.buffer[:self.head]
+        return np.concatenate((self.buffer[self.head:], self.buffer[:self.head]))
+
+    def close(self):
+        if self.file is not None:
+            self.spill()
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TelemetryReader:
+    """
+    Memory-mapped access to a file written by TelemetryRecorder. Records are
+    paged in by the OS on access, so captures larger than RAM can be
+    analysed or replayed.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            magic, version, record_size, _, self.clock_offset = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError('{} is not a telemetry capture'.format(path))
+        if version != VERSION or record_size != RECORD_DTYPE.itemsize:
+            raise ValueError('Unsupported telemetry capture version {} (record size {})'.format(version, record_size))
+        # ignore a partial record left by an interrupted spill
+        count = (os.path.getsize(path) - HEADER.size) // RECORD_DTYPE.itemsize
+        if count:
+            self.records = np.memmap(path, RECORD_DTYPE, 'r', offset=HEADER.size, shape=(count,))
+        else:
+            self.records = np.zeros(0, RECORD_DTYPE)
+
+    def __len__(self):
+        return len(self.records)
+
+    def chunks(self, size=65536):
+        """Yield consecutive zero-copy views of at most `size` records"""
+        for start in range(0, len(self.records), size):
+            yield self.records[start:start + size]
+
+    def __iter__(self):
+        """Replay records one by one, paging through the capture chunk by chunk"""
+        for chunk in self.chunks():
+            yield from chunk
+
+    def wall_clock(self, timestamps):
+        """Convert recorded time.monotonic() timestamps to time.time()"""
+        return timestamps + self.clock_offset
+
+
+def record(dev, recorder, rate_hz=50, count=None):
+    """Stream DOA and beam telemetry from `dev` into `recorder`"""
+    for sample in stream(dev, TELEMETRY_PARAMETERS, rate_hz, count=count):
+        recorder.append_sample(sample)
+
+def main():
+    parser = argparse.ArgumentParser(description='Record ReSpeaker DOA and beam telemetry to a file')
+    parser.add_argument('FILE', help='capture file to write')
+    parser.add_argument('--rate', type=float, default=50,
+                       help='samples per second (default: 50)')
+    parser.add_argument('--duration', type=float,
+                       help='seconds to record (default: until interrupted)')
+    args = parser.parse_args()
+
+    dev = find()
+    if not dev:
+        print('No device found')
+        sys.exit(1)
+
+    count = int(args.duration * args.rate) if args.duration else None
+    recorder = TelemetryRecorder(path=args.FILE)
+    try:
+        record(dev, recorder, args.rate, count)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recorder.close()
+        dev.close()
+    print(f"Recorded {recorder.count} samples to {args.FILE}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+
+import math
+import time
+import array
+import ctypes
+import struct
+
+import dfu
+
+from xvf_host import COMMANDS, CONTROL_SUCCESS, SERVICER_COMMAND_RETRY, CTRL_IN_VENDOR_DEVICE, CTRL_OUT_VENDOR_DEVICE
+
+class SimulatedDevice:
+    """
+    Stand-in for a pyusb device that answers ctrl_transfer from an in-memory
+    parameter store, for running the host tools without an XVF3800.
+    Every read is answered with SERVICER_COMMAND_RETRY at least `retries` times
+    and until `ready_after` seconds have passed since its first request before
+    it succeeds. Every transfer takes `latency` seconds.
+
+    The AEC filter special commands page through `num_farends` x `num_mics`
+    filters of `aec_filter_length` coefficients, and every page read or
+    written is logged in `aec_pages` as (far, mic, offset, direction).
+
+    The DFU servicer runs the DFU state machine on an in-memory upgrade
+    partition, `firmware`. Every downloaded block keeps it busy for
+    `dfu_busy` seconds, reported as the DFU_GETSTATUS poll timeout, and
+    sending a block before the previous one is written is a DFU error.
+
+    Parameters named in `sources` are read from a callable returning their
+    values instead of the store, for counters that change over time, and
+    `writes` counts the writes to every parameter.
+    """
+
+    def __init__(self, retries=0, latency=0.0, ready_after=0.0,
+                 num_farends=1, num_mics=4, aec_filter_length=3840,
+                 dfu_busy=0.0, dfu_version=(2, 1, 0)):
+        self.retries = retries
+        self.latency = latency
+        self.ready_after = ready_after
+        self.values = {}
+        self.pending = {}
+        self.transfers = 0
+        self.sources = {}
+        self.writes = {}
+        for name, command in COMMANDS.items():
+            self.values[(command.windex, command.write_wvalue)] = bytes(command.struct.size)
+        self.set("VERSION", [2, 1, 0])
+        self.set("AEC_NUM_FARENDS", [num_farends])
+        self.set("AEC_NUM_MICS", [num_mics])
+        self.set("SPECIAL_CMD_AEC_FILTER_LENGTH", [aec_filter_length])
+        self.aec_filters = {(far, mic): bytearray(aec_filter_length * 4)
+                            for far in range(num_farends) for mic in range(num_mics)}
+        self.aec_pages = []
+        self.dfu_busy = dfu_busy
+        self.dfu_version = tuple(dfu_version)
+        self.dfu_state = dfu.DFU_STATE_IDLE
+        self.dfu_status = dfu.DFU_STATUS_OK
+        self.dfu_busy_until = 0.0
+        self.dfu_download = bytearray()
+        self.dfu_upload_block = 0
+        self.dfu_reboots = 0
+        self.firmware = b''
+
+    def aec_filter(self, far, mic):
+        """Coefficients of one simulated AEC filter as a list of floats"""
+        data = self.aec_filters[(far, mic)]
+        return list(struct.unpack('<{}f'.format(len(data) // 4), data))
+
+    def _aec_page(self, direction):
+        far, mic = struct.unpack('<2i', self.values[self._key("SPECIAL_CMD_AEC_FAR_MIC_INDEX")])
+        offset, = struct.unpack('<i', self.values[self._key("SPECIAL_CMD_AEC_FILTER_COEFF_START_OFFSET")])
+        self.aec_pages.append((far, mic, offset, direction))
+        return self.aec_filters[(far, mic)], offset * 4
+
+    def _dfu_error(self):
+        self.dfu_state = dfu.DFU_STATE_ERROR
+        self.dfu_status = 0x0F # errSTALLEDPKT
+
+    def _dfu_in(self, cmdid):
+        """Response data of a DFU servicer read"""
+        if cmdid == dfu.DFU_COMMANDS["DFU_GETSTATUS"].cmdid:
+            now = time.monotonic()
+            if self.dfu_state in (dfu.DFU_STATE_DNLOAD_SYNC, dfu.DFU_STATE_MANIFEST_SYNC):
+                self.dfu_state += 1 # dfuDNBUSY, dfuMANIFEST
+                self.dfu_busy_until = now + self.dfu_busy
+            timeout = 0
+            if self.dfu_state in (dfu.DFU_STATE_DNBUSY, dfu.DFU_STATE_MANIFEST):
+                if now < self.dfu_busy_until:
+                    timeout = math.ceil((self.dfu_busy_until - now) * 1000)
+                elif self.dfu_state == dfu.DFU_STATE_DNBUSY:
+                    self.dfu_state = dfu.DFU_STATE_DNLOAD_IDLE
+                else:
+                    self.firmware = bytes(self.dfu_download)
+                    self.dfu_state = dfu.DFU_STATE_IDLE
+            return bytes([self.dfu_status, timeout & 0xFF, timeout >> 8 & 0xFF, timeout >> 16 & 0xFF, self.dfu_state])
+        if cmdid == dfu.DFU_COMMANDS["DFU_GETSTATE"].cmdid:
+            return bytes([self.dfu_state])
+        if cmdid == dfu.DFU_COMMANDS["DFU_GETVERSION"].cmdid:
+            return bytes(self.dfu_version)
+        if cmdid == dfu.DFU_COMMANDS["DFU_UPLOAD"].cmdid:
+            if self.dfu_state not in (dfu.DFU_STATE_IDLE, dfu.DFU_STATE_UPLOAD_IDLE):
+                self._dfu_error()
+                return bytes(dfu.PAYLOAD_SIZE)
+            offset = self.dfu_upload_block * dfu.BLOCK_SIZE
+            chunk = self.firmware[offset:offset + dfu.BLOCK_SIZE]
+            self.dfu_upload_block += 1
+            self.dfu_state = dfu.DFU_STATE_UPLOAD_IDLE if len(chunk) == dfu.BLOCK_SIZE else dfu.DFU_STATE_IDLE
+            return dfu.BLOCK_HEADER.pack(len(chunk)) + chunk.ljust(dfu.BLOCK_SIZE, b'\0')
+        return b''
+
+    def _dfu_out(self, cmdid, data):
+        """Apply a DFU servicer write"""
+        if cmdid == dfu.DFU_COMMANDS["DFU_DNLOAD"].cmdid:
+            length, = dfu.BLOCK_HEADER.unpack_from(data)
+            if self.dfu_state == dfu.DFU_STATE_IDLE and length:
+                self.dfu_download = bytearray()
+            elif self.dfu_state != dfu.DFU_STATE_DNLOAD_IDLE:
+                self._dfu_error()
+                return
+            if length:
+                self.dfu_download += data[dfu.BLOCK_HEADER.size:dfu.BLOCK_HEADER.size + length]
+                self.dfu_state = dfu.DFU_STATE_DNLOAD_SYNC
+            else:
+                self.dfu_state = dfu.DFU_STATE_MANIFEST_SYNC
+        elif cmdid == dfu.DFU_COMMANDS["DFU_CLRSTATUS"].cmdid:
+            if self.dfu_state == dfu.DFU_STATE_ERROR:
+                self.dfu_state = dfu.DFU_STATE_IDLE
+                self.dfu_status = dfu.DFU_STATUS_OK
+        elif cmdid == dfu.DFU_COMMANDS["DFU_ABORT"].cmdid:
+            if self.dfu_state != dfu.DFU_STATE_ERROR:
+                self.dfu_state = dfu.DFU_STATE_IDLE
+        elif cmdid == dfu.DFU_COMMANDS["DFU_TRANSFERBLOCK"].cmdid:
+            self.dfu_upload_block, = struct.unpack_from('<H', data)
+        elif cmdid == dfu.DFU_COMMANDS["DFU_REBOOT"].cmdid:
+            self.dfu_reboots += 1
+            self.dfu_state = dfu.DFU_STATE_IDLE
+
+    def _key(self, name):
+        return (COMMANDS[name].windex, COMMANDS[name].write_wvalue)
+
+    def set_source(self, name, source):
+        """Answer reads of `name` with the values returned by source()"""
+        self.sources[self._key(name)] = (name, source)
+
+    def written(self, name):
+        """Number of writes to `name`"""
+        return self.writes.get(self._key(name), 0)
+
+    def set(self, name, data_list):
+        command = COMMANDS[name]
+        self.values[(command.windex, command.write_wvalue)] = command.encode(data_list)
+
+    def ctrl_transfer(self, bmRequestType, bRequest, wValue, wIndex, data_or_wLength, timeout=None):
+        self.transfers += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if bmRequestType & 0x80:
+            key = (wIndex, wValue & 0x7F)
+            now = time.monotonic()
+            attempts, first = self.pending.get(key, (0, now))
+            if attempts < self.retries or now - first < self.ready_after:
+                self.pending[key] = (attempts + 1, first)
+                return array.array('B', [SERVICER_COMMAND_RETRY] + [0] * (data_or_wLength - 1))
+            self.pending.pop(key, None)
+            if wIndex == dfu.DFU_RESID:
+                data = self._dfu_in(wValue & 0x7F)
+            elif key in self.sources:
+                data = COMMANDS[self.sources[key][0]].encode(self.sources[key][1]())
+            elif key == self._key("SPECIAL_CMD_AEC_FILTER_COEFFS"):
+                data, offset = self._aec_page('in')
+                data = data[offset:offset + data_or_wLength - 1].ljust(data_or_wLength - 1, b'\0')
+            else:
+                data = self.values.get(key, b'')
+            response = array.array('B', [CONTROL_SUCCESS])
+            response.frombytes(data[:data_or_wLength - 1])
+            return response
+        self.writes[(wIndex, wValue)] = self.writes.get((wIndex, wValue), 0) + 1
+        if wIndex == dfu.DFU_RESID:
+            self._dfu_out(wValue, bytes(data_or_wLength))
+            return len(data_or_wLength)
+        if (wIndex, wValue) == self._key("SPECIAL_CMD_AEC_FILTER_COEFFS"):
+            data, offset = self._aec_page('out')
+            end = min(offset + len(data_or_wLength), len(data))
+            data[offset:end] = bytes(data_or_wLength)[:end - offset]
+        self.values[(wIndex, wValue)] = bytes(data_or_wLength)
+        return len(data_or_wLength)
+
+    def close(self):
+        pass
+
+
+class SimulatedI2cBus:
+    """
+    Stand-in for a Linux I2C adapter with the device control I2C servicer of
+    the I2S firmwares at `address`, answering the I2C_RDWR requests of an
+    i2c_transport.I2cTransport from `device`, a SimulatedDevice by default.
+    Requests to another address fail as unacknowledged. With a `clock` in Hz,
+    every request takes the time its bytes take on the bus, 9 bits each with
+    the address byte of every message, plus a start and a stop.
+    """
+
+    def __init__(self, device=None, address=0x2C, clock=None):
+        self.device = device if device is not None else SimulatedDevice()
+        self.address = address
+        self.clock = clock
+        self.requests = 0
+        self.bytes = 0 # bytes on the bus, address bytes included
+
+    def ioctl(self, request, data):
+        import errno
+        import i2c_transport
+
+        if request != i2c_transport.I2C_RDWR:
+            raise OSError(errno.EINVAL, 'Unsupported I2C ioctl 0x{:04x}'.format(request))
+        msgs = [data.msgs[index] for index in range(data.nmsgs)]
+        if any(msg.addr != self.address for msg in msgs):
+            raise OSError(errno.EREMOTEIO, 'No ACK from I2C address 0x{:02x}'.format(msgs[0].addr))
+        self.requests += 1
+        size = sum(1 + msg.len for msg in msgs)
+        self.bytes += size
+        if self.clock:
+            import transport
+            transport.wait((size * 9 + 2) / self.clock)
+
+        header = ctypes.string_at(msgs[0].buf, msgs[0].len)
+        resid, cmdid, length = header[:3]
+        if len(msgs) == 1:
+            # a write: header, then `length` bytes of payload
+            if length != len(header) - 3:
+                raise OSError(errno.EIO, 'I2C write of {} bytes with a length byte of {}'.format(len(header) - 3, length))
+            self.device.ctrl_transfer(CTRL_OUT_VENDOR_DEVICE, 0, cmdid, resid, header[3:])
+            return
+        if len(msgs) != 2 or not msgs[1].flags & i2c_transport.I2C_M_RD or msgs[1].len != length:
+            raise OSError(errno.EIO, 'Malformed I2C read request')
+        response = bytes(self.device.ctrl_transfer(CTRL_IN_VENDOR_DEVICE, 0, cmdid, resid, length))
+        ctypes.memmove(msgs[1].buf, response, len(response))
+
+    def close(self):
+        pass
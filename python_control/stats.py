@@ -0,0 +1,134 @@
+
+import bisect
+
+from xvf_host import CONTROL_SUCCESS, SERVICER_COMMAND_RETRY
+
+# upper bounds in seconds of the transfer latency histogram buckets, the last one catches the rest
+BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, float('inf'))
+
+# status of a transfer that raised, e.g. a USB timeout
+STATUS_ERROR = None
+STATUS_NAMES = {CONTROL_SUCCESS: 'success', SERVICER_COMMAND_RETRY: 'retry', STATUS_ERROR: 'error'}
+
+
+class CommandStats:
+    """Transfers of one command in one direction"""
+    __slots__ = ('name', 'resid', 'direction', 'count', 'bytes', 'total_time', 'max_time', 'buckets', 'statuses')
+
+    def __init__(self, name, resid, direction):
+        self.name = name
+        self.resid = resid
+        self.direction = direction
+        self.count = 0
+        self.bytes = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.statuses = {}
+
+    @property
+    def retries(self):
+        """Transfers answered with SERVICER_COMMAND_RETRY"""
+        return self.statuses.get(SERVICER_COMMAND_RETRY, 0)
+
+    @property
+    def errors(self):
+        return self.statuses.get(STATUS_ERROR, 0)
+
+    @property
+    def mean(self):
+        return self.total_time / self.count if self.count else 0.0
+
+    def percentile(self, percent):
+        """Upper bound of the bucket holding the `percent` percentile, capped at the slowest transfer"""
+        rank = percent / 100.0 * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank and seen:
+                return min(bound, self.max_time)
+        return 0.0
+
+
+class TransferStats:
+    """
+    Latency histogram, byte count and status counts of every control
+    transfer, keyed by command and direction. Set it as ReSpeaker.stats, or
+    pass it to ReSpeaker(), to record the transfers of that ReSpeaker.
+    """
+
+    def __init__(self):
+        self.commands = {}
+
+    def record(self, command, direction, elapsed, nbytes, status):
+        key = (command.name, direction)
+        stats = self.commands.get(key)
+        if stats is None:
+            stats = self.commands[key] = CommandStats(command.name, command.resid, direction)
+        stats.count += 1
+        stats.bytes += nbytes
+        stats.total_time += elapsed
+        if elapsed > stats.max_time:
+            stats.max_time = elapsed
+        stats.buckets[bisect.bisect_left(BUCKETS, elapsed)] += 1
+        stats.statuses[status] = stats.statuses.get(status, 0) + 1
+
+    def by_resid(self):
+        """Transfers aggregated per RESID and direction, as CommandStats named after the RESID"""
+        resids = {}
+        for stats in self.commands.values():
+            key = (stats.resid, stats.direction)
+            total = resids.get(key)
+            if total is None:
+                total = resids[key] = CommandStats('RESID {}'.format(stats.resid), stats.resid, stats.direction)
+            total.count += stats.count
+            total.bytes += stats.bytes
+            total.total_time += stats.total_time
+            total.max_time = max(total.max_time, stats.max_time)
+            total.buckets = [a + b for a, b in zip(total.buckets, stats.buckets)]
+            for status, count in stats.statuses.items():
+                total.statuses[status] = total.statuses.get(status, 0) + count
+        return resids
+
+    def reset(self):
+        self.commands.clear()
+
+    def prometheus(self):
+        """The statistics in the Prometheus text exposition format"""
+        lines = [
+            '# HELP xvf_transfer_seconds Latency of control transfers.',
+            '# TYPE xvf_transfer_seconds histogram',
+        ]
+        counters = [
+            '# HELP xvf_transfer_bytes_total Bytes sent or received by control transfers.',
+            '# TYPE xvf_transfer_bytes_total counter',
+        ]
+        statuses = [
+            '# HELP xvf_transfers_total Control transfers by status.',
+            '# TYPE xvf_transfers_total counter',
+        ]
+        for stats in sorted(self.commands.values(), key=lambda stats: (stats.resid, stats.name, stats.direction)):
+            labels = 'command="{}",resid="{}",direction="{}"'.format(stats.name, stats.resid, stats.direction)
+            cumulative = 0
+            for bound, count in zip(BUCKETS, stats.buckets):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append('xvf_transfer_seconds_bucket{{{},le="{}"}} {}'.format(labels, le, cumulative))
+            lines.append('xvf_transfer_seconds_sum{{{}}} {!r}'.format(labels, stats.total_time))
+            lines.append('xvf_transfer_seconds_count{{{}}} {}'.format(labels, stats.count))
+            counters.append('xvf_transfer_bytes_total{{{}}} {}'.format(labels, stats.bytes))
+            for status, count in stats.statuses.items():
+                statuses.append('xvf_transfers_total{{{},status="{}"}} {}'.format(labels, STATUS_NAMES.get(status, status), count))
+        return '\n'.join(lines + counters + statuses) + '\n'
+
+
+def print_stats(stats):
+    """Print a table of the transfers of every command, then of every RESID."""
+    print(f"{'Command':<36} {'RESID':>5} {'Dir':>4} {'Count':>7} {'Retries':>7} {'Errors':>6} {'Mean':>9} {'P50':>9} {'P99':>9} {'Max':>9}")
+    print("-" * 112)
+    for rows in (sorted(stats.commands.values(), key=lambda row: (row.resid, row.name, row.direction)),
+                 sorted(stats.by_resid().values(), key=lambda row: (row.resid, row.direction))):
+        for row in rows:
+            print(f"{row.name:<36} {row.resid:>5} {row.direction:>4} {row.count:>7} {row.retries:>7} {row.errors:>6} "
+                  f"{row.mean * 1e6:>6.0f} us {row.percentile(50) * 1e6:>6.0f} us {row.percentile(99) * 1e6:>6.0f} us {row.max_time * 1e6:>6.0f} us")
+        print()
@@ -0,0 +1,125 @@
+
+import time
+import asyncio
+import collections
+
+from xvf_host import COMMANDS
+
+# timestamp: time.monotonic() at the middle of the transfers
+# seq: index of the sample in the stream
+# values: parameter name -> decoded values
+# dropped: ticks dropped right before this sample
+Sample = collections.namedtuple('Sample', ['timestamp', 'seq', 'values', 'dropped'])
+
+TELEMETRY_PARAMETERS = ["DOA_VALUE", "AEC_AZIMUTH_VALUES", "AEC_SPENERGY_VALUES"]
+
+
+class Ticker:
+    """
+    Fixed-rate schedule on a monotonic deadline grid, so the rate does not
+    drift with the time spent reading or consuming samples.
+
+    When a tick is missed by more than a period, the 'skip' policy drops the
+    missed ticks and waits for the next tick of the grid, while 'burst' runs
+    them back to back until it has caught up.
+    """
+
+    def __init__(self, rate_hz, policy='skip'):
+        if policy not in ('skip', 'burst'):
+            raise ValueError('Unknown drop policy: {}'.format(policy))
+        self.period = 1.0 / rate_hz
+        self.policy = policy
+        self.deadline = None
+
+    def next(self):
+        """Advance to the next tick and return (seconds to wait for it, ticks dropped)"""
+        now = time.monotonic()
+        if self.deadline is None:
+            self.deadline = now
+            return 0.0, 0
+        self.deadline += self.period
+        dropped = 0
+        if self.policy == 'skip' and now - self.deadline >= self.period:
+            dropped = int((now - self.deadline) / self.period) + 1
+            self.deadline += dropped * self.period
+        return max(0.0, self.deadline - now), dropped
+
+
+def check_parameters(params):
+    for name in params:
+        if name not in COMMANDS:
+            raise ValueError('Unknown parameter: {}'.format(name))
+        if COMMANDS[name].access == "wo":
+            raise ValueError('{} is write-only and cannot be streamed'.format(name))
+
+def read_sample(dev, params, seq, dropped):
+    start = time.monotonic()
+    values = dev.read_many(params)
+    return Sample((start + time.monotonic()) / 2, seq, values, dropped)
+
+def stream(dev, params=TELEMETRY_PARAMETERS, rate_hz=50, policy='skip', count=None):
+    """
+    Generator yielding a Sample of `params` every 1 / rate_hz seconds, up to
+    `count` samples (forever if None). A slow consumer never receives stale
+    samples: the read happens when the tick is due, and ticks missed while
+    the consumer was busy are handled by the Ticker `policy`.
+    """
+    check_parameters(params)
+    ticker = Ticker(rate_hz, policy)
+    seq = 0
+    while count is None or seq < count:
+        delay, dropped = ticker.next()
+        if delay:
+            time.sleep(delay)
+        yield read_sample(dev, params, seq, dropped)
+        seq += 1
+
+async def astream(dev, params=TELEMETRY_PARAMETERS, rate_hz=50, policy='oldest', maxsize=1, count=None):
+    """
+    Async iterator counterpart of stream(). Reads run on the default executor
+    at a fixed rate and are handed over through a queue of `maxsize` samples.
+    When the consumer falls behind, the 'oldest' policy evicts the oldest
+    queued sample and 'newest' discards the sample just read.
+    """
+    if policy not in ('oldest', 'newest'):
+        raise ValueError('Unknown drop policy: {}'.format(policy))
+    check_parameters(params)
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize)
+    done = object()
+
+    async def produce():
+        ticker = Ticker(rate_hz, 'skip')
+        seq = 0
+        carried = 0
+        try:
+            while count is None or seq < count:
+                delay, dropped = ticker.next()
+                if delay:
+                    await asyncio.sleep(delay)
+                sample = await loop.run_in_executor(None, read_sample, dev, params, seq, dropped + carried)
+                seq += 1
+                carried = 0
+                if queue.full():
+                    if policy == 'newest':
+                        carried = sample.dropped + 1
+                        continue
+                    evicted = queue.get_nowait()
+                    sample = sample._replace(dropped=sample.dropped + evicted.dropped + 1)
+                queue.put_nowait(sample)
+        except Exception as e:
+            await queue.put(e)
+        else:
+            await queue.put(done)
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        while True:
+            sample = await queue.get()
+            if sample is done:
+                break
+            if isinstance(sample, Exception):
+                raise sample
+            yield sample
+    finally:
+        producer.cancel()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules of python_control are flat, not a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
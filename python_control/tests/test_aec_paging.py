@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from xvf_host import COMMANDS, ReSpeaker
+from simulator import SimulatedDevice
+
+# not a multiple of the 15 coefficient page, so the last page is partial
+LENGTH = 301
+
+
+def filters(shape=(1, 4, LENGTH)):
+    return np.random.default_rng(0).standard_normal(shape).astype(np.float32)
+
+
+def test_load_then_dump():
+    sim = SimulatedDevice(aec_filter_length=LENGTH)
+    dev = ReSpeaker(sim)
+    expected = filters()
+    dev.load_aec_filters(expected)
+    for mic in range(4):
+        assert sim.aec_filter(0, mic) == expected[0, mic].tolist()
+    sim.aec_pages.clear()
+    assert np.array_equal(dev.dump_aec_filters(), expected)
+    page = COMMANDS["SPECIAL_CMD_AEC_FILTER_COEFFS"].count
+    assert sim.aec_pages == [(0, mic, offset, 'in') for mic in range(4) for offset in range(0, LENGTH, page)]
+
+
+def test_two_far_ends():
+    sim = SimulatedDevice(num_farends=2, num_mics=2, aec_filter_length=LENGTH)
+    dev = ReSpeaker(sim)
+    expected = filters((2, 2, LENGTH))
+    dev.load_aec_filters(expected)
+    assert sim.aec_filter(1, 0) == expected[1, 0].tolist()
+    assert np.array_equal(dev.dump_aec_filters(), expected)
+
+
+@pytest.mark.parametrize("name", ["filters.npy", "filters.bin"])
+def test_dump_to_file(tmp_path, name):
+    sim = SimulatedDevice(aec_filter_length=LENGTH)
+    dev = ReSpeaker(sim)
+    expected = filters()
+    dev.load_aec_filters(expected)
+    path = str(tmp_path / name)
+    dev.dump_aec_filters(path)
+    assert os.path.exists(path)
+
+    other = SimulatedDevice(aec_filter_length=LENGTH)
+    ReSpeaker(other).load_aec_filters(path)
+    assert other.aec_filter(0, 3) == expected[0, 3].tolist()
+
+
+def test_wrong_shape():
+    sim = SimulatedDevice(aec_filter_length=LENGTH)
+    with pytest.raises(ValueError):
+        ReSpeaker(sim).load_aec_filters(filters((1, 2, LENGTH)))
+    assert sim.aec_pages == []
+
+
+def test_wrong_length_aborts():
+    sim = SimulatedDevice(aec_filter_length=LENGTH)
+    with pytest.raises(ValueError):
+        ReSpeaker(sim).load_aec_filters(filters((1, 4, LENGTH - 1)))
+    assert sim.written("AEC_FILTER_CMD_ABORT") == 1
+
+
+def test_transfer_error_aborts():
+    class Failing(SimulatedDevice):
+        def ctrl_transfer(self, bmRequestType, bRequest, wValue, wIndex, data_or_wLength, timeout=None):
+            if len(self.aec_pages) == 5 and bmRequestType & 0x80:
+                self.aec_pages.append(None)
+                raise OSError('pipe error')
+            return super().ctrl_transfer(bmRequestType, bRequest, wValue, wIndex, data_or_wLength, timeout)
+
+    sim = Failing(aec_filter_length=LENGTH)
+    with pytest.raises(OSError):
+        ReSpeaker(sim).dump_aec_filters()
+    assert sim.written("AEC_FILTER_CMD_ABORT") == 1
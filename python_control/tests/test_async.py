@@ -0,0 +1,122 @@
+import time
+import asyncio
+
+import pytest
+
+import xvf_async
+from xvf_host import ReSpeaker
+from simulator import SimulatedDevice
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_api():
+    async def session():
+        async with xvf_async.AsyncReSpeaker(ReSpeaker(SimulatedDevice())) as dev:
+            await dev.write("LED_BRIGHTNESS", [42])
+            assert await dev.read("LED_BRIGHTNESS") == (42,)
+            assert await dev.read("NOT_A_PARAMETER") is None
+            assert await dev.read_many(["VERSION", "LED_BRIGHTNESS", "NOT_A_PARAMETER"]) == \
+                {"VERSION": (2, 1, 0), "LED_BRIGHTNESS": (42,), "NOT_A_PARAMETER": None}
+            with pytest.raises(ValueError):
+                await dev.write("VERSION", [1, 2, 3])
+        with pytest.raises(ValueError):
+            await dev.read("VERSION")
+
+    run(session())
+
+
+def test_retried_reads_do_not_wait_for_each_other():
+    names = ["AEC_AZIMUTH_VALUES", "AEC_SPENERGY_VALUES", "DOA_VALUE", "AUDIO_MGR_MIC_GAIN", "PP_AGCGAIN"]
+
+    async def reads():
+        async with xvf_async.AsyncReSpeaker(ReSpeaker(SimulatedDevice(ready_after=0.02))) as dev:
+            start = time.perf_counter()
+            values = await asyncio.gather(*[dev.read(name) for name in names])
+            return time.perf_counter() - start, values
+
+    elapsed, values = run(reads())
+    assert values == [ReSpeaker(SimulatedDevice()).read(name) for name in names]
+    assert elapsed < 0.02 * len(names) / 2
+
+
+def test_event_loop_not_blocked():
+    async def lag():
+        lags = []
+        stop = False
+
+        async def heartbeat():
+            while not stop:
+                before = time.perf_counter()
+                await asyncio.sleep(0.001)
+                lags.append(time.perf_counter() - before - 0.001)
+
+        async with xvf_async.AsyncReSpeaker(ReSpeaker(SimulatedDevice(ready_after=0.05))) as dev:
+            task = asyncio.ensure_future(heartbeat())
+            await dev.read("DOA_VALUE")
+            stop = True
+            await task
+        return max(lags)
+
+    # a blocking read would hold the loop for the 50 ms
+    assert run(lag()) < 0.025
+
+
+def test_timeout_drops_read():
+    sim = SimulatedDevice(ready_after=5.0)
+
+    async def session():
+        async with xvf_async.AsyncReSpeaker(ReSpeaker(sim)) as dev:
+            with pytest.raises(asyncio.TimeoutError):
+                await dev.read("AEC_AECCONVERGED", timeout=0.02)
+            await asyncio.sleep(0.02)
+            transfers = sim.transfers
+            await asyncio.sleep(0.05)
+            assert sim.transfers == transfers
+
+    run(session())
+
+
+def test_cancelled_call_aborts():
+    pytest.importorskip("numpy")
+    sim = SimulatedDevice(latency=0.0002, aec_filter_length=1920)
+
+    async def session():
+        async with xvf_async.AsyncReSpeaker(ReSpeaker(sim)) as dev:
+            task = asyncio.ensure_future(dev.call(ReSpeaker.dump_aec_filters))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            pages = len(sim.aec_pages)
+            assert sim.written("AEC_FILTER_CMD_ABORT") == 1 and 0 < pages < 4 * 1920 // 15
+            await asyncio.sleep(0.02)
+            assert len(sim.aec_pages) == pages
+
+            with pytest.raises(asyncio.TimeoutError):
+                await dev.call(ReSpeaker.dump_aec_filters, timeout=0.05)
+            assert sim.written("AEC_FILTER_CMD_ABORT") == 2
+            assert await dev.read("VERSION", xvf_async.PRIORITY_HIGH) == (2, 1, 0)
+
+    run(session())
+
+
+def test_high_priority_read_during_dump():
+    pytest.importorskip("numpy")
+    sim = SimulatedDevice(latency=0.0002, aec_filter_length=1920)
+
+    async def session():
+        async with xvf_async.AsyncReSpeaker(ReSpeaker(sim)) as dev:
+            task = asyncio.ensure_future(dev.call(ReSpeaker.dump_aec_filters))
+            await asyncio.sleep(0.01)
+            start = time.perf_counter()
+            await dev.read("DOA_VALUE", xvf_async.PRIORITY_HIGH)
+            elapsed = time.perf_counter() - start
+            assert not task.done()
+            await task
+            return elapsed
+
+    # waiting for the dump would take hundreds of ms
+    assert run(session()) < 0.05
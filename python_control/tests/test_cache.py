@@ -0,0 +1,97 @@
+import os
+import time
+import json
+
+import cache
+import profiles
+from xvf_host import PARAMETERS, ReSpeaker
+from simulator import SimulatedDevice
+
+
+def device(version=(2, 1, 0), repo_hash="c0ffee00"):
+    sim = SimulatedDevice()
+    sim.set("VERSION", list(version))
+    sim.set("BLD_REPO_HASH", repo_hash)
+    sim.set("BLD_MSG", "ua-io16-sqr")
+    return sim
+
+
+def session(respeaker):
+    """What a few tool invocations read and write, returning everything they read"""
+    readable = [name for name, info in PARAMETERS.items() if info[3] != "wo"]
+    profile = {"PP_AGCONOFF": (1,), "PP_AGCMAXGAIN": (64.0,), "AEC_HPFONOFF": (2,), "LED_BRIGHTNESS": (128,)}
+    results = [respeaker.read("VERSION")]
+    results += [respeaker.read(name) for name in cache.BUILD_INFO]
+    results.append(respeaker.read_many(readable))
+    profiles.apply_profile(respeaker, profile)
+    results += [respeaker.read("AEC_MIC_ARRAY_GEO") for _ in range(3)]
+    results += [respeaker.read("DOA_VALUE") for _ in range(5)]
+    respeaker.write("AUDIO_MGR_OP_L", [3, 1])
+    results.append(respeaker.read_many(["AUDIO_MGR_OP_L", "AUDIO_MGR_OP_L_PK0", "AUDIO_MGR_OP_ALL"]))
+    results.append(profiles.apply_profile(respeaker, profile).changed)
+    return results
+
+
+def test_same_values_fewer_transfers(tmp_path):
+    path = str(tmp_path / "build_info.json")
+    plain = device()
+    expected = session(ReSpeaker(plain))
+    transfers = []
+    for _ in range(2):
+        sim = device()
+        assert session(ReSpeaker(sim, cache=cache.ParameterCache("serial:0001", path))) == expected
+        assert sim.transfers < plain.transfers
+        transfers.append(sim.transfers)
+    # on disk, the build information costs one read of BLD_REPO_HASH
+    assert transfers[1] == transfers[0] - (len(cache.BUILD_INFO) - 1)
+    with open(path) as f:
+        assert json.load(f)["serial:0001"]["BLD_REPO_HASH"] == "c0ffee00"
+
+
+def test_other_firmware_reads_build_info(tmp_path):
+    path = str(tmp_path / "build_info.json")
+    session(ReSpeaker(device(), cache=cache.ParameterCache("serial:0001", path)))
+    sim = device((2, 1, 1), "f00dcafe")
+    respeaker = ReSpeaker(sim, cache=cache.ParameterCache("serial:0001", path))
+    assert respeaker.read("VERSION") == (2, 1, 1)
+    assert respeaker.read("BLD_REPO_HASH") == "f00dcafe"
+
+
+def test_reset_invalidates():
+    sim = device()
+    respeaker = ReSpeaker(sim, cache=cache.ParameterCache())
+    assert respeaker.read("VERSION") == (2, 1, 0)
+    respeaker.write("REBOOT", [1])
+    sim.set("VERSION", [2, 1, 1])
+    assert respeaker.read("VERSION") == (2, 1, 1)
+
+
+def test_write_through():
+    sim = SimulatedDevice()
+    respeaker = ReSpeaker(sim, cache=cache.ParameterCache())
+    respeaker.write("LED_BRIGHTNESS", [42])
+    transfers = sim.transfers
+    assert respeaker.read("LED_BRIGHTNESS") == (42,) and sim.transfers == transfers
+    # a value the device changed on its own is seen with cached=False
+    sim.set("LED_BRIGHTNESS", [7])
+    assert respeaker.read("LED_BRIGHTNESS") == (42,)
+    assert respeaker.read("LED_BRIGHTNESS", cached=False) == (7,)
+
+
+def test_volatile_and_ttl():
+    sim = SimulatedDevice()
+    respeaker = ReSpeaker(sim, cache=cache.ParameterCache(ttl={"DOA_VALUE": 0.05}))
+    respeaker.read("PP_AGCGAIN")
+    respeaker.read("PP_AGCGAIN")
+    assert respeaker.cache.hits.get("PP_AGCGAIN", 0) == 0
+    respeaker.read("DOA_VALUE")
+    sim.set("DOA_VALUE", [90, 1])
+    assert respeaker.read("DOA_VALUE") == (0, 0)
+    time.sleep(0.06)
+    assert respeaker.read("DOA_VALUE") == (90, 1)
+
+
+def test_no_identity_no_file(tmp_path):
+    parameter_cache = cache.ParameterCache(None, str(tmp_path / "build_info.json"))
+    session(ReSpeaker(device(), cache=parameter_cache))
+    assert parameter_cache.hit_count and not os.listdir(str(tmp_path))
@@ -0,0 +1,64 @@
+import time
+import wave
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import capture
+from recorder import TelemetryReader, RECORD_DTYPE
+from xvf_host import ReSpeaker
+from simulator import SimulatedDevice
+
+RATE, CHANNELS, FRAME = 16000, 2, 256
+
+
+class OffsetSource(capture.SyntheticSource):
+    # first sample at t = 0, the time base of the telemetry below
+    def open(self):
+        self.start = 0.0
+        return 0.0
+
+
+def test_offline_alignment(tmp_path):
+    seconds = 5
+    # telemetry at 100 Hz, the DOA turning 30 degrees/s through 359 -> 0
+    telemetry = np.zeros(seconds * 100 + 1, RECORD_DTYPE)
+    telemetry['timestamp'] = np.arange(len(telemetry)) / 100.0
+    telemetry['doa'] = (340 + 30 * telemetry['timestamp']).astype(int) % 360
+    telemetry['vad'] = telemetry['timestamp'] % 2 < 1
+    wav_path, sidecar_path = str(tmp_path / "capture.wav"), str(tmp_path / "capture.telemetry")
+    pipeline = capture.Capture(OffsetSource(CHANNELS, RATE, seconds, realtime=False), None, wav_path, sidecar_path, FRAME)
+    pipeline.telemetry = capture.TelemetryRecorder(len(telemetry))
+    pipeline.telemetry.append_records(telemetry)
+    pipeline.run(poll=False)
+
+    frames = seconds * RATE // FRAME
+    records = TelemetryReader(sidecar_path).records
+    with wave.open(wav_path, 'rb') as wav:
+        assert wav.getnframes() == seconds * RATE and wav.getnchannels() == CHANNELS
+        wav.setpos(RATE)
+        audio = np.frombuffer(wav.readframes(1), '<i2')
+    assert len(records) == frames == pipeline.frames
+    assert np.allclose(records['timestamp'], (np.arange(frames) * FRAME + FRAME / 2) / RATE)
+    assert np.allclose(audio, (8000 * np.sin(2 * np.pi * 220.0 * np.arange(1, CHANNELS + 1))).astype(np.int16), atol=1)
+    expected = (340 + 30 * records['timestamp']) % 360
+    assert np.abs((records['doa'] - expected + 180) % 360 - 180).max() <= 1.5
+    assert np.array_equal(records['vad'], np.floor(records['timestamp'] * 100) / 100 % 2 < 1)
+    del records
+
+
+def test_live(tmp_path):
+    sim = SimulatedDevice()
+    origin = time.monotonic()
+    sim.set_source("DOA_VALUE", lambda: [int(90 * (time.monotonic() - origin)) % 360, 1])
+    wav_path, sidecar_path = str(tmp_path / "live.wav"), str(tmp_path / "live.telemetry")
+    pipeline = capture.Capture(capture.SyntheticSource(CHANNELS, RATE, 0.5), ReSpeaker(sim), wav_path, sidecar_path, FRAME)
+    pipeline.run()
+    records = TelemetryReader(sidecar_path).records
+    assert len(records) == RATE // 2 // FRAME
+    # skip the frames before the first telemetry sample
+    live = records[records['timestamp'] > pipeline.telemetry.view()['timestamp'][0]]
+    expected = (90 * (live['timestamp'] - origin)) % 360
+    assert np.median(np.abs((live['doa'] - expected + 180) % 360 - 180)) < 2
+    del records, live
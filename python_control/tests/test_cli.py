@@ -0,0 +1,94 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# xvf_host.main() with a stand-in for the USB transport that answers VERSION
+CLI = """
+import sys, array, xvf_host
+sys.argv = ['xvf_host.py'] + sys.argv[1:]
+class Device:
+    def ctrl_transfer(self, *args):
+        return array.array('B', [0, 2, 1, 0])
+    def close(self):
+        pass
+xvf_host.find = lambda **kw: xvf_host.ReSpeaker(Device())
+try:
+    xvf_host.main()
+except SystemExit as e:
+    print('exit', e.code)
+print('loaded', sorted(m for m in {!r} if m in sys.modules))
+"""
+
+
+def run(argv, modules, tmp_path):
+    env = dict(os.environ, XVF_HOST_SOCKET=str(tmp_path / "none.sock"), XDG_CACHE_HOME=str(tmp_path / "cache"))
+    result = subprocess.run([sys.executable, "-c", CLI.format(modules)] + argv, cwd=HERE, env=env,
+                            capture_output=True, text=True, check=True)
+    return result.stdout
+
+
+@pytest.mark.parametrize("argv", [["--list"], ["NOT_A_COMMAND"], ["VERSION", "--values", "1"]])
+def test_no_usb_stack(argv, tmp_path):
+    assert "loaded []" in run(argv, ["usb", "usb.core"], tmp_path)
+
+
+def test_read_keeps_heavy_modules_off(tmp_path):
+    # threading comes with logging
+    output = run(["VERSION"], ["socket", "socketserver", "statistics", "json"], tmp_path)
+    assert "VERSION: [2, 1, 0]" in output and "loaded []" in output
+
+
+def test_errors(tmp_path):
+    assert "exit 2" in run(["NOT_A_COMMAND"], [], tmp_path)
+    output = run(["VERSION", "--values", "1"], [], tmp_path)
+    assert "Error: VERSION is read-only" in output and "exit 1" in output
+
+
+
+# ms that importing xvf_host may take, besides the logging module it needs for
+# the transfer trace, which is in the standard library and imported by most
+# applications anyway
+IMPORT_BUDGET_MS = 10
+
+
+def import_times(pycache):
+    """Cumulative -X importtime of every module of a fresh `import xvf_host`, in ms"""
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-X", "pycache_prefix=" + pycache, "-c", "import xvf_host"],
+                            cwd=HERE, env=env, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            times[fields[2].strip()] = int(fields[1]) / 1000
+    return times
+
+
+def test_import_time(tmp_path):
+    # the first run compiles and caches the bytecode, as an installed tool would have,
+    # the best of the others is kept
+    runs = [import_times(str(tmp_path)) for _ in range(4)][1:]
+    assert not any(name.startswith("usb") for name in runs[0])
+    best = min(times["xvf_host"] - times.get("logging", 0) for times in runs)
+    assert best < IMPORT_BUDGET_MS, "import xvf_host took {:.1f} ms besides logging".format(best)
+
+
+def test_cache_is_opt_in(tmp_path):
+    run(["VERSION"], [], tmp_path)
+    assert not (tmp_path / "cache").exists()
+    assert "VERSION: [2, 1, 0]" in run(["VERSION", "--cache"], ["cache"], tmp_path)
+
+
+def test_headroom_frame_must_be_positive(tmp_path):
+    assert "exit 2" in run(["--headroom", "1", "--headroom-frame-ms", "0"], [], tmp_path)
+
+
+@pytest.mark.parametrize("option", [["--i2c", "1"], ["--replay", "session.log"]])
+def test_daemon_serves_usb_only(option, tmp_path):
+    output = run(["--daemon"] + option, ["xvf_daemon", "i2c_transport"], tmp_path)
+    assert "exit 2" in output and "loaded []" in output
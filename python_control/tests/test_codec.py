@@ -0,0 +1,81 @@
+import struct
+import threading
+
+import pytest
+
+from xvf_host import COMMANDS, PARAMETERS, ReSpeaker
+from simulator import SimulatedDevice
+
+
+FORMATS = {'uint8': 'B', 'uint16': 'H', 'uint32': 'I', 'int32': 'i', 'float': 'f', 'radians': 'f'}
+
+
+def values_for(command):
+    if command.type in ('float', 'radians'):
+        return [0.5 * (index + 1) for index in range(command.count)]
+    return [index % 7 + 1 for index in range(command.count)]
+
+
+@pytest.mark.parametrize("name", ["DOA_VALUE", "AEC_AZIMUTH_VALUES", "AEC_SPENERGY_VALUES", "AEC_MIC_ARRAY_GEO", "VERSION"])
+def test_decode(name):
+    command = COMMANDS[name]
+    data_type, data_cnt = PARAMETERS[name][4], PARAMETERS[name][2]
+    sim = SimulatedDevice()
+    sim.set(name, values_for(command))
+    response = sim.ctrl_transfer(0xC0, 0, command.read_wvalue, command.windex, command.length)
+    assert command.decode(response) == struct.unpack('<' + FORMATS[data_type] * data_cnt, response.tobytes()[1:])
+
+
+@pytest.mark.parametrize("name", sorted(name for name, command in COMMANDS.items()
+                                        if command.access == "rw" and command.type != "char"))
+def test_write_read_round_trip(name):
+    command = COMMANDS[name]
+    dev = ReSpeaker(SimulatedDevice())
+    values = values_for(command)
+    dev.write(name, values)
+    assert dev.read(name) == tuple(float(value) if command.type in ('float', 'radians') else value for value in values)
+
+
+def test_encode_returns_new_bytes():
+    command = COMMANDS["LED_RING_COLOR"]
+    first = command.encode(list(range(12)))
+    second = command.encode([0] * 12)
+    assert isinstance(first, bytes) and first == struct.pack('<12I', *range(12))
+    assert second == bytes(48)
+
+
+def test_encode_out_of_range():
+    with pytest.raises(struct.error):
+        COMMANDS["LED_BRIGHTNESS"].encode([256])
+
+
+def test_parallel_writes_keep_their_payload():
+    sim = SimulatedDevice()
+    payloads = []
+    lock = threading.Lock()
+
+    class Recording(SimulatedDevice):
+        def ctrl_transfer(self, bmRequestType, bRequest, wValue, wIndex, data_or_wLength, timeout=None):
+            if not bmRequestType & 0x80:
+                with lock:
+                    payloads.append(bytes(data_or_wLength))
+            return sim.ctrl_transfer(bmRequestType, bRequest, wValue, wIndex, data_or_wLength, timeout)
+
+    def writer(color):
+        dev = ReSpeaker(Recording())
+        for _ in range(200):
+            dev.write("LED_RING_COLOR", [color] * 12)
+
+    threads = [threading.Thread(target=writer, args=(color,)) for color in (1, 2, 3, 4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(payloads) == 800
+    assert all(payload == struct.pack('<12I', *[payload[0]] * 12) for payload in payloads)
+
+
+def test_char_parameter():
+    sim = SimulatedDevice()
+    sim.set("BLD_MSG", "ua-io16-sqr")
+    assert ReSpeaker(sim).read("BLD_MSG") == "ua-io16-sqr"
@@ -0,0 +1,109 @@
+import os
+import sys
+import socket
+import threading
+import subprocess
+
+import pytest
+
+if not hasattr(socket, 'AF_UNIX'):
+    pytest.skip("the daemon needs unix sockets", allow_module_level=True)
+
+import xvf_daemon
+from xvf_host import ReSpeaker
+from simulator import SimulatedDevice
+
+IDS = (0x2886, 0x001A)
+
+
+@pytest.fixture
+def server(tmp_path):
+    path = str(tmp_path / "run" / "xvf_host.sock")
+    server = xvf_daemon.SessionServer(ReSpeaker(SimulatedDevice()), path, ids=IDS)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server, path
+    server.shutdown()
+    server.server_close()
+
+
+def test_socket_is_private(server):
+    _, path = server
+    assert os.stat(path).st_mode & 0o777 == 0o600
+    assert os.stat(os.path.dirname(path)).st_mode & 0o777 == 0o700
+
+
+def test_session(server):
+    _, path = server
+    device = xvf_daemon.connect(path, *IDS)
+    assert device is not None and device.ids() == IDS
+    dev = ReSpeaker(device)
+    assert dev.read("VERSION") == (2, 1, 0)
+    dev.write("LED_BRIGHTNESS", [42])
+    assert dev.read("LED_BRIGHTNESS") == (42,)
+    dev.close()
+
+
+def test_concurrent_sessions(server):
+    _, path = server
+    errors = []
+
+    def poll():
+        dev = ReSpeaker(xvf_daemon.DaemonDevice(path))
+        for _ in range(50):
+            if dev.read("VERSION") != (2, 1, 0):
+                errors.append(1)
+        dev.close()
+
+    threads = [threading.Thread(target=poll) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+
+def test_other_device_not_served(server):
+    _, path = server
+    assert xvf_daemon.connect(path, 0x2886, 0x0018) is None
+
+
+def test_live_socket_not_replaced(server):
+    _, path = server
+    with pytest.raises(ValueError):
+        xvf_daemon.SessionServer(ReSpeaker(SimulatedDevice()), path)
+    assert xvf_daemon.connect(path) is not None
+
+
+def test_stale_socket_replaced(tmp_path):
+    path = str(tmp_path / "xvf_host.sock")
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()
+    server = xvf_daemon.SessionServer(ReSpeaker(SimulatedDevice()), path, ids=IDS)
+    server.server_close()
+
+
+def test_file_not_replaced(tmp_path):
+    path = str(tmp_path / "other.sock")
+    with open(path, "w"):
+        pass
+    with pytest.raises(ValueError):
+        xvf_daemon.SessionServer(ReSpeaker(SimulatedDevice()), path)
+    assert os.path.exists(path) and xvf_daemon.connect(path) is None
+
+
+def test_no_daemon(tmp_path):
+    assert xvf_daemon.connect(str(tmp_path / "none.sock")) is None
+
+
+def test_cli_goes_through_daemon(server):
+    _, path = server
+    cli = ("import sys, xvf_host\n"
+           "sys.argv = ['xvf_host.py', 'VERSION']\n"
+           "xvf_host.find = None # not through the daemon otherwise\n"
+           "xvf_host.main()\n")
+    here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", cli], cwd=here, env=dict(os.environ, XVF_HOST_SOCKET=path),
+                            capture_output=True, text=True, check=True)
+    assert "VERSION: [2, 1, 0]" in result.stdout
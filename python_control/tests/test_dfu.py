@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+import dfu
+from xvf_host import ReSpeaker
+from simulator import SimulatedDevice
+
+# a partial last block
+DATA = os.urandom(20 * dfu.BLOCK_SIZE + 100)
+
+
+def dfu_writes(sim, name):
+    command = dfu.DFU_COMMANDS[name]
+    return sim.writes.get((command.windex, command.write_wvalue), 0)
+
+
+def updater(**kwargs):
+    sim = SimulatedDevice(dfu_version=(2, 0, 10), **kwargs)
+    return sim, dfu.DfuUpdater(ReSpeaker(sim))
+
+
+def test_image_slices():
+    image = dfu.FirmwareImage(DATA, (2, 1, 0))
+    assert image.blocks == 21
+    last = bytes(image.payload(20))
+    assert dfu.BLOCK_HEADER.unpack_from(last)[0] == 100 and last[2:102] == DATA[-100:]
+
+
+def test_version_from_file_name(tmp_path):
+    path = tmp_path / "respeaker_xvf3800_usb_dfu_firmware_v2.1.0.bin"
+    path.write_bytes(DATA)
+    image = dfu.FirmwareImage.from_file(str(path))
+    assert image.version == (2, 1, 0) and image.size == len(DATA)
+
+
+def test_update():
+    sim, dfu_updater = updater(dfu_busy=0.0005)
+    result = dfu_updater.update(dfu.FirmwareImage(DATA, (2, 1, 0)))
+    assert not result.skipped and result.verified and result.blocks == 21
+    assert sim.firmware == DATA and sim.dfu_reboots == 1 and sim.dfu_state == dfu.DFU_STATE_IDLE
+
+
+def test_same_image_skipped():
+    sim, dfu_updater = updater()
+    image = dfu.FirmwareImage(DATA, (2, 1, 0))
+    dfu_updater.update(image)
+    sim.dfu_version = (2, 1, 0)
+    transfers = dfu_writes(sim, "DFU_DNLOAD")
+    result = dfu_updater.update(image)
+    assert result.skipped and result.verified and sim.dfu_reboots == 1
+    assert dfu_writes(sim, "DFU_DNLOAD") == transfers
+    assert not dfu_updater.update(image, force=True, reboot=False).skipped
+
+
+def test_same_version_other_image_downloaded():
+    sim, dfu_updater = updater()
+    dfu_updater.update(dfu.FirmwareImage(DATA, (2, 1, 0)))
+    sim.dfu_version = (2, 1, 0)
+    variant = DATA[:-100] + bytes(100)
+    result = dfu_updater.update(dfu.FirmwareImage(variant, (2, 1, 0)))
+    assert not result.skipped and result.verified and sim.firmware == variant
+
+
+def test_corrupted_partition():
+    sim, dfu_updater = updater()
+    image = dfu.FirmwareImage(DATA, (2, 1, 0))
+    dfu_updater.update(image)
+    sim.firmware = sim.firmware[:1000] + bytes([sim.firmware[1000] ^ 1]) + sim.firmware[1001:]
+    assert not dfu_updater.verify(image)
+
+
+def test_recovers_from_error():
+    sim, dfu_updater = updater()
+    sim._dfu_error()
+    assert dfu_updater.update(dfu.FirmwareImage(DATA, (2, 1, 0))).verified
+    assert sim.firmware == DATA
+
+
+def test_download_error_aborts():
+    sim, dfu_updater = updater()
+
+    def fail(block, blocks, elapsed):
+        if block == 3:
+            sim._dfu_error()
+
+    with pytest.raises(ValueError):
+        dfu_updater.update(dfu.FirmwareImage(DATA, (2, 1, 0)), progress=fail)
+    assert dfu_writes(sim, "DFU_ABORT") == 1 and sim.dfu_reboots == 0
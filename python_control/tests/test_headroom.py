@@ -0,0 +1,72 @@
+import json
+import random
+
+import pytest
+
+import headroom
+from xvf_host import ReSpeaker
+from simulator import SimulatedDevice
+
+FRAME_TICKS = headroom.FRAME_PERIOD / headroom.TICK
+
+
+class Stage:
+    """Idle time of one stage: normally distributed per frame, plus one spike the sampling misses"""
+
+    def __init__(self, sim, rng, name, mean, spike):
+        current, minimum, self.reset = headroom.STAGES[name]
+        self.sim, self.rng = sim, rng
+        self.mean, self.spike = mean, spike
+        self.minimum, self.resets = 0, 0
+        sim.set_source(current, self.current)
+        sim.set_source(minimum, lambda: [self.minimum])
+
+    def current(self):
+        if self.sim.written(self.reset) != self.resets:
+            self.resets = self.sim.written(self.reset)
+            self.minimum = int(FRAME_TICKS * self.spike)
+        idle = int(FRAME_TICKS * max(0.0, self.rng.gauss(self.mean, 0.02)))
+        self.minimum = min(self.minimum, idle)
+        return [idle]
+
+
+def test_measure(tmp_path):
+    sim = SimulatedDevice()
+    rng = random.Random(0)
+    stages = {"AEC": Stage(sim, rng, "AEC", 0.40, 0.25), "PP": Stage(sim, rng, "PP", 0.60, 0.50),
+              "AUDIO_MGR": Stage(sim, rng, "AUDIO_MGR", 0.80, 0.70), "I2S": Stage(sim, rng, "I2S", 0.30, 0.05)}
+    sim.set("MAX_CONTROL_TIME", [12345])
+
+    report = headroom.measure(ReSpeaker(sim), 0.2, rate_hz=100)
+    assert all(stage.resets == 1 for stage in stages.values()) and sim.written("RESET_MAX_CONTROL_TIME") == 1
+    for name, stage in stages.items():
+        result = report['stages'][name]
+        assert result['samples'] == 20 and result['min_idle_ticks'] == stage.minimum
+        assert abs(result['p50'] - stage.mean * 100) < 3.0, result
+        assert result['min'] <= result['p1'] <= result['p50']
+        assert result['near_overrun'] == (name == "I2S")
+    assert report['max_control_ticks'] == 12345
+
+    path = str(tmp_path / "headroom.json")
+    headroom.save_report(report, path)
+    with open(path) as f:
+        assert json.load(f) == json.loads(json.dumps(report))
+
+
+def test_frame_period():
+    sim = SimulatedDevice()
+    for name in ("AEC", "PP", "AUDIO_MGR", "I2S"):
+        sim.set(name + "_CURRENT_IDLE_TIME", [750000])
+        sim.set(name + "_MIN_IDLE_TIME", [750000])
+    report = headroom.measure(ReSpeaker(sim), 0.05, rate_hz=100, frame_period=0.030)
+    assert report['frame_period'] == 0.030
+    assert all(result['min'] == result['p50'] == 25.0 for result in report['stages'].values())
+    with pytest.raises(ValueError):
+        headroom.measure(ReSpeaker(sim), 0.05, frame_period=0)
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert headroom.percentile(values, 1) == 1
+    assert headroom.percentile(values, 50) == 50
+    assert headroom.percentile(values, 100) == 100
@@ -0,0 +1,103 @@
+import os
+import struct
+
+import pytest
+
+import dfu
+import i2c_transport
+from xvf_host import COMMANDS, PARAMETERS, ReSpeaker
+from simulator import SimulatedDevice, SimulatedI2cBus
+
+
+def i2c(sim):
+    return ReSpeaker(i2c_transport.I2cTransport(SimulatedI2cBus(sim)))
+
+
+def test_round_trip_matches_usb():
+    usb_sim, i2c_sim = SimulatedDevice(), SimulatedDevice()
+    usb, respeaker = ReSpeaker(usb_sim), i2c(i2c_sim)
+    for name, command in COMMANDS.items():
+        if command.access == "rw" and command.type != "char":
+            values = [index % 7 + 1 for index in range(command.count)]
+            usb.write(name, values)
+            respeaker.write(name, values)
+            assert respeaker.read(name) == usb.read(name), name
+    readable = [name for name, info in PARAMETERS.items() if info[3] != "wo"]
+    assert respeaker.read_many(readable) == usb.read_many(readable)
+
+
+def test_requests_reused():
+    respeaker = i2c(SimulatedDevice())
+    readable = [name for name, info in PARAMETERS.items() if info[3] != "wo"]
+    respeaker.read_many(readable)
+    transactions = dict(respeaker.dev.transactions)
+    respeaker.read_many(readable)
+    assert respeaker.dev.transactions == transactions
+    command = COMMANDS["VERSION"]
+    first = respeaker.dev.ctrl_transfer(0xC0, 0, command.read_wvalue, command.windex, command.length)
+    second = respeaker.dev.ctrl_transfer(0xC0, 0, command.read_wvalue, command.windex, command.length)
+    assert first == second and first is not second
+
+
+def test_retries():
+    sim = SimulatedDevice(retries=2)
+    respeaker = i2c(sim)
+    assert respeaker.read("VERSION") == (2, 1, 0) and sim.transfers == 3
+
+
+def test_aec_filters_and_dfu():
+    pytest.importorskip("numpy")
+    sim = SimulatedDevice(aec_filter_length=30)
+    for key in sim.aec_filters:
+        sim.aec_filters[key][:] = struct.pack('<30f', *[sum(key) + index / 30 for index in range(30)])
+    respeaker = i2c(sim)
+    coeffs = respeaker.dump_aec_filters()
+    assert all(list(coeffs[far, mic]) == sim.aec_filter(far, mic) for far, mic in sim.aec_filters)
+
+    sim = SimulatedDevice(dfu_version=(1, 0, 4))
+    data = os.urandom(2000)
+    result = dfu.DfuUpdater(i2c(sim)).update(dfu.FirmwareImage(data, (1, 0, 7)))
+    assert result.verified and sim.firmware == data
+
+
+def test_wrong_address():
+    with pytest.raises(OSError):
+        ReSpeaker(i2c_transport.I2cTransport(SimulatedI2cBus(), 0x2D)).read("VERSION")
+
+
+def test_oversized_payload():
+    with pytest.raises(ValueError):
+        i2c_transport.I2cTransport(SimulatedI2cBus()).ctrl_transfer(0x40, 0, 1, 1, bytes(300))
+
+
+def test_find_i2c():
+    bus = SimulatedI2cBus()
+    respeaker = i2c_transport.find_i2c(bus)
+    assert respeaker is not None and respeaker.read("VERSION") == (2, 1, 0)
+    assert i2c_transport.find_i2c(bus, 0x2D) is None
+    assert i2c_transport.find_i2c("/nonexistent/i2c-99") is None
+
+
+def test_find_i2c_other_device():
+    class OtherDevice:
+        def ctrl_transfer(self, bmRequestType, bRequest, wValue, wIndex, data_or_wLength, timeout=None):
+            # not a device control status byte
+            return bytes([0xFF]) + bytes(data_or_wLength - 1)
+
+    class Bus(SimulatedI2cBus):
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    bus = Bus(OtherDevice())
+    assert i2c_transport.find_i2c(bus) is None
+    assert bus.closed
+
+
+def test_bus_time():
+    bus = SimulatedI2cBus(clock=400000)
+    respeaker = ReSpeaker(i2c_transport.I2cTransport(bus))
+    respeaker.read("DOA_VALUE")
+    # address, header, address, status and data
+    assert bus.bytes == 1 + 3 + 1 + COMMANDS["DOA_VALUE"].length
@@ -0,0 +1,95 @@
+import struct
+import threading
+
+import pytest
+
+pytest.importorskip("numpy")
+
+import led
+import cache
+from xvf_host import ReSpeaker
+from simulator import SimulatedDevice
+
+
+def test_solid_and_pack():
+    frame = led.solid(0x102030).frame(0)
+    assert struct.unpack('<12I', frame) == (0x102030,) * 12
+    assert len(led.rainbow(60).frames) == 60 and len(set(led.rainbow(60).frames)) == 60
+
+
+def test_run_writes_changed_frames():
+    sim = SimulatedDevice()
+    animator = led.LedAnimator(ReSpeaker(sim), led.solid(0xFF0000), fps=100)
+    animator.run(0.1)
+    assert sim.written("LED_EFFECT") == 1
+    assert animator.written == 1 and animator.skipped == animator.frames - 1
+    assert ReSpeaker(sim).read("LED_RING_COLOR") == (0xFF0000,) * 12
+
+    animator.play(led.rainbow())
+    animator.run(0.1)
+    assert animator.written > 5
+    assert ReSpeaker(sim).read("LED_RING_COLOR") == struct.unpack('<12I', animator.last)
+
+
+def test_cached_ring_follows_frames():
+    sim = SimulatedDevice()
+    respeaker = ReSpeaker(sim, cache=cache.ParameterCache())
+    assert respeaker.read("LED_RING_COLOR") == (0,) * 12
+    animator = led.LedAnimator(respeaker, led.rainbow(), fps=100)
+    animator.run(0.1)
+    transfers = sim.transfers
+    assert respeaker.read("LED_RING_COLOR") == struct.unpack('<12I', animator.last) == ReSpeaker(sim).read("LED_RING_COLOR")
+    assert sim.transfers == transfers + 1
+
+
+def test_write_payload():
+    sim = SimulatedDevice()
+    respeaker = ReSpeaker(sim)
+    respeaker.write_payload("LED_RING_COLOR", struct.pack('<12I', *range(12)))
+    assert respeaker.read("LED_RING_COLOR") == tuple(range(12))
+    for name, payload in (("VERSION", bytes(3)), ("LED_RING_COLOR", bytes(4)), ("NOT_A_PARAMETER", b"")):
+        with pytest.raises(ValueError):
+            respeaker.write_payload(name, payload)
+
+
+@pytest.mark.parametrize("doa", [0, 40, 200, 359])
+def test_doa_pointer(doa):
+    sim = SimulatedDevice()
+    respeaker = ReSpeaker(sim)
+    pointer = led.DoaPointer(lambda: respeaker.read("DOA_VALUE"), color=0xFF0000, background=0)
+    animator = led.LedAnimator(respeaker, pointer)
+    sim.set("DOA_VALUE", [doa, 1])
+    animator.show(pointer.frame(0))
+    ring = respeaker.read("LED_RING_COLOR")
+    assert ring.index(max(ring)) == round(doa / 30) % 12 and len([color for color in ring if color]) <= 2
+    sim.set("DOA_VALUE", [doa, 0])
+    animator.show(pointer.frame(1))
+    assert not any(respeaker.read("LED_RING_COLOR"))
+
+
+def test_gives_way_to_other_transfers():
+    respeaker = ReSpeaker(SimulatedDevice())
+    animator = led.LedAnimator(respeaker, led.rainbow())
+    held, release = threading.Event(), threading.Event()
+
+    def transfer():
+        # another thread in the middle of a transfer
+        with respeaker.dev.lock:
+            held.set()
+            release.wait()
+
+    thread = threading.Thread(target=transfer)
+    thread.start()
+    held.wait()
+    assert not animator.show(animator.pattern.frame(0))
+    release.set()
+    thread.join()
+    assert animator.deferred == 1 and animator.show(animator.pattern.frame(0))
+
+
+def test_start_stop():
+    animator = led.LedAnimator(ReSpeaker(SimulatedDevice()), led.rainbow(), fps=100)
+    animator.start()
+    assert ReSpeaker(SimulatedDevice()).read("VERSION") == (2, 1, 0)
+    animator.stop()
+    assert animator.thread is None and animator.frames > 0
@@ -0,0 +1,61 @@
+import sys
+import time
+
+import pytest
+
+import manager
+from manager import DeviceManager
+from xvf_host import ReSpeaker
+from simulator import SimulatedDevice
+from telemetry import TELEMETRY_PARAMETERS
+
+
+def devices(count, **kwargs):
+    return {"sim{}".format(index): ReSpeaker(SimulatedDevice(**kwargs)) for index in range(count)}
+
+
+def test_poll():
+    respeakers = devices(4)
+    respeakers["sim2"].dev.set("DOA_VALUE", [90, 1])
+    with DeviceManager(respeakers) as manager:
+        assert len(manager) == 4 and manager["sim1"] is respeakers["sim1"]
+        poll = manager.poll()
+        assert poll.seq == 0 and sorted(poll.samples) == sorted(respeakers)
+        assert poll.samples["sim2"].values["DOA_VALUE"] == (90, 1)
+        assert set(poll.samples["sim0"].values) == set(TELEMETRY_PARAMETERS)
+        assert manager.poll().seq == 1
+
+
+def test_polls_in_parallel():
+    with DeviceManager(devices(4, latency=0.005)) as manager:
+        poll = manager.poll(["DOA_VALUE"])
+        timestamps = [sample.timestamp for sample in poll.samples.values()]
+        assert max(timestamps) - min(timestamps) < 0.004
+
+
+def test_stream_and_submit():
+    with DeviceManager(devices(2)) as manager:
+        polls = list(manager.stream(["DOA_VALUE"], rate_hz=100, count=5))
+        assert [poll.seq for poll in polls] == list(range(5))
+        futures = manager.submit(ReSpeaker.read, "VERSION")
+        assert {device_id: future.result() for device_id, future in futures.items()} == \
+            {"sim0": (2, 1, 0), "sim1": (2, 1, 0)}
+
+
+def test_slow_consumer_skips():
+    dropped = 0
+    with DeviceManager(devices(2)) as manager:
+        for poll in manager.stream(["DOA_VALUE"], rate_hz=200, count=5):
+            assert poll.samples["sim0"].dropped == poll.samples["sim1"].dropped
+            dropped += poll.samples["sim0"].dropped
+            time.sleep(0.02)
+    assert dropped >= 8
+
+
+@pytest.mark.parametrize("name", ["NOT_A_PARAMETER", "reboot"])
+def test_main_checks_parameters(monkeypatch, capsys, name):
+    monkeypatch.setattr(sys, "argv", ["manager.py", name])
+    monkeypatch.setattr(DeviceManager, "find", None)
+    with pytest.raises(SystemExit) as e:
+        manager.main()
+    assert e.value.code == 1 and capsys.readouterr().out.startswith("Error: ")
@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+import profiles
+from xvf_host import COMMANDS, ReSpeaker
+from simulator import SimulatedDevice
+
+RAW = {"pp_agconoff": 1, "PP_AGCMAXGAIN": [64.0], "aec_hpfonoff": "0x2", "LED_BRIGHTNESS": [128],
+       "AEC_FIXEDBEAMSAZIMUTH_VALUES": [0.5, 1.5]}
+
+
+def test_load_json(tmp_path):
+    path = tmp_path / "room.json"
+    path.write_text(json.dumps(RAW))
+    assert profiles.load_profile(str(path)) == {"PP_AGCONOFF": (1,), "PP_AGCMAXGAIN": (64.0,), "AEC_HPFONOFF": (2,),
+                                                 "LED_BRIGHTNESS": (128,), "AEC_FIXEDBEAMSAZIMUTH_VALUES": (0.5, 1.5)}
+
+
+def test_load_yaml(tmp_path):
+    yaml = pytest.importorskip("yaml")
+    path = tmp_path / "room.yaml"
+    path.write_text(yaml.safe_dump(RAW))
+    assert profiles.load_profile(str(path)) == profiles.validate_profile(RAW)
+
+
+@pytest.mark.parametrize("bad", [{"NOT_A_PARAMETER": 1}, {"VERSION": [1, 2, 3]}, {"SAVE_CONFIGURATION": 1},
+                                 {"AEC_FIXEDBEAMSAZIMUTH_VALUES": [1.0]}, {"AEC_HPFONOFF": 1.5},
+                                 {"PP_AGCONOFF": "nope"}, {"LED_BRIGHTNESS": 256}, ["PP_AGCONOFF"]])
+def test_invalid(bad):
+    with pytest.raises(ValueError):
+        profiles.validate_profile(bad)
+
+
+def test_apply_writes_only_changes():
+    profile = profiles.validate_profile(RAW)
+    sim = SimulatedDevice()
+    dev = ReSpeaker(sim)
+    dev.write("LED_BRIGHTNESS", [128])
+    result = profiles.apply_profile(dev, profile)
+    assert sorted(result.changed) == sorted(name for name in profile if name != "LED_BRIGHTNESS")
+    assert result.unchanged == ["LED_BRIGHTNESS"] and sim.written("LED_BRIGHTNESS") == 1
+    for name, values in profile.items():
+        assert COMMANDS[name].struct.unpack(sim.values[sim._key(name)]) == values
+
+    # again: one read per parameter, nothing written
+    sim.transfers = 0
+    result = profiles.apply_profile(dev, profile, save=True)
+    assert not result.changed and sim.transfers == len(profile) + 1
+    assert sim.written("SAVE_CONFIGURATION") == 1
+
+
+def test_verify_failure():
+    class Clamping(SimulatedDevice):
+        # the device ignores writes of LED_BRIGHTNESS
+        def ctrl_transfer(self, bmRequestType, bRequest, wValue, wIndex, data_or_wLength, timeout=None):
+            if not bmRequestType & 0x80 and (wIndex, wValue) == self._key("LED_BRIGHTNESS"):
+                return len(data_or_wLength)
+            return super().ctrl_transfer(bmRequestType, bRequest, wValue, wIndex, data_or_wLength, timeout)
+
+    with pytest.raises(ValueError, match="LED_BRIGHTNESS"):
+        profiles.apply_profile(ReSpeaker(Clamping()), profiles.validate_profile(RAW))
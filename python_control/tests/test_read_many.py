@@ -0,0 +1,9 @@
+from xvf_host import PARAMETERS, ReSpeaker
+from simulator import SimulatedDevice
+
+
+def test_read_many_matches_reads():
+    names = [name for name, info in PARAMETERS.items() if info[3] != "wo"]
+    dev = ReSpeaker(SimulatedDevice(retries=1))
+    assert dev.read_many(names) == {name: dev.read(name) for name in names}
+    assert dev.read_many(["DOA_VALUE", "NOT_A_PARAMETER"]) == {"DOA_VALUE": (0, 0), "NOT_A_PARAMETER": None}
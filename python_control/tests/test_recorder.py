@@ -0,0 +1,64 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from recorder import TelemetryRecorder, TelemetryReader, record, RECORD, RECORD_DTYPE
+from xvf_host import ReSpeaker
+from simulator import SimulatedDevice
+
+AZIMUTH = (0.5, 1.0, 1.5, 2.0)
+ENERGY = (1.0, 0.0, 2.0, 0.5)
+
+
+def test_layouts_match():
+    assert RECORD.size == RECORD_DTYPE.itemsize
+    record = np.zeros(1, RECORD_DTYPE)
+    record[0] = (1.5, AZIMUTH, ENERGY, 90, 1)
+    assert RECORD.unpack(record.tobytes()) == (1.5,) + AZIMUTH + ENERGY + (90, 1)
+
+
+def test_ring_overwrites_oldest():
+    recorder = TelemetryRecorder(capacity=8)
+    for i in range(20):
+        recorder.append(i * 0.01, AZIMUTH, ENERGY, i, i & 1)
+    records = recorder.view()
+    assert recorder.count == 20 and list(records['doa']) == list(range(12, 20))
+    assert np.allclose(records['azimuth'][0], AZIMUTH) and np.allclose(records['energy'][-1], ENERGY)
+
+
+def test_spill_and_read(tmp_path):
+    path = str(tmp_path / "capture.bin")
+    with TelemetryRecorder(capacity=16, path=path) as recorder:
+        for i in range(100):
+            recorder.append(i * 0.01, AZIMUTH, ENERGY, i % 360, i & 1)
+    assert recorder.count == 100
+    reader = TelemetryReader(path)
+    assert len(reader) == 100 and list(reader.records['doa']) == list(range(100))
+    assert sum(int(chunk['vad'].sum()) for chunk in reader.chunks(30)) == 50
+    assert [int(record['doa']) for record in reader][:3] == [0, 1, 2]
+
+
+def test_append_records(tmp_path):
+    source = TelemetryRecorder(capacity=50)
+    for i in range(50):
+        source.append(i, AZIMUTH, ENERGY, i, 0)
+    path = str(tmp_path / "capture.bin")
+    with TelemetryRecorder(capacity=16, path=path) as recorder:
+        recorder.append_records(source.view())
+        assert recorder.count == 50
+    assert np.array_equal(TelemetryReader(path).records, source.view())
+
+
+def test_record_from_device(tmp_path):
+    sim = SimulatedDevice()
+    sim.set("DOA_VALUE", [90, 1])
+    recorder = TelemetryRecorder(capacity=16)
+    record(ReSpeaker(sim), recorder, rate_hz=200, count=5)
+    assert list(recorder.view()['doa']) == [90] * 5
+
+
+def test_not_a_capture(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(bytes(64))
+    with pytest.raises(ValueError):
+        TelemetryReader(str(path))
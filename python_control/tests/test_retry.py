@@ -0,0 +1,53 @@
+import time
+
+import pytest
+
+from xvf_host import COMMANDS, ReSpeaker, RetryPolicy, FixedRetryPolicy
+from simulator import SimulatedDevice
+
+
+@pytest.mark.parametrize("policy", [RetryPolicy(), FixedRetryPolicy(delay=0.001)])
+def test_read_after_retries(policy):
+    sim = SimulatedDevice(retries=2)
+    dev = ReSpeaker(sim, retry_policy=policy)
+    assert dev.read("VERSION") == (2, 1, 0)
+    assert sim.transfers == 3 and policy.retries == 2
+
+
+def test_read_many_after_retries():
+    sim = SimulatedDevice(retries=1)
+    policy = RetryPolicy()
+    dev = ReSpeaker(sim, retry_policy=policy)
+    assert dev.read_many(["DOA_VALUE", "VERSION"]) == {"DOA_VALUE": (0, 0), "VERSION": (2, 1, 0)}
+    # one wait for both reads
+    assert sim.transfers == 4 and policy.retries == 1
+
+
+def test_learns_latency():
+    policy = RetryPolicy()
+    dev = ReSpeaker(SimulatedDevice(ready_after=0.003), retry_policy=policy)
+    for _ in range(5):
+        dev.read("DOA_VALUE")
+    resid = COMMANDS["DOA_VALUE"].windex
+    assert 0.002 < policy.latency[resid] < 0.02
+    assert policy.delay(resid, 1) == pytest.approx(min(policy.latency[resid] * policy.undershoot, policy.maximum))
+
+
+def test_backoff():
+    policy = RetryPolicy(initial=0.001, maximum=0.004)
+    assert [policy.delay(1, attempt) for attempt in range(1, 6)] == [0.001, 0.002, 0.004, 0.004, 0.004]
+
+
+def test_deadline():
+    policy = RetryPolicy(deadline=0.02)
+    dev = ReSpeaker(SimulatedDevice(ready_after=5.0), retry_policy=policy)
+    start = time.monotonic()
+    with pytest.raises(ValueError):
+        dev.read("VERSION")
+    assert time.monotonic() - start < 0.1
+
+
+def test_fixed_attempts():
+    dev = ReSpeaker(SimulatedDevice(retries=10), retry_policy=FixedRetryPolicy(delay=0.0, attempts=3))
+    with pytest.raises(ValueError):
+        dev.read("VERSION")
@@ -0,0 +1,50 @@
+import pytest
+
+from stats import TransferStats, BUCKETS
+from xvf_host import ReSpeaker
+from simulator import SimulatedDevice
+from telemetry import TELEMETRY_PARAMETERS
+
+
+def test_counts_every_transfer():
+    stats = TransferStats()
+    sim = SimulatedDevice(retries=2)
+    dev = ReSpeaker(sim, stats=stats)
+    dev.read_many(TELEMETRY_PARAMETERS)
+    dev.write("LED_BRIGHTNESS", [10])
+    assert sum(row.count for row in stats.commands.values()) == sim.transfers
+    assert stats.commands[("DOA_VALUE", "in")].retries == 2
+    assert stats.commands[("LED_BRIGHTNESS", "out")].bytes == 1
+    assert sum(row.count for row in stats.by_resid().values()) == sim.transfers
+
+
+def test_errors_counted():
+    class Failing(SimulatedDevice):
+        def ctrl_transfer(self, *args, **kwargs):
+            raise OSError('timeout')
+
+    stats = TransferStats()
+    with pytest.raises(OSError):
+        ReSpeaker(Failing(), stats=stats).read("VERSION")
+    assert stats.commands[("VERSION", "in")].errors == 1
+
+
+def test_prometheus():
+    stats = TransferStats()
+    dev = ReSpeaker(SimulatedDevice(retries=2), stats=stats)
+    dev.read_many(TELEMETRY_PARAMETERS)
+    text = stats.prometheus()
+    assert text.count('le="+Inf"} 3') == len(TELEMETRY_PARAMETERS) and 'status="retry"} 2' in text
+    assert len(text.splitlines()) == 6 + len(stats.commands) * (len(BUCKETS) + 3) + \
+        sum(len(row.statuses) for row in stats.commands.values())
+
+
+def test_percentile():
+    stats = TransferStats()
+    dev = ReSpeaker(SimulatedDevice(), stats=stats)
+    for _ in range(10):
+        dev.read("VERSION")
+    row = stats.commands[("VERSION", "in")]
+    assert 0 < row.percentile(50) <= row.percentile(99) <= row.max_time
+    stats.reset()
+    assert not stats.commands
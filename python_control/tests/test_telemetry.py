@@ -0,0 +1,56 @@
+import time
+import asyncio
+
+import pytest
+
+from telemetry import Ticker, stream, astream, TELEMETRY_PARAMETERS
+from xvf_host import ReSpeaker
+from simulator import SimulatedDevice
+
+
+def test_stream():
+    samples = list(stream(ReSpeaker(SimulatedDevice()), rate_hz=200, count=10))
+    assert [sample.seq for sample in samples] == list(range(10))
+    assert set(samples[0].values) == set(TELEMETRY_PARAMETERS)
+    elapsed = samples[-1].timestamp - samples[0].timestamp
+    assert 9 / 200 * 0.8 < elapsed < 9 / 200 * 2
+
+
+def test_slow_consumer_skips():
+    dropped = 0
+    for sample in stream(ReSpeaker(SimulatedDevice()), ["DOA_VALUE"], rate_hz=200, count=5):
+        dropped += sample.dropped
+        time.sleep(0.02)
+    assert dropped >= 8
+
+
+@pytest.mark.parametrize("params", [["NOT_A_PARAMETER"], ["SAVE_CONFIGURATION"]])
+def test_invalid_parameters(params):
+    with pytest.raises(ValueError):
+        next(stream(ReSpeaker(SimulatedDevice()), params))
+
+
+def test_ticker_policy():
+    with pytest.raises(ValueError):
+        Ticker(50, 'drop')
+
+
+def test_astream():
+    async def collect():
+        return [sample async for sample in astream(ReSpeaker(SimulatedDevice()), ["DOA_VALUE"], rate_hz=200, count=5)]
+
+    samples = asyncio.run(collect())
+    assert [sample.seq for sample in samples] == list(range(5))
+    assert samples[0].values == {"DOA_VALUE": (0, 0)}
+
+
+def test_astream_slow_consumer():
+    async def collect():
+        samples = []
+        async for sample in astream(ReSpeaker(SimulatedDevice()), ["DOA_VALUE"], rate_hz=200, count=20):
+            samples.append(sample)
+            await asyncio.sleep(0.02)
+        return samples
+
+    samples = asyncio.run(collect())
+    assert len(samples) < 20 and sum(sample.dropped for sample in samples) + len(samples) >= 20
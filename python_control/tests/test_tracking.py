@@ -0,0 +1,75 @@
+import math
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import tracking
+from recorder import RECORD_DTYPE
+
+RATE, SECONDS = 100, 80
+
+
+def talkers():
+    """
+    Two talkers taking turns in 3 s bursts, with 1 s pauses: one turning
+    30 -> 120 degrees, the other 340 -> 20 degrees through 0
+    """
+    rng = np.random.default_rng(1)
+    records = np.zeros(SECONDS * RATE, RECORD_DTYPE)
+    t = np.arange(len(records)) / RATE
+    records['timestamp'] = t
+    phase = t % 8
+    truths = (
+        (np.radians(30 + 90 * (t % 40) / 40), phase < 3),
+        (np.radians(340 + 40 * (t % 40) / 40), (phase >= 4) & (phase < 7)),
+    )
+    for beam, (truth, speaking) in enumerate(truths):
+        records['azimuth'][:, beam] = np.where(speaking, truth + np.radians(5) * rng.standard_normal(len(t)),
+                                               rng.uniform(-np.pi, np.pi, len(t)))
+        records['energy'][:, beam] = np.where(speaking, rng.uniform(0.05, 0.2, len(t)), 0)
+    # the free-running beam scans
+    records['azimuth'][:, 2] = rng.uniform(-np.pi, np.pi, len(t))
+    return records, truths
+
+
+def test_one_track_per_burst():
+    records, truths = talkers()
+    events = tracking.SpeakerTracker().process(records)
+    starts = [event for event in events if event.kind == 'start']
+    ends = [event for event in events if event.kind == 'end']
+    assert len(starts) == len(ends) == 2 * (SECONDS // 8)
+    errors = []
+    for event in events:
+        if event.kind != 'end':
+            index = int(round(event.timestamp * RATE))
+            # the window still holds up to 200 ms of a talker that just stopped
+            truth = [truth[index] for truth, speaking in truths if speaking[max(0, index - 20):index + 1].any()]
+            assert len(truth) == 1, event
+            errors.append(abs(math.degrees(tracking.wrap(event.azimuth - truth[0]))))
+    assert np.median(errors) < 5 and max(errors) < 15
+
+
+def test_online_matches_batch():
+    records, _ = talkers()
+    records = records[:2000]
+    tracker = tracking.SpeakerTracker()
+    online = []
+    for record in records.tolist():
+        online += tracker.update(record[0], record[1], record[2])
+    batch = []
+    tracker = tracking.SpeakerTracker()
+    for start in range(0, len(records), 700):
+        batch += tracker.process(records[start:start + 700])
+    assert online and [(e.timestamp, e.kind, e.track) for e in online] == [(e.timestamp, e.kind, e.track) for e in batch]
+    assert all(abs(a.azimuth - b.azimuth) < 1e-9 for a, b in zip(online, batch))
+
+
+def test_wrap():
+    assert tracking.wrap(math.pi) == -math.pi
+    assert tracking.wrap(3 * math.pi / 2) == pytest.approx(-math.pi / 2)
+
+
+def test_invalid_thresholds():
+    with pytest.raises(ValueError):
+        tracking.SpeakerTracker(energy_on=0.001, energy_off=0.01)
@@ -0,0 +1,79 @@
+import threading
+
+import pytest
+
+from transport import RecordingTransport, ReplayTransport, SharedTransport, read_log
+from xvf_host import COMMANDS, PARAMETERS, ReSpeaker
+from simulator import SimulatedDevice
+
+
+def record(path):
+    sim = SimulatedDevice(retries=1)
+    sim.set("DOA_VALUE", [90, 1])
+    recorder = RecordingTransport(sim, path)
+    dev = ReSpeaker(recorder)
+    readable = [name for name, info in PARAMETERS.items() if info[3] != "wo"]
+    values = dev.read_many(readable)
+    dev.write("LED_BRIGHTNESS", [42])
+    dev.close()
+    return recorder, readable, values
+
+
+def test_record_and_replay(tmp_path):
+    path = str(tmp_path / "session.xvflog")
+    recorder, readable, values = record(path)
+    assert recorder.count == 2 * len(readable) + 1
+    replay = ReplayTransport(path, timing=False)
+    assert ReSpeaker(replay).read_many(readable) == values
+    # the responses start over once they run out
+    assert ReSpeaker(replay).read("DOA_VALUE") == (90, 1)
+
+
+def test_log_holds_payload_as_sent(tmp_path):
+    path = str(tmp_path / "session.xvflog")
+    payload = bytearray(COMMANDS["LED_BRIGHTNESS"].encode([42]))
+
+    class Reusing(SimulatedDevice):
+        # the caller's buffer is reused while the transfer is in progress
+        def ctrl_transfer(self, bmRequestType, bRequest, wValue, wIndex, data_or_wLength, timeout=None):
+            result = super().ctrl_transfer(bmRequestType, bRequest, wValue, wIndex, data_or_wLength, timeout)
+            payload[0] = 0
+            return result
+
+    recorder = RecordingTransport(Reusing(), path)
+    command = COMMANDS["LED_BRIGHTNESS"]
+    recorder.ctrl_transfer(0x40, 0, command.write_wvalue, command.windex, payload)
+    recorder.close()
+    assert [record[5] for record in read_log(path)] == [bytes([42])]
+
+
+def test_replay_unknown_read(tmp_path):
+    path = str(tmp_path / "session.xvflog")
+    RecordingTransport(SimulatedDevice(), path).close()
+    with pytest.raises(ValueError):
+        ReSpeaker(ReplayTransport(path, timing=False)).read("VERSION")
+
+
+def test_not_a_log(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(bytes(64))
+    with pytest.raises(ValueError):
+        ReplayTransport(str(path))
+
+
+def test_shared_transport():
+    shared = SharedTransport(SimulatedDevice())
+    errors = []
+
+    def reads():
+        dev = ReSpeaker(shared)
+        for _ in range(100):
+            if dev.read("VERSION") != (2, 1, 0):
+                errors.append(1)
+
+    threads = [threading.Thread(target=reads) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors and shared.transfers == 400
@@ -0,0 +1,49 @@
+import time
+import collections
+
+import pytest
+
+import watch
+from xvf_host import ReSpeaker
+from simulator import SimulatedDevice
+
+
+def test_changes_only():
+    sim = SimulatedDevice()
+    origin = time.monotonic()
+    elapsed = lambda: time.monotonic() - origin
+    sim.set_source("DOA_VALUE", lambda: [int(elapsed() / 0.1) * 10 % 360, 1])
+    sim.set_source("PP_AGCGAIN", lambda: [(20.0 if elapsed() > 0.25 else 10.0) + 0.01 * (time.perf_counter_ns() % 7)])
+    watcher = watch.Watcher(ReSpeaker(sim))
+    watcher.add("DOA_VALUE", 50)
+    watcher.add("PP_AGCGAIN", 20, deadband=0.5)
+    watcher.add("VERSION", 5)
+    changes = list(watcher.run(0.5))
+    by_name = collections.Counter(change.name for change in changes)
+    assert 4 <= by_name["DOA_VALUE"] <= 7 and by_name["PP_AGCGAIN"] == 2 and by_name["VERSION"] == 1, by_name
+    assert all(change.previous is None or change.values != change.previous for change in changes)
+    # reads at their own rates, not all at the fastest
+    assert watcher.watches["VERSION"].reads <= 4 and watcher.watches["DOA_VALUE"].reads >= 20
+    assert sim.transfers == sum(w.reads for w in watcher.watches.values())
+
+
+def test_slow_callback_misses():
+    sim = SimulatedDevice()
+    sim.set_source("DOA_VALUE", lambda: [time.perf_counter_ns() % 360, 1])
+    watcher = watch.Watcher(ReSpeaker(sim))
+    seen = []
+    watcher.add("DOA_VALUE", 100, callback=lambda change: (seen.append(change), time.sleep(0.03)))
+    changes = list(watcher.run(0.2))
+    assert watcher.watches["DOA_VALUE"].missed > 0 and seen == changes
+
+
+@pytest.mark.parametrize("name, rate, deadband", [("NOT_A_PARAMETER", 1, 0), ("SAVE_CONFIGURATION", 1, 0),
+                                                  ("DOA_VALUE", 0, 0), ("DOA_VALUE", 1, 0.5)])
+def test_invalid(name, rate, deadband):
+    with pytest.raises(ValueError):
+        watch.Watcher(ReSpeaker(SimulatedDevice())).add(name, rate, deadband)
+
+
+def test_parse_watch():
+    assert watch.parse_watch("DOA_VALUE:50") == ("DOA_VALUE", 50.0)
+    assert watch.parse_watch("VERSION") == ("VERSION", 1.0)
@@ -0,0 +1,275 @@
+
+import sys
+import math
+import argparse
+import collections
+
+import numpy as np
+
+from xvf_host import find
+from telemetry import stream, TELEMETRY_PARAMETERS
+from recorder import TelemetryReader
+
+# timestamp: time of the sample that raised the event
+# kind: 'start', 'move' or 'end'
+# track: id of the track, unique for the tracker
+# azimuth: filtered direction of the track in radians, in [-pi, pi)
+# energy: filtered speech energy of the track
+Event = collections.namedtuple('Event', ['timestamp', 'kind', 'track', 'azimuth', 'energy'])
+
+# beams 1 and 2 follow the talkers, the free-running beam scans for new ones;
+# the auto-select beam is one of the others and is left out
+BEAMS = (0, 1, 2)
+
+TWO_PI = 2 * math.pi
+
+
+def wrap(angle):
+    """`angle` in radians wrapped to [-pi, pi)"""
+    return (angle + math.pi) % TWO_PI - math.pi
+
+
+class Track:
+    """One talker, followed by an alpha-beta filter on its azimuth"""
+    __slots__ = ('id', 'azimuth', 'rate', 'energy', 'timestamp', 'hits', 'confirmed', 'reported')
+
+    def __init__(self, track_id, timestamp, azimuth, energy):
+        self.id = track_id
+        self.azimuth = azimuth
+        self.rate = 0.0 # radians per second
+        self.energy = energy
+        self.timestamp = timestamp # last observation
+        self.hits = 1
+        self.confirmed = False
+        self.reported = azimuth # azimuth of the last start or move event
+
+    def update(self, timestamp, azimuth, energy, alpha, beta):
+        dt = timestamp - self.timestamp
+        predicted = self.azimuth + self.rate * dt
+        residual = wrap(azimuth - predicted)
+        self.azimuth = wrap(predicted + alpha * residual)
+        if dt > 0:
+            self.rate += beta * residual / dt
+        self.energy += alpha * (energy - self.energy)
+        self.timestamp = timestamp
+        self.hits += 1
+
+
+class SpeakerTracker:
+    """
+    Talker tracks from the beam azimuths (AEC_AZIMUTH_VALUES) and speech
+    energies (AEC_SPENERGY_VALUES).
+
+    The last `window` samples of every beam in `beams` are kept in a NumPy
+    ring as energy-weighted unit vectors, with running sums, so the circular
+    mean, the concentration (mean resultant length, 1 when all samples point
+    the same way) and the mean energy of every beam cost the same whatever
+    the window. A beam turns active when its mean energy rises above
+    `energy_on` with a concentration of at least `min_concentration`, and
+    inactive when it falls to `energy_off`.
+
+    Active beams within `gate` radians of each other are one observation.
+    An observation updates the nearest track within `gate`, or starts a
+    tentative track. A track is confirmed, with a 'start' event, after
+    `confirm` observations, reports a 'move' whenever it has turned more
+    than `move_threshold` radians since its last event, and ends after `hold`
+    seconds without observations, with an 'end' event if it was confirmed.
+    """
+
+    def __init__(self, window=20, beams=BEAMS, energy_on=0.01, energy_off=0.001, min_concentration=0.5,
+                 gate=math.radians(20), confirm=5, hold=0.5, move_threshold=math.radians(5),
+                 alpha=0.3, beta=0.05):
+        if energy_off > energy_on:
+            raise ValueError('energy_off must not be above energy_on')
+        self.window = window
+        self.beams = np.array(beams)
+        self.energy_on = energy_on
+        self.energy_off = energy_off
+        self.min_concentration = min_concentration
+        self.gate = gate
+        self.confirm = confirm
+        self.hold = hold
+        self.move_threshold = move_threshold
+        self.alpha = alpha
+        self.beta = beta
+        # window x (e cos, e sin, e) x beam, and the sums over the window
+        self.ring = np.zeros((window, 3, len(beams)))
+        self.sums = np.zeros((3, len(beams)))
+        self.index = 0 # next slot of the ring
+        self.count = 0 # samples seen in total
+        self.active = [False] * len(beams)
+        self.tracks = []
+        self.next_id = 0
+
+    def update(self, timestamp, azimuth, energy):
+        """Add one sample of the 4 beam azimuths and energies and return the events it raised"""
+        azimuth = np.asarray(azimuth, np.float64)[self.beams]
+        energy = np.asarray(energy, np.float64)[self.beams]
+        sample = np.array((energy * np.cos(azimuth), energy * np.sin(azimuth), energy))
+        self.sums += sample - self.ring[self.index]
+        self.ring[self.index] = sample
+        self.index = (self.index + 1) % self.window
+        if self.index == 0:
+            # drop the rounding errors accumulated over the last window
+            self.sums = self.ring.sum(axis=0)
+        self.count += 1
+        sums = self.sums
+        length = np.hypot(sums[0], sums[1])
+        concentration = np.divide(length, sums[2], out=np.zeros_like(length), where=sums[2] > 0)
+        return self._step(timestamp, (sums[2] / min(self.count, self.window)).tolist(),
+                          np.arctan2(sums[1], sums[0]).tolist(), concentration.tolist())
+
+    def update_sample(self, sample):
+        """Add a telemetry.Sample holding AEC_AZIMUTH_VALUES and AEC_SPENERGY_VALUES"""
+        return self.update(sample.timestamp, sample.values["AEC_AZIMUTH_VALUES"], sample.values["AEC_SPENERGY_VALUES"])
+
+    def process(self, records):
+        """
+        Batch counterpart of update() over an array of recorder.RECORD_DTYPE
+        records: the window statistics of all of them are computed at once
+        from cumulative sums, then the tracks are updated record by record.
+        Consecutive calls continue from each other, and from update(), so a
+        capture can be processed chunk by chunk.
+        """
+        count = len(records)
+        if not count:
+            return []
+        azimuth = records['azimuth'][:, self.beams].astype(np.float64)
+        energy = records['energy'][:, self.beams].astype(np.float64)
+        samples = np.stack((energy * np.cos(azimuth), energy * np.sin(azimuth), energy), axis=1)
+        # the ring, oldest first, ahead of the new samples
+        history = np.concatenate((self.ring[self.index:], self.ring[:self.index], samples))
+        cumulative = np.cumsum(history, axis=0)
+        sums = cumulative[self.window:] - cumulative[:count]
+        self.ring = history[-self.window:].copy()
+        self.index = 0
+        self.sums = self.ring.sum(axis=0)
+        seen = np.minimum(self.count + np.arange(1, count + 1), self.window)
+        self.count += count
+
+        length = np.hypot(sums[:, 0], sums[:, 1])
+        concentrations = np.divide(length, sums[:, 2], out=np.zeros_like(length), where=sums[:, 2] > 0).tolist()
+        energies = (sums[:, 2] / seen[:, None]).tolist()
+        directions = np.arctan2(sums[:, 1], sums[:, 0]).tolist()
+        events = []
+        step = self._step
+        for timestamp, energy, direction, concentration in zip(records['timestamp'].tolist(), energies, directions, concentrations):
+            events += step(timestamp, energy, direction, concentration)
+        return events
+
+    def _step(self, timestamp, energies, directions, concentrations):
+        """Update the beam activity and the tracks with the window statistics of one sample"""
+        observations = []
+        for beam, energy in enumerate(energies):
+            if self.active[beam]:
+                active = energy > self.energy_off
+            else:
+                active = energy > self.energy_on and concentrations[beam] >= self.min_concentration
+            self.active[beam] = active
+            if not active:
+                continue
+            direction = directions[beam]
+            # merge with an observation of the same talker by another beam
+            for observation in observations:
+                if abs(wrap(direction - observation[0])) <= self.gate:
+                    x = observation[1] * math.cos(observation[0]) + energy * math.cos(direction)
+                    y = observation[1] * math.sin(observation[0]) + energy * math.sin(direction)
+                    observation[0] = math.atan2(y, x)
+                    observation[1] += energy
+                    break
+            else:
+                observations.append([direction, energy])
+        if not observations and not self.tracks:
+            return []
+
+        events = []
+        updated = set()
+        for direction, energy in sorted(observations, key=lambda observation: -observation[1]):
+            nearest = None
+            distance = self.gate
+            for track in self.tracks:
+                if track.id not in updated and abs(wrap(direction - track.azimuth)) <= distance:
+                    nearest = track
+                    distance = abs(wrap(direction - track.azimuth))
+            if nearest is None:
+                self.tracks.append(Track(self.next_id, timestamp, direction, energy))
+                self.next_id += 1
+                continue
+            nearest.update(timestamp, direction, energy, self.alpha, self.beta)
+            updated.add(nearest.id)
+            if not nearest.confirmed:
+                if nearest.hits >= self.confirm:
+                    nearest.confirmed = True
+                    nearest.reported = nearest.azimuth
+                    events.append(Event(timestamp, 'start', nearest.id, nearest.azimuth, nearest.energy))
+            elif abs(wrap(nearest.azimuth - nearest.reported)) > self.move_threshold:
+                nearest.reported = nearest.azimuth
+                events.append(Event(timestamp, 'move', nearest.id, nearest.azimuth, nearest.energy))
+
+        for track in [track for track in self.tracks if timestamp - track.timestamp > self.hold]:
+            self.tracks.remove(track)
+            if track.confirmed:
+                events.append(Event(timestamp, 'end', track.id, track.azimuth, track.energy))
+        return events
+
+    def reset(self):
+        """Forget the window and the tracks, without raising 'end' events"""
+        self.ring[:] = 0
+        self.sums[:] = 0
+        self.index = 0
+        self.count = 0
+        self.active = [False] * len(self.beams)
+        self.tracks = []
+
+
+def print_event(event):
+    print(f"{event.timestamp:10.2f}  track {event.track:<4} {event.kind:<6} {math.degrees(event.azimuth) % 360:6.1f} deg  energy {event.energy:.3g}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Track talkers from the ReSpeaker beam azimuths and energies')
+    parser.add_argument('--file', help='process a telemetry capture (recorder.py) instead of the device')
+    parser.add_argument('--rate', type=float, default=100,
+                       help='samples per second from the device (default: 100)')
+    parser.add_argument('--duration', type=float,
+                       help='seconds to track (default: until interrupted)')
+    parser.add_argument('--window', type=int, default=20,
+                       help='samples in the sliding window (default: 20)')
+    parser.add_argument('--energy-on', type=float, default=0.01,
+                       help='mean speech energy turning a beam active (default: 0.01)')
+    parser.add_argument('--energy-off', type=float, default=0.001,
+                       help='mean speech energy turning a beam inactive (default: 0.001)')
+    parser.add_argument('--hold', type=float, default=0.5,
+                       help='seconds without speech before a track ends (default: 0.5)')
+    args = parser.parse_args()
+
+    try:
+        tracker = SpeakerTracker(args.window, energy_on=args.energy_on, energy_off=args.energy_off, hold=args.hold)
+        if args.file:
+            capture = TelemetryReader(args.file)
+            tracks = 0
+            for chunk in capture.chunks():
+                for event in tracker.process(chunk):
+                    tracks += event.kind == 'start'
+                    print_event(event)
+            print(f"{len(capture)} samples, {tracks} tracks")
+            return
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    dev = find()
+    if not dev:
+        print('No device found')
+        sys.exit(1)
+    count = int(args.duration * args.rate) if args.duration else None
+    try:
+        for sample in stream(dev, TELEMETRY_PARAMETERS, args.rate, count=count):
+            for event in tracker.update_sample(sample):
+                print_event(event)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        dev.close()
+
+if __name__ == '__main__':
+    main()
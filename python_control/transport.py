@@ -0,0 +1,182 @@
+
+import time
+import array
+import struct
+
+# A transport is what ReSpeaker sends its control transfers through: any object
+# with pyusb's ctrl_transfer(bmRequestType, bRequest, wValue, wIndex,
+# data_or_wLength, timeout) and a close(). UsbTransport is the real device,
+# RecordingTransport and ReplayTransport capture and serve sessions,
+# SharedTransport serializes the transfers of several threads, and
+# i2c_transport.I2cTransport, simulator.SimulatedDevice and
+# xvf_daemon.DaemonDevice are transports too.
+
+# magic, version, reserved
+LOG_HEADER = struct.Struct('<8sHH')
+LOG_MAGIC = b'XVFCTRL\0'
+LOG_VERSION = 1
+# start of the transfer in seconds since the recording started, duration in
+# seconds, bmRequestType, wValue, wIndex, length of the data that follows:
+# the payload of an OUT transfer or the response of an IN transfer
+LOG_RECORD = struct.Struct('<dfBHHH')
+
+
+class UsbTransport:
+    """A pyusb device. Its other attributes (bus, port_numbers...) are passed through."""
+
+    def __init__(self, device):
+        self.device = device
+
+    def ctrl_transfer(self, bmRequestType, bRequest, wValue, wIndex, data_or_wLength, timeout=None):
+        return self.device.ctrl_transfer(bmRequestType, bRequest, wValue, wIndex, data_or_wLength, timeout)
+
+    def close(self):
+        import usb.util
+        usb.util.dispose_resources(self.device)
+
+    def __getattr__(self, name):
+        return getattr(self.device, name)
+
+
+class RecordingTransport:
+    """
+    Passes transfers through to `transport` and logs every completed one,
+    with its timing, to a compact binary file at `path`. Transfers that raise
+    are not logged.
+    """
+
+    def __init__(self, transport, path):
+        self.transport = transport
+        self.file = open(path, 'wb')
+        self.file.write(LOG_HEADER.pack(LOG_MAGIC, LOG_VERSION, 0))
+        self.start = time.perf_counter()
+        self.count = 0
+
+    def ctrl_transfer(self, bmRequestType, bRequest, wValue, wIndex, data_or_wLength, timeout=None):
+        # the payload as sent, before the caller can reuse its buffer
+        payload = None if bmRequestType & 0x80 else bytes(data_or_wLength)
+        start = time.perf_counter()
+        result = self.transport.ctrl_transfer(bmRequestType, bRequest, wValue, wIndex, data_or_wLength, timeout)
+        elapsed = time.perf_counter() - start
+        data = bytes(result) if payload is None else payload
+        self.file.write(LOG_RECORD.pack(start - self.start, elapsed, bmRequestType, wValue, wIndex, len(data)))
+        self.file.write(data)
+        self.count += 1
+        return result
+
+    def close(self):
+        self.file.close()
+        self.transport.close()
+
+    def __getattr__(self, name):
+        return getattr(self.transport, name)
+
+
+class SharedTransport:
+    """
+    Serializes the transfers of several threads sharing `transport`, one
+    transfer at a time. A thread whose transfers can wait, e.g. an LED
+    animation, takes `lock` without blocking first and gives way when another
+    thread holds it. The lock is re-entrant, so it can transfer while holding
+    it.
+    """
+
+    def __init__(self, transport):
+        import threading
+
+        self.transport = transport
+        self.lock = threading.RLock()
+
+    def ctrl_transfer(self, bmRequestType, bRequest, wValue, wIndex, data_or_wLength, timeout=None):
+        with self.lock:
+            return self.transport.ctrl_transfer(bmRequestType, bRequest, wValue, wIndex, data_or_wLength, timeout)
+
+    def close(self):
+        self.transport.close()
+
+    def __getattr__(self, name):
+        return getattr(self.transport, name)
+
+
+def read_log(path):
+    """Yield (start, elapsed, bmRequestType, wValue, wIndex, data) of every transfer in a log"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, _ = LOG_HEADER.unpack_from(data)
+    if magic != LOG_MAGIC:
+        raise ValueError('{} is not a control transfer log'.format(path))
+    if version != LOG_VERSION:
+        raise ValueError('Unsupported control transfer log version {}'.format(version))
+    offset = LOG_HEADER.size
+    while offset + LOG_RECORD.size <= len(data):
+        start, elapsed, request_type, wvalue, windex, length = LOG_RECORD.unpack_from(data, offset)
+        offset += LOG_RECORD.size
+        yield start, elapsed, request_type, wvalue, windex, data[offset:offset + length]
+        offset += length
+
+
+def wait(duration):
+    """
+    Wait `duration` seconds. time.sleep() overshoots by tens of microseconds,
+    as much as a whole transfer, so the end of the wait is spun.
+    """
+    deadline = time.perf_counter() + duration
+    if duration > 0.001:
+        time.sleep(duration - 0.0005)
+    while time.perf_counter() < deadline:
+        pass
+
+
+class ReplayTransport:
+    """
+    Serves the transfers of a RecordingTransport log. The responses to
+    each (wIndex, wValue) read are indexed at load time and served in their
+    recorded order, SERVICER_COMMAND_RETRY responses included, starting over
+    once they run out. Writes are accepted without being checked.
+
+    With `timing`, every transfer takes its recorded duration divided by
+    `speed`, and writes never recorded take the median recorded write time.
+    Without it, transfers return at once.
+    """
+
+    def __init__(self, path, timing=True, speed=1.0):
+        import statistics
+
+        self.timing = timing
+        self.speed = speed
+        self.reads = {}
+        self.writes = {}
+        for start, elapsed, request_type, wvalue, windex, data in read_log(path):
+            if request_type & 0x80:
+                self.reads.setdefault((windex, wvalue), []).append((elapsed, array.array('B', data)))
+            else:
+                self.writes.setdefault((windex, wvalue), []).append(elapsed)
+        write_times = [elapsed for times in self.writes.values() for elapsed in times]
+        self.write_time = statistics.median(write_times) if write_times else 0.0
+        self.positions = dict.fromkeys(self.reads, 0)
+        self.transfers = 0
+
+    def ctrl_transfer(self, bmRequestType, bRequest, wValue, wIndex, data_or_wLength, timeout=None):
+        self.transfers += 1
+        if bmRequestType & 0x80:
+            key = (wIndex, wValue)
+            responses = self.reads.get(key)
+            if responses is None:
+                raise ValueError('No recorded response for wIndex {}, wValue {}'.format(wIndex, wValue))
+            position = self.positions[key]
+            elapsed, response = responses[position]
+            self.positions[key] = (position + 1) % len(responses)
+            if self.timing:
+                wait(elapsed / self.speed)
+            return array.array('B', response)
+        if self.timing:
+            times = self.writes.get((wIndex, wValue))
+            wait((times[0] if times else self.write_time) / self.speed)
+        return len(data_or_wLength)
+
+    def rewind(self):
+        """Serve every read from its first recorded response again"""
+        self.positions = dict.fromkeys(self.reads, 0)
+
+    def close(self):
+        pass
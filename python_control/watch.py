@@ -0,0 +1,163 @@
+
+import time
+import heapq
+import collections
+
+from xvf_host import COMMANDS, format_result
+
+# timestamp: time.monotonic() of the read pass
+# name: parameter that changed
+# values: decoded values
+# previous: values of the last change delivered, None on the first read
+Change = collections.namedtuple('Change', ['timestamp', 'name', 'values', 'previous'])
+
+
+class Watch:
+    """One watched parameter and its counters"""
+    __slots__ = ('command', 'period', 'deadband', 'callback', 'deadline', 'raw', 'values',
+                 'reads', 'changes', 'missed', 'max_late')
+
+    def __init__(self, command, period, deadband, callback):
+        self.command = command
+        self.period = period
+        self.deadband = deadband
+        self.callback = callback
+        self.deadline = None
+        self.raw = None # response of the last read
+        self.values = None # values of the last change delivered
+        self.reads = 0
+        self.changes = 0
+        self.missed = 0 # reads skipped because the previous one was more than a period late
+        self.max_late = 0.0 # seconds
+
+    def changed(self, response):
+        """Whether `response` differs from the last read by more than the deadband"""
+        if response == self.raw:
+            return False
+        self.raw = response
+        if self.values is None or not self.deadband:
+            return True
+        values = self.command.decode(response)
+        return any(abs(a - b) > self.deadband for a, b in zip(values, self.values))
+
+
+class Watcher:
+    """
+    Polls parameters at their own period and reports them only when they
+    change. Reads are scheduled on a heap of deadlines, each parameter on
+    its own fixed grid, and every read due within `slack` seconds of the
+    earliest one is issued in the same read_many() pass, ordered by RESID.
+
+    A response is compared with the previous one as bytes, and only decoded
+    when it differs. With a `deadband`, float parameters must move by more
+    than that from the last change delivered. A read starting more than a
+    period after its deadline skips the deadlines it missed, which are
+    counted per parameter.
+    """
+
+    def __init__(self, respeaker, slack=0.002):
+        self.respeaker = respeaker
+        self.slack = slack
+        self.watches = {}
+        self.heap = [] # (deadline, name)
+        self.passes = 0
+
+    def add(self, name, rate_hz=1.0, deadband=0.0, callback=None):
+        """
+        Watch `name` at `rate_hz`. `callback(change)` is called on every
+        change, in addition to it being returned by poll().
+        """
+        command = COMMANDS.get(name)
+        if command is None:
+            raise ValueError('Unknown parameter: {}'.format(name))
+        if command.access == "wo":
+            raise ValueError('{} is write-only and cannot be watched'.format(name))
+        if rate_hz <= 0:
+            raise ValueError('Watch rate of {} must be positive'.format(name))
+        if deadband and command.type not in ('float', 'radians'):
+            raise ValueError('A deadband only applies to float parameters, {} is {}'.format(name, command.type))
+        if name in self.watches:
+            self.remove(name)
+        watch = self.watches[name] = Watch(command, 1.0 / rate_hz, deadband, callback)
+        watch.deadline = time.monotonic()
+        heapq.heappush(self.heap, (watch.deadline, name))
+
+    def remove(self, name):
+        del self.watches[name]
+        self.heap = [(deadline, other) for deadline, other in self.heap if other != name]
+        heapq.heapify(self.heap)
+
+    def poll(self):
+        """Wait for the next reads to be due, read them and return their changes"""
+        if not self.heap:
+            return []
+        delay = self.heap[0][0] - self.slack - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        now = time.monotonic()
+        due = []
+        while self.heap and self.heap[0][0] <= now + self.slack:
+            due.append(self.watches[heapq.heappop(self.heap)[1]])
+        responses = self.respeaker._read_responses(sorted((watch.command for watch in due),
+                                                          key=lambda command: (command.windex, command.cmdid)))
+        timestamp = (now + time.monotonic()) / 2
+        self.passes += 1
+
+        changes = []
+        for watch in due:
+            watch.reads += 1
+            late = now - watch.deadline
+            if late > watch.max_late:
+                watch.max_late = late
+            watch.deadline += watch.period
+            if now - watch.deadline >= watch.period:
+                missed = int((now - watch.deadline) / watch.period) + 1
+                watch.missed += missed
+                watch.deadline += missed * watch.period
+            heapq.heappush(self.heap, (watch.deadline, watch.command.name))
+
+            response = responses[watch.command]
+            if not watch.changed(response):
+                continue
+            values = watch.command.decode(response)
+            change = Change(timestamp, watch.command.name, values, watch.values)
+            watch.values = values
+            watch.changes += 1
+            if watch.callback is not None:
+                watch.callback(change)
+            changes.append(change)
+        return changes
+
+    def run(self, duration=None):
+        """Yield every change until `duration` seconds have passed, forever if None"""
+        end = None if duration is None else time.monotonic() + duration
+        while self.heap and (end is None or self.heap[0][0] - self.slack < end):
+            yield from self.poll()
+
+
+def parse_watch(spec):
+    """'NAME' or 'NAME:HZ' as (NAME, HZ), 1 Hz by default"""
+    name, _, rate = spec.partition(':')
+    return name.upper(), float(rate) if rate else 1.0
+
+def print_summary(watcher, elapsed):
+    print(f"{'Parameter':<30} {'Rate':>8} {'Reads':>7} {'Changes':>8} {'Missed':>7} {'Max late':>10}")
+    print("-" * 75)
+    for name, watch in watcher.watches.items():
+        print(f"{name:<30} {1 / watch.period:>5.3g} Hz {watch.reads:>7} {watch.changes:>8} {watch.missed:>7} {watch.max_late * 1000:>7.1f} ms")
+    print(f"{watcher.passes} read passes in {elapsed:.1f} s")
+
+def watch(dev, specs, deadband=0.0, duration=None):
+    """Print every change of the parameters of `specs` ('NAME:HZ') until interrupted, then a summary"""
+    watcher = Watcher(dev)
+    for spec in specs:
+        name, rate = parse_watch(spec)
+        command = COMMANDS.get(name)
+        watcher.add(name, rate, deadband if command is not None and command.type in ('float', 'radians') else 0.0)
+    start = time.monotonic()
+    try:
+        for change in watcher.run(duration):
+            print(f"{change.timestamp - start:9.3f}  {format_result(change.name, change.values)}")
+    except KeyboardInterrupt:
+        pass
+    print_summary(watcher, time.monotonic() - start)
@@ -0,0 +1,228 @@
+
+import time
+import heapq
+import asyncio
+import threading
+import itertools
+import concurrent.futures
+
+from xvf_host import COMMANDS, ReSpeaker
+
+# request priorities, lower first
+PRIORITY_HIGH = 0 # latency critical reads, e.g. DOA_VALUE
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2 # long jobs, e.g. AEC filter dumps
+
+
+class Job:
+    """
+    A request queued on the transfer thread. `steps` is a generator doing
+    one transfer per step, as run by xvf_host.run_steps(), whose steps are
+    taken here one at a time between those of other requests.
+    """
+    __slots__ = ('priority', 'seq', 'steps', 'resolve', 'cancelled')
+
+    def __init__(self, priority, seq, steps, resolve, cancelled):
+        self.priority = priority
+        self.seq = seq
+        self.steps = steps
+        self.resolve = resolve # resolve(result, exception)
+        self.cancelled = cancelled # cancelled() -> bool
+
+
+class AsyncReSpeaker:
+    """
+    asyncio interface of a ReSpeaker. All the transfers of the device run
+    on one dedicated thread, one at a time, so the event loop never blocks
+    and the USB handle is never used by two threads.
+
+    Requests are served by priority, then in order, and every transfer is a
+    step of its request: a high priority read waits for at most the transfer
+    in progress, not for the request it belongs to. A read answered with
+    SERVICER_COMMAND_RETRY is set aside for the retry delay of the
+    ReSpeaker's retry policy while other requests go on.
+
+    Every request takes a `timeout` in seconds. A request that times out or
+    is cancelled is dropped before its next transfer.
+    """
+
+    def __init__(self, respeaker):
+        self.respeaker = respeaker
+        self.seq = itertools.count()
+        self.ready = [] # (priority, seq, job)
+        self.delayed = [] # (time.monotonic() due, seq, job)
+        self.condition = threading.Condition()
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name='xvf-transfers', daemon=True)
+        self.thread.start()
+        # runs call() functions, one at a time
+        self.calls = concurrent.futures.ThreadPoolExecutor(1, 'xvf-calls')
+
+    def _submit(self, steps, priority, resolve, cancelled):
+        job = Job(priority, next(self.seq), steps, resolve, cancelled)
+        with self.condition:
+            if self.closed:
+                raise ValueError('AsyncReSpeaker is closed')
+            heapq.heappush(self.ready, (job.priority, job.seq, job))
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while True:
+                    now = time.monotonic()
+                    while self.delayed and self.delayed[0][0] <= now:
+                        job = heapq.heappop(self.delayed)[2]
+                        heapq.heappush(self.ready, (job.priority, job.seq, job))
+                    if self.ready:
+                        break
+                    if self.closed and not self.delayed:
+                        return
+                    self.condition.wait(self.delayed[0][0] - now if self.delayed else None)
+                job = heapq.heappop(self.ready)[2]
+            self._step(job)
+
+    def _step(self, job):
+        if job.cancelled():
+            job.steps.close()
+            return
+        try:
+            delay = next(job.steps)
+        except StopIteration as e:
+            job.resolve(e.value, None)
+            return
+        except Exception as e:
+            job.resolve(None, e)
+            return
+        with self.condition:
+            if delay:
+                heapq.heappush(self.delayed, (time.monotonic() + delay, job.seq, job))
+            else:
+                heapq.heappush(self.ready, (job.priority, job.seq, job))
+
+    async def _request(self, steps, priority, timeout):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve(result, exception):
+            loop.call_soon_threadsafe(settle, result, exception)
+
+        def settle(result, exception):
+            if future.done():
+                return
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+
+        self._submit(steps, priority, resolve, future.done)
+        return await asyncio.wait_for(future, timeout)
+
+    def _read_steps(self, command):
+        respeaker = self.respeaker
+        if respeaker.cache is not None:
+            values = respeaker.cache.get(respeaker, command)
+            if values is not None:
+                return values
+        response = yield from respeaker._read_response_steps(command)
+        return respeaker._decode(command, response)
+
+    def _write_steps(self, name, data_list):
+        # one step, validated and encoded by ReSpeaker.write
+        self.respeaker.write(name, data_list)
+        return
+        yield
+
+    async def read(self, name, priority=PRIORITY_NORMAL, timeout=None):
+        """Read a parameter, None if it is unknown, as ReSpeaker.read()"""
+        command = COMMANDS.get(name)
+        if command is None:
+            return None
+        return await self._request(self._read_steps(command), priority, timeout)
+
+    async def read_many(self, names, priority=PRIORITY_NORMAL, timeout=None):
+        """Read several parameters in one pass and return them as a dict, as ReSpeaker.read_many()"""
+        return await self._request(self.respeaker._read_many_steps(names), priority, timeout)
+
+    async def write(self, name, data_list, priority=PRIORITY_NORMAL, timeout=None):
+        await self._request(self._write_steps(name, data_list), priority, timeout)
+
+    async def call(self, func, *args, priority=PRIORITY_BULK, timeout=None):
+        """
+        Run func(respeaker, *args) on a separate thread, one call at a time,
+        with a ReSpeaker whose every transfer is queued at `priority`, e.g.
+        call(ReSpeaker.dump_aec_filters). If the call is cancelled or times
+        out, its next transfer raises ValueError, so that its error handling
+        runs, e.g. the AEC_FILTER_CMD_ABORT of dump_aec_filters(), and the
+        transfers of that go through.
+        """
+        transport = QueuedTransport(self, priority)
+        respeaker = ReSpeaker(transport, self.respeaker.retry_policy, self.respeaker.stats, self.respeaker.cache)
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.calls, lambda: func(respeaker, *args))
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            transport.cancel()
+            # the call cannot be stopped from outside, wait for it to give up
+            try:
+                await future
+            except Exception:
+                pass
+            raise
+
+    def close(self):
+        """Finish the queued requests, then stop the transfer thread and close the device"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
+        self.calls.shutdown()
+        self.respeaker.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+
+class QueuedTransport:
+    """
+    Transport of the ReSpeaker of an AsyncReSpeaker.call(): each transfer is
+    queued on the transfer thread at `priority` and waited for.
+    """
+
+    def __init__(self, device, priority):
+        self.device = device
+        self.priority = priority
+        self.cancelled = False
+
+    def cancel(self):
+        """Fail the next transfer"""
+        self.cancelled = True
+
+    def ctrl_transfer(self, bmRequestType, bRequest, wValue, wIndex, data_or_wLength, timeout=None):
+        if self.cancelled:
+            self.cancelled = False
+            raise ValueError('Call cancelled')
+        if not bmRequestType & 0x80:
+            # the caller may reuse its payload before the transfer thread sends it
+            data_or_wLength = bytes(data_or_wLength)
+        future = concurrent.futures.Future()
+
+        def transfer():
+            return self.device.respeaker.dev.ctrl_transfer(bmRequestType, bRequest, wValue, wIndex, data_or_wLength, timeout)
+            yield
+
+        def resolve(result, exception):
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+
+        self.device._submit(transfer(), self.priority, resolve, lambda: False)
+        return future.result()
+
+    def close(self):
+        pass
@@ -0,0 +1,192 @@
+
+import os
+import stat
+import array
+import socket
+import struct
+import threading
+import socketserver
+
+from xvf_host import COMMANDS, CTRL_OUT_VENDOR_DEVICE, CTRL_IN_VENDOR_DEVICE, daemon_socket_path
+
+SOCKET_PATH = daemon_socket_path()
+
+# direction (0 = out, 1 = in, 2 = info), wValue, wIndex, length of the payload or response
+REQUEST = struct.Struct('<BHHH')
+# status (0 = ok, 1 = error), length of the response or error message
+REPLY = struct.Struct('<BH')
+REQUEST_OUT = 0
+REQUEST_IN = 1
+# the USB vendor and product ID of the device served, 0 if unknown
+REQUEST_INFO = 2
+INFO = struct.Struct('<HH')
+REPLY_OK = 0
+REPLY_ERROR = 1
+
+# reads are resolved to their command so the daemon handles the retries
+READ_COMMANDS = {(command.windex, command.read_wvalue): command for command in COMMANDS.values()}
+
+
+def owned_socket(path):
+    """Whether `path` is a unix socket owned by the current user"""
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(info.st_mode) and info.st_uid == os.getuid()
+
+def recv_exact(sock, size):
+    data = bytearray(size)
+    view = memoryview(data)
+    while size:
+        received = sock.recv_into(view, size)
+        if not received:
+            raise ConnectionError('Connection closed by peer')
+        view = view[received:]
+        size -= received
+    return data
+
+
+class SessionHandler(socketserver.BaseRequestHandler):
+    """Serves the transfers of one client connection until it disconnects."""
+
+    def handle(self):
+        server = self.server
+        sock = self.request
+        while True:
+            try:
+                direction, wvalue, windex, length = REQUEST.unpack(recv_exact(sock, REQUEST.size))
+                payload = recv_exact(sock, length) if direction == REQUEST_OUT else None
+            except ConnectionError:
+                return
+            try:
+                # one transfer (with all its retries) at a time on the USB handle
+                with server.lock:
+                    if direction == REQUEST_INFO:
+                        data = INFO.pack(*server.ids)
+                    elif direction == REQUEST_OUT:
+                        server.respeaker.dev.ctrl_transfer(CTRL_OUT_VENDOR_DEVICE, 0, wvalue, windex, payload, server.respeaker.TIMEOUT)
+                        data = b''
+                    elif (windex, wvalue) in READ_COMMANDS:
+                        data = server.respeaker._read_response(READ_COMMANDS[(windex, wvalue)]).tobytes()
+                    else:
+                        data = server.respeaker.dev.ctrl_transfer(CTRL_IN_VENDOR_DEVICE, 0, wvalue, windex, length, server.respeaker.TIMEOUT).tobytes()
+                status = REPLY_OK
+            except Exception as e:
+                status = REPLY_ERROR
+                data = str(e).encode('utf-8')
+            sock.sendall(REPLY.pack(status, len(data)) + data)
+
+
+class SessionServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Holds one open ReSpeaker and serves its transfers to any number of
+    clients of the same user: the socket is created with mode 0600, in a
+    directory of mode 0700 if it has to create it. A stale socket of the user
+    at `path` is replaced, a live one or one of another user is an error.
+    `ids` is the USB (vendor ID, product ID) of the device, by default taken
+    from the transport.
+    """
+    daemon_threads = True
+
+    def __init__(self, respeaker, path=SOCKET_PATH, ids=None):
+        self.respeaker = respeaker
+        self.lock = threading.Lock()
+        self.ids = ids or (getattr(respeaker.dev, 'idVendor', 0), getattr(respeaker.dev, 'idProduct', 0))
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+        if os.path.lexists(path):
+            if not owned_socket(path):
+                raise ValueError('{} is not a socket of this user, not replacing it'.format(path))
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except OSError:
+                os.unlink(path) # stale, left by a daemon that did not exit cleanly
+            else:
+                raise ValueError('A session daemon is already serving on {}'.format(path))
+            finally:
+                probe.close()
+        umask = os.umask(0o177)
+        try:
+            super().__init__(path, SessionHandler)
+        finally:
+            os.umask(umask)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+class DaemonDevice:
+    """
+    Client side of the session daemon, standing in for the pyusb device of a
+    ReSpeaker so every ReSpeaker feature works through the daemon.
+    """
+
+    def __init__(self, path=SOCKET_PATH):
+        self.lock = threading.Lock()
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.sock.connect(path)
+        except OSError:
+            self.sock.close()
+            raise
+
+    def ctrl_transfer(self, bmRequestType, bRequest, wValue, wIndex, data_or_wLength, timeout=None):
+        with self.lock:
+            if bmRequestType & 0x80:
+                self.sock.sendall(REQUEST.pack(REQUEST_IN, wValue, wIndex, data_or_wLength))
+            else:
+                self.sock.sendall(REQUEST.pack(REQUEST_OUT, wValue, wIndex, len(data_or_wLength)) + bytes(data_or_wLength))
+            status, length = REPLY.unpack(recv_exact(self.sock, REPLY.size))
+            data = recv_exact(self.sock, length)
+        if status != REPLY_OK:
+            raise ValueError(data.decode('utf-8', errors='replace'))
+        if bmRequestType & 0x80:
+            return array.array('B', data)
+        return len(data_or_wLength)
+
+    def ids(self):
+        """USB (vendor ID, product ID) of the device served, 0 where unknown"""
+        with self.lock:
+            self.sock.sendall(REQUEST.pack(REQUEST_INFO, 0, 0, 0))
+            status, length = REPLY.unpack(recv_exact(self.sock, REPLY.size))
+            data = recv_exact(self.sock, length)
+        if status != REPLY_OK:
+            raise ValueError(data.decode('utf-8', errors='replace'))
+        return INFO.unpack(data)
+
+    def close(self):
+        self.sock.close()
+
+
+def connect(path=SOCKET_PATH, vid=None, pid=None):
+    """
+    Return a DaemonDevice if a session daemon of the current user is
+    listening on `path` and, when given, serves the device `vid`:`pid`,
+    None otherwise
+    """
+    if not owned_socket(path):
+        return None
+    try:
+        device = DaemonDevice(path)
+        if vid is not None and device.ids() != (vid, pid):
+            device.close()
+            return None
+    except (OSError, ValueError):
+        return None
+    return device
+
+def serve(respeaker, path=SOCKET_PATH):
+    """Serve `respeaker` on `path` until interrupted."""
+    server = SessionServer(respeaker, path)
+    print(f"Serving ReSpeaker on {path}, press Ctrl+C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
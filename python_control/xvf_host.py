@@ -1,15 +1,25 @@
 
+import os
 import sys
 import struct
-import argparse
-import usb.core
-import usb.util
-import libusb_package
 import time
+import logging
+
+# argparse is imported only by the CLI, and usb.core/usb.util/libusb_package
+# only when a device is opened, so importing this module, listing and
+# validating commands do not load the USB stack
+
+# the transfer trace, at DEBUG level
+logger = logging.getLogger(__name__)
 
 CONTROL_SUCCESS = 0
 SERVICER_COMMAND_RETRY = 64
 
+# bmRequestType of vendor requests to the device, i.e.
+# usb.util.CTRL_OUT/CTRL_IN | usb.util.CTRL_TYPE_VENDOR | usb.util.CTRL_RECIPIENT_DEVICE
+CTRL_OUT_VENDOR_DEVICE = 0x40
+CTRL_IN_VENDOR_DEVICE = 0xC0
+
 # name, resid, cmdid, length, type, description
 PARAMETERS = {
     # APPLICATION_SERVICER_RESID commands   
@@ -141,145 +151,515 @@ PARAMETERS = {
     "PP_ATTNS_SLOPE": (17, 34, 1, "rw", "float", "Determines the extra amount of suppression during non-speech when the AGC level increases at lower speech level. The extra attenuation is given by (agcgain_nominal/agcgain_current)^attns_slope. With a value of 1.0 the amount of noise in the output remains approximately the same, independent of the agc gain. Valid range: [0.0 .. 5.0]"),
 }
 
+# struct format character for each parameter type
+TYPE_FORMATS = {
+    'uint8': 'B',
+    'char': 's',
+    'uint16': 'H',
+    'uint32': 'I',
+    'int32': 'i',
+    'float': 'f',
+    'radians': 'f',
+}
+
+
+class Command:
+    """
+    Transfer layout of one PARAMETERS entry, precompiled at import time
+    """
+    __slots__ = ('name', 'resid', 'cmdid', 'count', 'access', 'type',
+                 'struct', 'length', 'read_wvalue', 'write_wvalue', 'windex')
+
+    def __init__(self, name, resid, cmdid, count, access, data_type):
+        self.name = name
+        self.resid = resid
+        self.cmdid = cmdid
+        self.count = count
+        self.access = access
+        self.type = data_type
+        self.struct = struct.Struct('<{}{}'.format(count, TYPE_FORMATS.get(data_type, 'i')))
+        self.length = self.struct.size + 1 # 1 byte for status
+        self.read_wvalue = 0x80 | cmdid
+        self.write_wvalue = cmdid
+        self.windex = resid
+
+    def decode(self, response):
+        """Decode a read response, skipping the leading status byte"""
+        result = self.struct.unpack_from(response, 1)
+        if self.type == 'char':
+            # Remove null terminators
+            return result[0].rstrip(b'\x00').decode('utf-8', errors='ignore')
+        return result
+
+    def encode(self, data_list):
+        """
+        Pack values into a new payload. Commands are shared by every thread
+        and device, so the payload is never a buffer of the command.
+        """
+        if self.type == 'char':
+            return self.struct.pack(data_list.encode('utf-8') if isinstance(data_list, str) else bytes(data_list))
+        return self.struct.pack(*data_list)
+
+
+COMMANDS = {name: Command(name, *info[:5]) for name, info in PARAMETERS.items()}
+
+
+class RetryPolicy:
+    """
+    Decides how long a read waits after a SERVICER_COMMAND_RETRY response.
+
+    The first wait is a fraction (`undershoot`) of the latency learned for the
+    RESID, i.e. the time recent retried reads spent waiting between the first
+    retry response and the successful request, so the estimate keeps probing
+    downwards. Further waits back off exponentially from `initial` up to
+    `maximum`. A read fails once it would exceed `deadline` seconds in total.
+    """
+
+    def __init__(self, initial=0.0005, maximum=0.01, deadline=1.0, smoothing=0.25, undershoot=0.75):
+        self.initial = initial
+        self.maximum = maximum
+        self.deadline = deadline
+        self.smoothing = smoothing
+        self.undershoot = undershoot
+        self.latency = {} # resid -> smoothed seconds a retried read waits until it succeeds
+        self.retries = 0
+        self.wait_time = 0.0
+
+    def delay(self, resid, attempt):
+        estimate = self.latency.get(resid)
+        if estimate is None:
+            return min(self.initial * (1 << (attempt - 1)), self.maximum)
+        if attempt == 1:
+            return min(estimate * self.undershoot, self.maximum)
+        return min(self.initial * (1 << (attempt - 2)), self.maximum)
+
+    def wait(self, resids, attempt, start):
+        """
+        Sleep before retry number `attempt` of reads against `resids`, which
+        started at time.monotonic() `start`.
+        """
+        time.sleep(self.next_delay(resids, attempt, start))
+
+    def next_delay(self, resids, attempt, start):
+        """The seconds wait() would sleep, for callers that wait in their own way"""
+        delay = min(self.delay(resid, attempt) for resid in resids)
+        if time.monotonic() + delay - start > self.deadline:
+            raise ValueError('Read not ready after {:.3f} s ({} attempts)'.format(self.deadline, attempt))
+        self.retries += 1
+        self.wait_time += delay
+        return delay
+
+    def update(self, resid, elapsed):
+        """Learn from a read against `resid` that succeeded `elapsed` seconds after its first retry response"""
+        estimate = self.latency.get(resid)
+        if estimate is None:
+            self.latency[resid] = elapsed
+        else:
+            self.latency[resid] = estimate + self.smoothing * (elapsed - estimate)
+
+
+class FixedRetryPolicy(RetryPolicy):
+    """
+    Flat sleep between retries for a fixed number of attempts, the behaviour
+    of the original read loop.
+    """
+
+    def __init__(self, delay=0.01, attempts=100):
+        super().__init__(initial=delay, maximum=delay, deadline=float('inf'))
+        self.attempts = attempts
+
+    def delay(self, resid, attempt):
+        return self.initial
+
+    def next_delay(self, resids, attempt, start):
+        if attempt >= self.attempts:
+            raise ValueError('Read attempt exceeds {} times'.format(self.attempts))
+        return super().next_delay(resids, attempt, start)
+
+
+def run_steps(steps):
+    """
+    Run the steps of a read to its result: `steps` is a generator doing one
+    transfer per step, which yields None to go on, or the seconds to wait
+    before its next step, and returns the result.
+    """
+    while True:
+        try:
+            delay = next(steps)
+        except StopIteration as e:
+            return e.value
+        if delay:
+            time.sleep(delay)
+
+
 class ReSpeaker:
+    """
+    Control interface of a ReSpeaker. `dev` is the transport the control
+    transfers go through: a pyusb device, or any object with the same
+    ctrl_transfer() and a close(), see transport.py.
+    """
     TIMEOUT = 100000
 
-    def __init__(self, dev):
+    def __init__(self, dev, retry_policy=None, stats=None, cache=None):
         self.dev = dev
+        self.retry_policy = retry_policy or RetryPolicy()
+        # a stats.TransferStats recording every control transfer, if not None
+        self.stats = stats
+        # a cache.ParameterCache serving reads of the values that do not need reading, if not None
+        self.cache = cache
 
     def write(self, name, data_list):
         try:
-            data = PARAMETERS[name]
+            command = COMMANDS[name]
         except KeyError:
             return
         
-        if data[3] == "ro":
+        if command.access == "ro":
             raise ValueError('{} is read-only'.format(name))
         
-        if len(data_list) != data[2]:
-            raise ValueError('{} value count is not {}'.format(name, data[2]))
-
-        windex = data[0] # resid
-        wvalue = data[1] # cmdid
-        data_cnt = data[2] # cnt
-        data_type = data[4] # data type
-        payload = []
-
-        if data_type == 'float' or data_type == 'radians':
-            for i in range(data_cnt):
-                payload += struct.pack(b'f', float(data_list[i]))
-        elif data_type == 'char':
-            # For char arrays, convert string to bytes
-            payload = bytearray(data_list, 'utf-8') if isinstance(data_list, str) else bytearray(data_list)
-        elif data_type == 'uint8':
-            for i in range(data_cnt):
-                payload += data_list[i].to_bytes(1, byteorder='little')
-        elif data_type == 'uint32' or data_type == 'int32':
-            for i in range(data_cnt):
-                payload += struct.pack(b'I' if data_type == 'uint32' else b'i', data_list[i])
-        else:
-            # Default to int32 for other types
-            for i in range(data_cnt):
-                payload += struct.pack(b'i', data_list[i])
-        
-        print("WriteCMD: cmdid: {}, resid: {}, payload: {}".format(wvalue, windex, payload))
+        if len(data_list) != command.count:
+            raise ValueError('{} value count is not {}'.format(name, command.count))
 
-        self.dev.ctrl_transfer(
-            usb.util.CTRL_OUT | usb.util.CTRL_TYPE_VENDOR | usb.util.CTRL_RECIPIENT_DEVICE,
-            0, wvalue, windex, payload, self.TIMEOUT)
+        self._write(command, command.encode(data_list))
 
+    def write_payload(self, name, payload):
+        """Write an already packed payload of `name`, e.g. a precomputed LED_RING_COLOR frame"""
+        command = COMMANDS.get(name)
+        if command is None:
+            raise ValueError('Unknown parameter: {}'.format(name))
+        if command.access == "ro":
+            raise ValueError('{} is read-only'.format(name))
+        if len(payload) != command.length - 1:
+            raise ValueError('{} payload is not {} bytes'.format(name, command.length - 1))
+        self._write(command, payload)
+
+    def _write(self, command, payload):
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("WriteCMD: cmdid: %s, resid: %s, payload: %s", command.write_wvalue, command.windex, list(payload))
+
+        self._transfer_out(command, payload)
+        if self.cache is not None:
+            self.cache.written(command, payload)
+
+    def _transfer_out(self, command, payload):
+        if self.stats is None:
+            return self.dev.ctrl_transfer(
+                CTRL_OUT_VENDOR_DEVICE,
+                0, command.write_wvalue, command.windex, payload, self.TIMEOUT)
+        start = time.perf_counter()
+        try:
+            result = self.dev.ctrl_transfer(
+                CTRL_OUT_VENDOR_DEVICE,
+                0, command.write_wvalue, command.windex, payload, self.TIMEOUT)
+        except Exception:
+            self.stats.record(command, 'out', time.perf_counter() - start, len(payload), None)
+            raise
+        self.stats.record(command, 'out', time.perf_counter() - start, len(payload), CONTROL_SUCCESS)
+        return result
 
-    def read(self, name):
+    def _transfer_in(self, command):
+        if self.stats is None:
+            return self.dev.ctrl_transfer(
+                CTRL_IN_VENDOR_DEVICE,
+                0, command.read_wvalue, command.windex, command.length, self.TIMEOUT)
+        start = time.perf_counter()
         try:
-            data = PARAMETERS[name]
+            response = self.dev.ctrl_transfer(
+                CTRL_IN_VENDOR_DEVICE,
+                0, command.read_wvalue, command.windex, command.length, self.TIMEOUT)
+        except Exception:
+            self.stats.record(command, 'in', time.perf_counter() - start, 0, None)
+            raise
+        self.stats.record(command, 'in', time.perf_counter() - start, len(response), response[0])
+        return response
+
+    def read(self, name, cached=True):
+        """Read a parameter, from the cache if there is one, unless `cached` is False"""
+        try:
+            command = COMMANDS[name]
         except KeyError:
             return
 
+        cache = self.cache
+        if cache is not None and cached:
+            values = cache.get(self, command)
+            if values is not None:
+                return values
+
+        return self._decode(command, self._read_response(command))
+
+    def _decode(self, command, response):
+        """Decode a read response of `command` and cache the values"""
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("ReadCMD: cmdid: %s, resid: %s, payload: %s", command.read_wvalue, command.windex, response.tolist())
+
+        values = command.decode(response)
+        if self.cache is not None:
+            self.cache.put(command, values)
+        return values
+
+    def _read_response(self, command):
+        """Read a raw response, retrying as long as the servicer asks for it"""
+        start = time.monotonic()
+        response = self._transfer_in(command)
+        if response[0] != CONTROL_SUCCESS:
+            # no generator on the usual path
+            response = run_steps(self._retry_steps(command, response, start))
+        return response
+
+    def _read_response_steps(self, command):
+        """_read_response() as steps, see run_steps()"""
+        start = time.monotonic()
+        response = self._transfer_in(command)
+        if response[0] != CONTROL_SUCCESS:
+            response = yield from self._retry_steps(command, response, start)
+        return response
+
+    def _retry_steps(self, command, response, start):
+        """Steps of reading `command` again after `response`, its first one, until it succeeds"""
         read_attempts = 1
-        windex = data[0] # resid
-        wvalue = 0x80 | data[1] # cmdid
-        data_cnt = data[2] # cnt
-        data_type = data[4] # data type
-        if data_type == 'uint8' or data_type == 'char':
-            length = data_cnt + 1 # 1 byte for status
-        elif data_type == 'float' or data_type == 'radians' or data_type == 'uint32' or data_type == 'int32':
-            length = data_cnt * 4 + 1 # 1 byte for status
-        elif data_type == 'uint16':
-            length = data_cnt * 2 + 1 # 1 byte for status
-
-        response = self.dev.ctrl_transfer(
-            usb.util.CTRL_IN | usb.util.CTRL_TYPE_VENDOR | usb.util.CTRL_RECIPIENT_DEVICE,
-            0, wvalue, windex, length, self.TIMEOUT)
-        while True:
-            if read_attempts > 100:
-                raise ValueError('Read attempt exceeds 100 times')
+        if response[0] == SERVICER_COMMAND_RETRY:
+            retried = time.monotonic()
+            while response[0] == SERVICER_COMMAND_RETRY:
+                yield self.retry_policy.next_delay((command.windex,), read_attempts, start)
+                read_attempts += 1
+                sent = time.monotonic()
+                response = self._transfer_in(command)
             if response[0] == CONTROL_SUCCESS:
+                self.retry_policy.update(command.windex, sent - retried)
+        if response[0] != CONTROL_SUCCESS:
+            raise ValueError('Unknown status code: {}'.format(response[0]))
+
+        return response
+
+    def read_many(self, names, cached=True):
+        """
+        Read several parameters in one pass and return them as a dict.
+        Transfers are ordered by RESID so each servicer is visited once per pass,
+        and only the reads answered with SERVICER_COMMAND_RETRY are issued again.
+        Unknown names map to None, as with read(). Cached values are not read
+        unless `cached` is False.
+        """
+        return run_steps(self._read_many_steps(names, cached))
+
+    def _read_many_steps(self, names, cached=True):
+        """read_many() as steps, see run_steps()"""
+        commands = sorted({COMMANDS[name] for name in names if name in COMMANDS},
+                          key=lambda command: (command.windex, command.cmdid))
+        results = dict.fromkeys(names)
+        cache = self.cache
+        if cache is not None and cached:
+            uncached = []
+            for command in commands:
+                values = cache.get(self, command)
+                if values is None:
+                    uncached.append(command)
+                else:
+                    results[command.name] = values
+            commands = uncached
+        responses = yield from self._read_responses_steps(commands)
+        for command, response in responses.items():
+            values = results[command.name] = command.decode(response)
+            if cache is not None:
+                cache.put(command, values)
+        return results
+
+    def _read_responses(self, commands):
+        """Raw responses of `commands`, sorted by RESID, read as by read_many()"""
+        return run_steps(self._read_responses_steps(commands))
+
+    def _read_responses_steps(self, commands):
+        """_read_responses() as steps, with a step per transfer, see run_steps()"""
+        responses = {}
+        read_attempts = 1
+        transfers = 0
+        start = time.monotonic()
+        retried = {}
+
+        while commands:
+            pending = []
+            for command in commands:
+                sent = time.monotonic()
+                response = self._transfer_in(command)
+                transfers += 1
+                if response[0] == CONTROL_SUCCESS:
+                    responses[command] = response
+                    if command in retried:
+                        self.retry_policy.update(command.windex, sent - retried[command])
+                elif response[0] == SERVICER_COMMAND_RETRY:
+                    retried.setdefault(command, time.monotonic())
+                    pending.append(command)
+                else:
+                    raise ValueError('Unknown status code {} for {}'.format(response[0], command.name))
+                yield None
+            if not pending:
                 break
-            elif response[0] == SERVICER_COMMAND_RETRY:
-                read_attempts += 1
-                response = self.dev.ctrl_transfer(
-                    usb.util.CTRL_IN | usb.util.CTRL_TYPE_VENDOR | usb.util.CTRL_RECIPIENT_DEVICE,
-                    0, wvalue, windex, length, self.TIMEOUT)
+            yield self.retry_policy.next_delay({command.windex for command in pending}, read_attempts, start)
+            read_attempts += 1
+            commands = pending
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("ReadMany: %s parameters, %s transfers, %s passes", len(responses), transfers, read_attempts)
+
+        return responses
+
+    def dump_aec_filters(self, path=None):
+        """
+        Read the AEC filter of every far-end/mic pair into a float32 array of
+        shape (far ends, mics, filter length), paging through the
+        coefficients over this handle. With a `path` the array is a memory map
+        of that file, a .npy file if the path ends with .npy, raw float32
+        otherwise. The special command state machine is aborted on error.
+        """
+        import numpy as np
+
+        num_farends = self.read("AEC_NUM_FARENDS")[0]
+        num_mics = self.read("AEC_NUM_MICS")[0]
+        coeffs = None
+        try:
+            for far in range(num_farends):
+                for mic in range(num_mics):
+                    self.write("SPECIAL_CMD_AEC_FAR_MIC_INDEX", [far, mic])
+                    length = self.read("SPECIAL_CMD_AEC_FILTER_LENGTH")[0]
+                    if coeffs is None:
+                        coeffs = self._allocate_aec_filters(path, (num_farends, num_mics, length))
+                    elif length != coeffs.shape[2]:
+                        raise ValueError('AEC filter length of far end {} mic {} is {}, expected {}'.format(far, mic, length, coeffs.shape[2]))
+                    self._page_aec_filter(coeffs[far, mic])
+        except Exception:
+            self.write("AEC_FILTER_CMD_ABORT", [0])
+            raise
+        if isinstance(coeffs, np.memmap):
+            coeffs.flush()
+        return coeffs
+
+    def _allocate_aec_filters(self, path, shape):
+        import numpy as np
+
+        if path is None:
+            return np.empty(shape, np.float32)
+        if path.endswith('.npy'):
+            return np.lib.format.open_memmap(path, 'w+', np.float32, shape)
+        return np.memmap(path, np.float32, 'w+', shape=shape)
+
+    def _page_aec_filter(self, row, upload=False):
+        """Transfer one filter between `row` and the device, SPECIAL_CMD_AEC_FILTER_COEFFS at a time"""
+        import numpy as np
+
+        command = COMMANDS["SPECIAL_CMD_AEC_FILTER_COEFFS"]
+        page = command.count
+        for offset in range(0, len(row), page):
+            count = min(page, len(row) - offset)
+            self.write("SPECIAL_CMD_AEC_FILTER_COEFF_START_OFFSET", [offset])
+            if upload:
+                values = list(row[offset:offset + count]) + [0.0] * (page - count)
+                self.write("SPECIAL_CMD_AEC_FILTER_COEFFS", values)
             else:
-                raise ValueError('Unknown status code: {}'.format(response[0]))
-            time.sleep(0.01)
-        
-        print("ReadCMD: cmdid: {}, resid: {}, payload: {}".format(wvalue, windex, response.tolist()))
-
-        if data_type == 'uint8':
-            byte_data = response.tobytes()
-            match_str = '<'
-            for i in range(data_cnt):
-                match_str += 'B'
-            result = struct.unpack(match_str, byte_data[1:])
-        elif data_type == 'char':
-            # For char arrays, convert bytes to string
-            byte_data = response.tobytes()
-            # Remove status byte and null terminators
-            result = byte_data[1:].rstrip(b'\x00').decode('utf-8', errors='ignore')
-        elif data_type == 'radians' or data_type == 'float':
-            byte_data = response.tobytes()
-            match_str = '<'
-            for i in range(data_cnt):
-                match_str += 'f'
-            result = struct.unpack(match_str, byte_data[1:])
-        elif data_type == 'uint32':
-            byte_data = response.tobytes()
-            match_str = '<'
-            for i in range(data_cnt):
-                match_str += 'I'
-            result = struct.unpack(match_str, byte_data[1:])
-        elif data_type == 'int32':
-            byte_data = response.tobytes()
-            match_str = '<'
-            for i in range(data_cnt):
-                match_str += 'i'
-            result = struct.unpack(match_str, byte_data[1:])
-        elif data_type == 'uint16':
-            byte_data = response.tobytes()
-            match_str = '<'
-            for i in range(data_cnt):
-                match_str += 'H'
-            result = struct.unpack(match_str, byte_data[1:])
-        return result
+                response = self._read_response(command)
+                row[offset:offset + count] = np.frombuffer(response, '<f4', count, 1)
+
+    def load_aec_filters(self, coeffs):
+        """
+        Write AEC filters of shape (far ends, mics, filter length), given as an
+        array or as the path of a file written by dump_aec_filters(), which is
+        memory-mapped rather than loaded. Returns the filters written. The
+        special command state machine is aborted on error.
+        """
+        import numpy as np
 
+        num_farends = self.read("AEC_NUM_FARENDS")[0]
+        num_mics = self.read("AEC_NUM_MICS")[0]
+        if isinstance(coeffs, str):
+            if coeffs.endswith('.npy'):
+                coeffs = np.load(coeffs, mmap_mode='r')
+            else:
+                coeffs = np.memmap(coeffs, np.float32, 'r').reshape(num_farends, num_mics, -1)
+        if tuple(coeffs.shape[:2]) != (num_farends, num_mics):
+            raise ValueError('AEC filters are for {} far ends and {} mics, device has {} and {}'.format(
+                coeffs.shape[0], coeffs.shape[1], num_farends, num_mics))
+        try:
+            for far in range(num_farends):
+                for mic in range(num_mics):
+                    self.write("SPECIAL_CMD_AEC_FAR_MIC_INDEX", [far, mic])
+                    length = self.read("SPECIAL_CMD_AEC_FILTER_LENGTH")[0]
+                    if length != coeffs.shape[2]:
+                        raise ValueError('AEC filter length of far end {} mic {} is {}, got {}'.format(far, mic, length, coeffs.shape[2]))
+                    self._page_aec_filter(coeffs[far, mic], upload=True)
+        except Exception:
+            self.write("AEC_FILTER_CMD_ABORT", [0])
+            raise
+        return coeffs
 
     def close(self):
         """
         close the interface
         """
-        usb.util.dispose_resources(self.dev)
-
+        if hasattr(self.dev, 'close'):
+            self.dev.close()
+        else:
+            import usb.util
+            usb.util.dispose_resources(self.dev)
+
+
+def daemon_socket_path():
+    """
+    Default socket of the session daemon: $XVF_HOST_SOCKET, or else
+    xvf_host.sock in $XDG_RUNTIME_DIR, or else in a /tmp directory of the
+    user, created by the daemon with mode 0700. None where there are no
+    unix users, i.e. on Windows.
+    """
+    if os.environ.get('XVF_HOST_SOCKET'):
+        return os.environ['XVF_HOST_SOCKET']
+    if os.environ.get('XDG_RUNTIME_DIR'):
+        return os.path.join(os.environ['XDG_RUNTIME_DIR'], 'xvf_host.sock')
+    if not hasattr(os, 'getuid'):
+        return None
+    return os.path.join('/tmp', 'xvf_host-{}'.format(os.getuid()), 'xvf_host.sock')
 
 def find(vid=0x2886, pid=0x001A):
     if sys.platform.startswith('win'):
+        import libusb_package
         dev = libusb_package.find(idVendor=vid, idProduct=pid)
     else:
+        import usb.core
         dev = usb.core.find(idVendor=vid, idProduct=pid)
     if not dev:
         return
-    
-    return ReSpeaker(dev)
+
+    from transport import UsbTransport
+    return ReSpeaker(UsbTransport(dev))
+
+def find_all(vid=0x2886, pid=0x001A):
+    """Return a ReSpeaker for every device matching vid/pid, in bus/port path order."""
+    if sys.platform.startswith('win'):
+        import libusb_package
+        devs = libusb_package.find(find_all=True, idVendor=vid, idProduct=pid)
+    else:
+        import usb.core
+        devs = usb.core.find(find_all=True, idVendor=vid, idProduct=pid)
+    from transport import UsbTransport
+    return [ReSpeaker(UsbTransport(dev)) for dev in sorted(devs, key=lambda dev: (dev.bus, tuple(dev.port_numbers or ())))]
+
+def usb_path(dev):
+    """Stable bus-port path of a pyusb device, e.g. '1-1.2', as the Linux sysfs names it"""
+    return '{}-{}'.format(dev.bus, '.'.join(str(port) for port in dev.port_numbers or ()))
+
+def usb_serial(dev):
+    """Serial number string of a pyusb device, None if it has none or it cannot be read"""
+    try:
+        return dev.serial_number
+    except (ValueError, NotImplementedError, IOError):
+        return None
+
+def find_device(device, vid=0x2886, pid=0x001A):
+    """Return the ReSpeaker whose bus-port path or serial number is `device`, None if none matches."""
+    found = None
+    for respeaker in find_all(vid, pid):
+        if found is None and device in (usb_path(respeaker.dev), usb_serial(respeaker.dev)):
+            found = respeaker
+        else:
+            respeaker.close()
+    return found
 
 
 
@@ -302,6 +682,7 @@ def parse_value(value_str):
 
 def case_insensitive_command(value):
     """Convert command to uppercase and validate it exists"""
+    import argparse
     if not isinstance(value, str):
         raise argparse.ArgumentTypeError(f"Command must be a string, got {type(value)}")
     
@@ -323,6 +704,14 @@ def case_insensitive_command(value):
     
     return upper_value
 
+def list_devices(vid=0x2886, pid=0x001A):
+    """Display the path and serial number of every matching device."""
+    print(f"{'Path':<16} {'Serial'}")
+    print("-" * 40)
+    for respeaker in find_all(vid, pid):
+        print(f"{usb_path(respeaker.dev):<16} {usb_serial(respeaker.dev) or '-'}")
+        respeaker.close()
+
 def list_commands():
     """Display all supported commands with their detailed information."""
     print("\n=== Supported Commands ===\n")
@@ -333,32 +722,155 @@ def list_commands():
         resid, cmdid, length, param_type, access, description = info
         print(f"{name:<30} {resid:<6} {cmdid:<6} {length:<7} {param_type:<12} {access:<8} {description}")
 
+def format_result(name, result):
+    """Format a decoded read result for display"""
+    formatted_result = []
+    if name == "LED_COLOR" or name == "LED_DOA_COLOR" or name == "LED_RING_COLOR":
+        for val in result:
+            formatted_result.append(f"0x{val:06X}")
+    else:
+        for val in result:
+            if isinstance(val, float):
+                formatted_result.append(f"{val:.3f}")
+            elif isinstance(val, str):
+                formatted_result.append(f"'{val}'")
+            else:
+                formatted_result.append(str(val))
+    return f"{name}: [{', '.join(formatted_result)}]"
+
+def snapshot(dev):
+    """Read every readable parameter in one batched pass and print it."""
+    names = [name for name, info in PARAMETERS.items() if info[3] != "wo"]
+    start = time.perf_counter()
+    results = dev.read_many(names)
+    elapsed = time.perf_counter() - start
+    for name in names:
+        print(format_result(name, results[name]))
+    print(f"Read {len(names)} parameters in {elapsed * 1000:.1f} ms")
+
+def transfer_aec_filters(dev, dump_path=None, load_path=None):
+    """Dump or load the AEC filters and report the throughput."""
+    start = time.perf_counter()
+    if dump_path:
+        coeffs = dev.dump_aec_filters(dump_path)
+        action = "Dumped"
+    else:
+        coeffs = dev.load_aec_filters(load_path)
+        action = "Loaded"
+    elapsed = time.perf_counter() - start
+    count = coeffs.size
+    print(f"{action} {count} AEC filter coefficients in {elapsed:.2f} s ({count / elapsed:.0f} coefficients/s)")
+
 def main():
+    import argparse
+
     parser = argparse.ArgumentParser(description='ReSpeaker Host Control Script')
     parser.add_argument('-l', '--list', action='store_true',
                        help='list all supported commands with detailed information')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                       help='log every control transfer')
+    parser.add_argument('--stats', action='store_true',
+                       help='print latency, retry and error statistics of the control transfers on exit')
+    parser.add_argument('--stats-file', metavar='FILE',
+                       help='write the transfer statistics to FILE in the Prometheus text format on exit')
     parser.add_argument('COMMAND', nargs='?', type=case_insensitive_command, 
                        help='command to execute (e.g., VERSION, DOA_VALUE, etc.)')
     parser.add_argument('--vid', type=lambda x: int(x, 0), default=0x2886,
                        help='usb vendor ID (default: 0x2886)')
     parser.add_argument('--pid', type=lambda x: int(x, 0), default=0x001A,
                        help='usb product ID (default: 0x001A)')
+    parser.add_argument('--device', metavar='ID',
+                       help='bus-port path (e.g. 1-1.2) or serial number of the device to use when several are connected')
+    parser.add_argument('--i2c', metavar='BUS',
+                       help='use the device on I2C adapter BUS (number or /dev/i2c-* path), as the I2S firmwares are controlled, instead of USB')
+    parser.add_argument('--i2c-address', type=lambda x: int(x, 0), default=0x2C,
+                       help='I2C address of the device, with --i2c (default: 0x2C)')
+    parser.add_argument('--list-devices', action='store_true',
+                       help='list the path and serial number of every connected device')
     parser.add_argument('--values', nargs='+', type=parse_value,
                        help='values for write commands (only for write operations). Supports decimal (123, 1.5) and hex (0x7B, $7B) formats')
+    parser.add_argument('--snapshot', action='store_true',
+                       help='read all readable parameters in one batched pass')
+    parser.add_argument('--dump-aec-filters', metavar='FILE',
+                       help='dump all AEC filter coefficients to FILE (.npy, otherwise raw float32)')
+    parser.add_argument('--load-aec-filters', metavar='FILE',
+                       help='load all AEC filter coefficients from FILE written by --dump-aec-filters')
+    parser.add_argument('--apply', metavar='FILE',
+                       help='apply a JSON/YAML profile of parameter values, writing only the parameters that differ')
+    parser.add_argument('--save', action='store_true',
+                       help='with --apply, save the configuration to flash afterwards')
+    parser.add_argument('--headroom', type=float, metavar='SECONDS',
+                       help='profile the DSP headroom of every stage for SECONDS while a workload runs')
+    parser.add_argument('--headroom-rate', type=float, default=50, metavar='HZ',
+                       help='idle time samples per second for --headroom (default: 50)')
+    parser.add_argument('--headroom-json', metavar='FILE',
+                       help='also write the --headroom report to FILE as JSON')
+    parser.add_argument('--headroom-frame-ms', type=float, default=15, metavar='MS',
+                       help='audio frame period the --headroom percentages are of (default: 15, 240 samples at 16 kHz)')
+    parser.add_argument('--watch', nargs='+', metavar='NAME[:HZ]',
+                       help='print the parameters whenever they change, each polled at its own rate (default: 1 Hz)')
+    parser.add_argument('--deadband', type=float, default=0.0,
+                       help='with --watch, smallest change of a float parameter that is reported (default: 0)')
+    parser.add_argument('--duration', type=float, metavar='SECONDS',
+                       help='with --watch, seconds to watch (default: until interrupted)')
+    parser.add_argument('--cache', action='store_true',
+                       help='serve the build information from a cache on disk, $XDG_CACHE_HOME/xvf_host '
+                            '(default: ~/.cache/xvf_host), once BLD_REPO_HASH read from the device matches')
+    parser.add_argument('--record', metavar='FILE',
+                       help='log every control transfer of this session, with its timing, to FILE')
+    parser.add_argument('--replay', metavar='FILE',
+                       help='serve the transfers from a --record log instead of a device')
+    parser.add_argument('--daemon', action='store_true',
+                       help='keep the USB device open and serve other xvf_host.py invocations over a unix socket')
+    parser.add_argument('--socket', default=None,
+                       help='unix socket of the session daemon (default: $XVF_HOST_SOCKET, $XDG_RUNTIME_DIR/xvf_host.sock or /tmp/xvf_host-$UID/xvf_host.sock)')
+    parser.add_argument('--no-daemon', action='store_true',
+                       help='access the device directly even if a session daemon is running')
     
     args = parser.parse_args()
+
+    if args.verbose:
+        logging.basicConfig(level=logging.DEBUG, format='%(message)s')
     
     # Handle list command
     if args.list:
         list_commands()
         sys.exit(0)
-    
-    dev = find(vid=args.vid, pid=args.pid)
-    if not dev:
-        print('No device found')
-        sys.exit(1)
 
-    try:
+    if args.list_devices:
+        list_devices(vid=args.vid, pid=args.pid)
+        sys.exit(0)
+
+    profile = None
+    if args.apply:
+        import profiles
+        try:
+            profile = profiles.load_profile(args.apply)
+        except (OSError, ValueError) as e:
+            print(f"Error: cannot load profile {args.apply}: {e}")
+            sys.exit(1)
+    elif args.save:
+        parser.error("--save requires --apply")
+    # clients find the daemon by the USB vendor and product ID of its device
+    if args.daemon and (args.i2c or args.replay):
+        parser.error("--daemon serves a USB device, not --i2c or --replay")
+    if args.headroom_frame_ms <= 0:
+        parser.error("--headroom-frame-ms must be positive")
+    
+    if args.watch:
+        for spec in args.watch:
+            name, _, rate = spec.partition(':')
+            try:
+                valid = name.upper() in PARAMETERS and PARAMETERS[name.upper()][3] != "wo" and (not rate or float(rate) > 0)
+            except ValueError:
+                valid = False
+            if not valid:
+                parser.error(f"invalid watch '{spec}', expected a readable parameter and an optional positive rate, e.g. DOA_VALUE:50")
+
+    # Validate the command before opening the device
+    if not (args.daemon or args.snapshot or args.dump_aec_filters or args.load_aec_filters or args.apply or args.headroom or args.watch):
+        if args.COMMAND is None:
+            parser.error("a COMMAND is required")
         if args.values:
             if PARAMETERS[args.COMMAND][3] == "ro":
                 print(f"Error: {args.COMMAND} is read-only and cannot be written to")
@@ -374,33 +886,87 @@ def main():
             if PARAMETERS[args.COMMAND][2] != len(args.values):
                 print(f"Error: {args.COMMAND} value count is {PARAMETERS[args.COMMAND][2]}, but {len(args.values)} values provided")
                 sys.exit(1)
+        elif PARAMETERS[args.COMMAND][3] == "wo":
+            print(f"Error: {args.COMMAND} is write-only and cannot be read")
+            resid, cmdid, length, param_type, access, description = PARAMETERS[args.COMMAND]
+            print(f"{'Command':<30} {'RESID':<6} {'CMDID':<6} {'Length':<7} {'Type':<12} {'Access':<8} {'Description'}")
+            print("-" * 120)
+            print(f"{args.COMMAND:<30} {resid:<6} {cmdid:<6} {length:<7} {param_type:<12} {access:<8} {description}")
+            sys.exit(1)
+
+    # xvf_daemon (socket, socketserver, threading) is only imported for --daemon
+    # or when a daemon socket exists, so direct commands do not load it
+    socket_path = args.socket or daemon_socket_path()
+    # the daemon serves a single device, so an explicit --device is opened directly
+    connect = (not args.daemon and not args.no_daemon and not args.replay and not args.i2c and not args.device
+               and socket_path and os.path.exists(socket_path))
+    if args.daemon:
+        import socket
+        if socket_path is None or not hasattr(socket, 'AF_UNIX'):
+            # the session daemon needs unix domain sockets, which Windows lacks
+            print("Error: --daemon is not supported on this platform")
+            sys.exit(1)
+    if args.daemon or connect:
+        import xvf_daemon # imported here as it builds on this module
+
+    dev = None
+    if args.replay:
+        from transport import ReplayTransport
+        try:
+            dev = ReSpeaker(ReplayTransport(args.replay))
+        except (OSError, ValueError) as e:
+            print(f"Error: cannot replay {args.replay}: {e}")
+            sys.exit(1)
+    elif args.i2c:
+        import i2c_transport
+        dev = i2c_transport.find_i2c(args.i2c, args.i2c_address)
+    elif connect:
+        # only if it serves the device asked for
+        daemon = xvf_daemon.connect(socket_path, args.vid, args.pid)
+        if daemon:
+            dev = ReSpeaker(daemon)
+    if not dev and args.device:
+        dev = find_device(args.device, vid=args.vid, pid=args.pid)
+    elif not dev and not args.i2c:
+        dev = find(vid=args.vid, pid=args.pid)
+    if not dev:
+        print('No device found')
+        sys.exit(1)
+    if args.record:
+        from transport import RecordingTransport
+        dev.dev = RecordingTransport(dev.dev, args.record)
+    if args.stats or args.stats_file:
+        import stats
+        dev.stats = stats.TransferStats()
+    if args.cache:
+        import cache
+        dev.cache = cache.ParameterCache(cache.device_identity(dev.dev))
 
+    try:
+        if args.daemon:
+            xvf_daemon.serve(dev, socket_path)
+        elif args.snapshot:
+            snapshot(dev)
+        elif args.dump_aec_filters or args.load_aec_filters:
+            transfer_aec_filters(dev, args.dump_aec_filters, args.load_aec_filters)
+        elif profile is not None:
+            profiles.report(profiles.apply_profile(dev, profile, save=args.save))
+        elif args.headroom:
+            import headroom
+            report = headroom.measure(dev, args.headroom, args.headroom_rate, args.headroom_frame_ms / 1000)
+            headroom.print_report(report)
+            if args.headroom_json:
+                headroom.save_report(report, args.headroom_json)
+            if any(stage['near_overrun'] for stage in report['stages'].values()):
+                sys.exit(1)
+        elif args.watch:
+            import watch
+            watch.watch(dev, args.watch, args.deadband, args.duration)
+        elif args.values:
             dev.write(args.COMMAND, args.values)
         else:
-            if PARAMETERS[args.COMMAND][3] == "wo":
-                print(f"Error: {args.COMMAND} is write-only and cannot be read")
-                resid, cmdid, length, param_type, access, description = PARAMETERS[args.COMMAND]
-                print(f"{'Command':<30} {'RESID':<6} {'CMDID':<6} {'Length':<7} {'Type':<12} {'Access':<8} {'Description'}")
-                print("-" * 120)
-                print(f"{args.COMMAND:<30} {resid:<6} {cmdid:<6} {length:<7} {param_type:<12} {access:<8} {description}")
-                sys.exit(1)
-            
             result = dev.read(args.COMMAND)
-            if args.COMMAND == "LED_COLOR" or args.COMMAND == "LED_DOA_COLOR" or args.COMMAND == "LED_RING_COLOR":
-                formatted_result = []
-                for val in result:
-                    formatted_result.append(f"0x{val:06X}")
-                print(f"{args.COMMAND}: [{', '.join(formatted_result)}]")
-            else:
-                formatted_result = []
-                for val in result:
-                    if isinstance(val, float):
-                        formatted_result.append(f"{val:.3f}")
-                    elif isinstance(val, str):
-                        formatted_result.append(f"'{val}'")
-                    else:
-                        formatted_result.append(str(val))
-                print(f"{args.COMMAND}: [{', '.join(formatted_result)}]")
+            print(format_result(args.COMMAND, result))
 
         print(f"Done!")
             
@@ -409,6 +975,13 @@ def main():
         sys.exit(1)
     finally:
         dev.close()
+        if args.stats:
+            stats.print_stats(dev.stats)
+            if dev.cache is not None:
+                cache.print_cache_stats(dev.cache)
+        if args.stats_file:
+            with open(args.stats_file, 'w') as f:
+                f.write(dev.stats.prometheus())
 
 if __name__ == '__main__':
     main()